@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Recall and latency of quantized flat vector search
+
+Builds one FlatVectorStore per quantization mode over the same synthetic
+clustered embeddings and compares int8 and binary search (with exact
+rescoring) against the unquantized baseline, plus a two-stage search over
+the leading dimensions. The synthetic embeddings put more variance in
+their leading dimensions, like Matryoshka-trained models. Runs offline.
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+from llama_index.core.schema import TextNode
+
+from flat_store import FlatVectorStore
+
+def make_embeddings(rows, dims, clusters, rng):
+    """Return unit vectors drawn around random cluster centres."""
+    decay = 1 / np.sqrt(1 + np.arange(dims) / 32)
+    centres = rng.standard_normal((clusters, dims)) * decay
+    vectors = centres[rng.integers(0, clusters, rows)] + 0.8 * rng.standard_normal((rows, dims)) * decay
+    return (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+
+def main():
+    """Run the benchmark and print recall, latency and search memory per mode."""
+    parser = argparse.ArgumentParser(description="Quantized flat search benchmark")
+    parser.add_argument("--rows", type=int, default=100000, help="Stored vectors")
+    parser.add_argument("--dims", type=int, default=1024, help="Embedding dimension")
+    parser.add_argument("--queries", type=int, default=100, help="Queries to time")
+    parser.add_argument("--k", type=int, default=10, help="Results per query")
+    parser.add_argument("--multiplier", type=int, default=10, help="Rescore shortlist as a multiple of k")
+    parser.add_argument("--search-dims", type=int, default=256,
+                        help="Leading dimensions for the two-stage run (0 to skip)")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    embeddings = make_embeddings(args.rows + args.queries, args.dims, 100, rng)
+    stored, queries = embeddings[:args.rows], embeddings[args.rows:]
+
+    directory = tempfile.mkdtemp()
+    try:
+        results = {}
+        print(f"⏱️  {args.rows} x {args.dims} vectors, {args.queries} queries, k={args.k}:")
+        print(f"   {'mode':<8}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}{'search MB':>12}{'vs f32':>8}")
+        runs = [("none", "none", 0), ("int8", "int8", 0), ("binary", "binary", 0)]
+        if args.search_dims:
+            runs.append((f"f32@{args.search_dims}", "none", args.search_dims))
+        for label, mode, search_dims in runs:
+            store = FlatVectorStore(os.path.join(directory, label), quantization=mode,
+                                    rescore_multiplier=args.multiplier, search_dimensions=search_dims)
+            for start in range(0, args.rows, 10000):
+                store.add([
+                    TextNode(id_=str(row), text="", embedding=stored[row].tolist())
+                    for row in range(start, min(start + 10000, args.rows))
+                ])
+
+            latencies = []
+            results[label] = []
+            for query in queries:
+                begin = time.perf_counter()
+                result = store.query_batch([query.tolist()], args.k)[0]
+                latencies.append((time.perf_counter() - begin) * 1000)
+                results[label].append(set(result.ids))
+
+            recall = np.mean([
+                len(found & exact) / args.k for found, exact in zip(results[label], results["none"])
+            ])
+            footprint = store.memory_footprint()
+            print(f"   {label:<8}{recall:>10.3f}{np.percentile(latencies, 50):>10.2f}"
+                  f"{np.percentile(latencies, 95):>10.2f}{footprint['search_bytes'] / 1e6:>12.1f}"
+                  f"{footprint['vector_bytes'] / footprint['search_bytes']:>7.1f}x")
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark of per-query query engine construction
+
+Compares building a query engine with index.as_query_engine() on every
+question (the old query_database behaviour) against fetching it from the
+index's QueryEnginePool. Runs offline with mock embeddings and LLM.
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core import VectorStoreIndex, Settings
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+from llama_index.core.schema import TextNode
+
+from engine_pool import get_query_engine
+
+def time_per_call(func, iterations):
+    """Return the mean wall time of func() in microseconds."""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - start) / iterations * 1e6
+
+def main():
+    """Run the benchmark and print per-query construction cost."""
+    parser = argparse.ArgumentParser(description="Query engine construction micro-benchmark")
+    parser.add_argument("--iterations", type=int, default=2000, help="Calls per measurement")
+    parser.add_argument("--k", type=int, default=3, help="similarity_top_k of the engine")
+    args = parser.parse_args()
+
+    Settings.embed_model = MockEmbedding(embed_dim=8)
+    Settings.llm = MockLLM()
+    index = VectorStoreIndex([TextNode(text=f"chunk {i}") for i in range(100)])
+
+    get_query_engine(index, args.k)  # build the pooled engine once
+    before = time_per_call(lambda: index.as_query_engine(similarity_top_k=args.k), args.iterations)
+    after = time_per_call(lambda: get_query_engine(index, args.k), args.iterations)
+
+    print(f"⏱️  Query engine construction over {args.iterations} calls (k={args.k}):")
+    print(f"   as_query_engine per call: {before:10.1f} µs")
+    print(f"   pooled engine lookup:     {after:10.1f} µs")
+    print(f"   speed-up:                 {before / after:10.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+"""
+End-to-end benchmark of ingestion and querying on synthetic corpora
+
+Generates deterministic synthetic documents (one chunk per page, words
+drawn from a Zipf-distributed vocabulary), ingests them through the same
+path as uploads, then times retrieval and full queries on held-out
+phrases taken from the corpus. Embeddings come from the hash backend and
+answers from an LLM that echoes its prompt, so the run is fully offline
+and only the RAG_agent code paths are measured.
+
+Each corpus size runs in a fresh process in its own scratch directory,
+so peak RSS and on-disk index size are per size. Results are written as
+JSON; pass an earlier file with --compare to flag regressions.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import multiprocessing
+
+# Offline stand-ins; must be set before config is imported
+os.environ["RAG_EMBEDDING_BACKEND"] = "hash"
+os.environ.setdefault("ANONYMIZED_TELEMETRY", "False")
+AGENT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, AGENT_DIR)
+
+import numpy as np
+from llama_index.core.llms import CustomLLM, CompletionResponse, LLMMetadata
+from llama_index.core.llms.callbacks import llm_completion_callback
+
+# Metrics compared by --compare: name -> True if higher is better
+COMPARED_METRICS = {
+    "ingest_chunks_per_sec": True,
+    "retrieve_p50_ms": False,
+    "retrieve_p95_ms": False,
+    "retrieve_p99_ms": False,
+    "query_p50_ms": False,
+    "query_p95_ms": False,
+    "query_p99_ms": False,
+    "index_bytes": False,
+    "peak_rss_bytes": False,
+}
+
+SYLLABLES = ["ka", "ro", "mi", "tes", "lun", "dor", "vi", "sa", "pel", "qua", "nor", "ith", "ben", "zo", "rak", "elm"]
+
+class EchoLLM(CustomLLM):
+    """Offline LLM that answers with the start of its prompt.
+
+    Synthesis still builds the full prompt from the retrieved chunks, so
+    only the model call itself is left out of the measurement.
+    """
+
+    answer_chars: int = 256
+
+    @property
+    def metadata(self):
+        return LLMMetadata(context_window=128000, num_output=256, model_name="echo")
+
+    @llm_completion_callback()
+    def complete(self, prompt, formatted=False, **kwargs):
+        return CompletionResponse(text=prompt[:self.answer_chars])
+
+    @llm_completion_callback()
+    def stream_complete(self, prompt, formatted=False, **kwargs):
+        text = ""
+        for word in prompt[:self.answer_chars].split(" "):
+            text += word + " "
+            yield CompletionResponse(text=text, delta=word + " ")
+
+def make_vocabulary(size, seed):
+    """Return `size` distinct pseudo-words and the CDF of a Zipf distribution over them."""
+    rng = np.random.default_rng(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES, rng.integers(2, 5))))
+    words = np.array(sorted(words))
+    rng.shuffle(words)
+    weights = 1 / np.arange(1, size + 1) ** 1.1
+    return words, np.cumsum(weights / weights.sum())
+
+def page_text(vocabulary, cdf, seed, doc_number, page_number, words_per_page, max_chars):
+    """Return the text of one synthetic page; the same arguments give the same text.
+
+    Pages are cut at a word boundary to max_chars, so each becomes exactly
+    one chunk.
+    """
+    rng = np.random.default_rng([seed, doc_number, page_number])
+    picks = np.minimum(np.searchsorted(cdf, rng.random(words_per_page)), len(cdf) - 1)
+    text = " ".join(vocabulary[picks])
+    return text if len(text) <= max_chars else text[:text.rindex(" ", 0, max_chars + 1)]
+
+def iter_document_pages(vocabulary, cdf, seed, doc_number, pages, words_per_page, max_chars):
+    """Yield (page_number, text) tuples of one synthetic document."""
+    for page_number in range(1, pages + 1):
+        yield page_number, page_text(vocabulary, cdf, seed, doc_number, page_number,
+                                     words_per_page, max_chars)
+
+def percentiles(latencies):
+    """Return p50/p95/p99 of a list of seconds, in milliseconds."""
+    values = np.array(latencies) * 1000
+    return {f"p{q}_ms": float(np.percentile(values, q)) for q in (50, 95, 99)}
+
+def directory_size(path):
+    """Return the total size in bytes of the files under a directory."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            full_path = os.path.join(root, name)
+            if not os.path.islink(full_path):
+                total += os.path.getsize(full_path)
+    return total
+
+def peak_rss_bytes():
+    """Return the peak resident set size of this process."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def run_size(chunks, args):
+    """Build an index of `chunks` synthetic chunks and time ingestion and queries.
+
+    Meant to run in a fresh worker process: it changes directory to a
+    scratch directory so that ./db and the embedding cache start empty.
+
+    Args:
+        chunks (int): Number of chunks in the corpus
+        args (dict): Benchmark options (see main())
+
+    Returns:
+        dict: Corpus size, ingestion throughput, latency percentiles,
+            retrieval hit rate, on-disk sizes and peak RSS
+    """
+    directory = tempfile.mkdtemp(prefix=f"bench_rag_{chunks}_")
+    os.chdir(directory)
+    try:
+        from llama_index.core import Settings
+        import config
+        from database import initialize_database, ingest_pages
+        from query_engine import retrieve, query_with_sources, warm_up
+
+        Settings.llm = EchoLLM()
+        vocabulary, cdf = make_vocabulary(args["vocabulary"], args["seed"])
+        docs = -(-chunks // args["chunks_per_doc"])
+        index = initialize_database()
+
+        start = time.perf_counter()
+        stored = 0
+        for doc_number in range(docs):
+            pages = min(args["chunks_per_doc"], chunks - doc_number * args["chunks_per_doc"])
+            stats = ingest_pages(
+                f"doc_{doc_number}",
+                iter_document_pages(vocabulary, cdf, args["seed"], doc_number, pages,
+                                    args["words_per_chunk"], config.CHUNK_SIZE),
+                index, f"synthetic_{doc_number}.txt", f"synthetic-{args['seed']}-{doc_number}-{pages}",
+            )
+            stored += stats["chunks"]
+        ingest_seconds = time.perf_counter() - start
+        warm_up(index, args["k"])
+
+        # Held-out phrases: a run of words from a random stored chunk, so every
+        # question is new to the query cache and has a known source chunk
+        rng = np.random.default_rng(args["seed"] + 1)
+        def make_question():
+            doc_number = int(rng.integers(docs))
+            pages = min(args["chunks_per_doc"], chunks - doc_number * args["chunks_per_doc"])
+            page_number = int(rng.integers(1, pages + 1))
+            words = page_text(vocabulary, cdf, args["seed"], doc_number, page_number,
+                              args["words_per_chunk"], config.CHUNK_SIZE).split()
+            offset = int(rng.integers(0, len(words) - args["question_words"]))
+            return " ".join(words[offset:offset + args["question_words"]]), (f"doc_{doc_number}", page_number)
+
+        retrieve_latencies, query_latencies, hits = [], [], 0
+        for _ in range(args["queries"]):
+            question, source = make_question()
+            begin = time.perf_counter()
+            entry = retrieve(question, index, args["k"])
+            retrieve_latencies.append(time.perf_counter() - begin)
+            hits += any((node.metadata.get("doc_id"), node.metadata.get("page_number")) == source
+                        for node in entry["nodes"])
+        for _ in range(args["queries"]):
+            question, _ = make_question()
+            begin = time.perf_counter()
+            query_with_sources(question, index, args["k"])
+            query_latencies.append(time.perf_counter() - begin)
+
+        result = {
+            "chunks": stored,
+            "documents": docs,
+            "ingest_seconds": ingest_seconds,
+            "ingest_chunks_per_sec": stored / ingest_seconds,
+            **{f"retrieve_{key}": value for key, value in percentiles(retrieve_latencies).items()},
+            **{f"query_{key}": value for key, value in percentiles(query_latencies).items()},
+            "retrieve_hit_rate": hits / args["queries"],
+            "index_bytes": directory_size(config.DB_PATH),
+            "embedding_cache_bytes": directory_size(config.EMBEDDING_CACHE_PATH),
+            "peak_rss_bytes": peak_rss_bytes(),
+        }
+        result["config"] = {
+            "vector_store": config.VECTOR_STORE_BACKEND,
+            "retrieval_mode": config.RETRIEVAL_MODE,
+            "rerank": config.RERANK_ENABLED,
+            "ingest_pipeline": config.INGEST_PIPELINE_ENABLED,
+            "embedding_dimensions": Settings.embed_model.service.backend.dimensions,
+            "chunk_size": config.CHUNK_SIZE,
+            "batch_size": config.INGEST_BATCH_SIZE,
+        }
+        return result
+    finally:
+        os.chdir(AGENT_DIR)
+        if args["keep"]:
+            print(f"   Index kept in {directory}")
+        else:
+            shutil.rmtree(directory, ignore_errors=True)
+
+def compare(results, baseline, tolerance):
+    """Print the change of every compared metric against a baseline run.
+
+    Args:
+        results (list): Result rows of this run
+        baseline (list): Result rows of the baseline run
+        tolerance (float): Relative change counted as a regression
+
+    Returns:
+        list: (chunks, metric, change) of every regression
+    """
+    by_size = {row["chunks"]: row for row in baseline}
+    regressions = []
+    for row in results:
+        old = by_size.get(row["chunks"])
+        if old is None:
+            print(f"   {row['chunks']} chunks: not in baseline")
+            continue
+        print(f"   {row['chunks']} chunks:")
+        for metric, higher_is_better in COMPARED_METRICS.items():
+            if not old.get(metric):
+                continue
+            change = row[metric] / old[metric] - 1
+            regressed = (-change if higher_is_better else change) > tolerance
+            if regressed:
+                regressions.append((row["chunks"], metric, change))
+            print(f"     {'⚠️ ' if regressed else '  '}{metric:<24}{old[metric]:>14.2f} -> "
+                  f"{row[metric]:>14.2f} ({change:+.1%})")
+    return regressions
+
+def main():
+    """Run the benchmark for every corpus size and save the results as JSON."""
+    parser = argparse.ArgumentParser(description="Offline RAG ingestion and query benchmark")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Comma-separated corpus sizes in chunks (e.g. add 1000000)")
+    parser.add_argument("--chunks-per-doc", type=int, default=1000, help="Chunks (pages) per document")
+    parser.add_argument("--words-per-chunk", type=int, default=100, help="Words per synthetic chunk (cut to CHUNK_SIZE)")
+    parser.add_argument("--vocabulary", type=int, default=20000, help="Distinct words in the corpus")
+    parser.add_argument("--queries", type=int, default=200, help="Questions timed per measurement")
+    parser.add_argument("--question-words", type=int, default=8, help="Words per question")
+    parser.add_argument("--k", type=int, default=3, help="Chunks retrieved per question")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic corpus")
+    parser.add_argument("--output", default="bench_rag.json", help="JSON file for the results")
+    parser.add_argument("--compare", default=None, help="Earlier results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.1,
+                        help="Relative change counted as a regression with --compare")
+    parser.add_argument("--keep", action="store_true", help="Keep the scratch index of every size")
+    args = parser.parse_args()
+    options = vars(args)
+
+    results = []
+    for chunks in [int(size) for size in args.sizes.split(",")]:
+        print(f"🔄 {chunks} chunks...")
+        # A fresh process per size: peak RSS and module-level caches start from zero
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+            row = pool.submit(run_size, chunks, options).result()
+        results.append(row)
+        print(f"   ingest {row['ingest_chunks_per_sec']:.0f} chunks/s, "
+              f"retrieve p50/p95/p99 {row['retrieve_p50_ms']:.1f}/{row['retrieve_p95_ms']:.1f}/"
+              f"{row['retrieve_p99_ms']:.1f} ms (hit rate {row['retrieve_hit_rate']:.0%}), "
+              f"query p50/p95/p99 {row['query_p50_ms']:.1f}/{row['query_p95_ms']:.1f}/"
+              f"{row['query_p99_ms']:.1f} ms, index {row['index_bytes'] / 2**20:.1f} MB, "
+              f"peak RSS {row['peak_rss_bytes'] / 2**20:.0f} MB")
+
+    report = {
+        "benchmark": "bench_rag",
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "options": {key: value for key, value in options.items()
+                    if key not in ("output", "compare", "tolerance", "keep")},
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"✅ Results written to {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"📊 Compared with {args.compare} (tolerance {args.tolerance:.0%}):")
+        regressions = compare(results, baseline["results"], args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} metric(s) regressed")
+            sys.exit(1)
+        print("✅ No regressions")
+
+if __name__ == "__main__":
+    main()
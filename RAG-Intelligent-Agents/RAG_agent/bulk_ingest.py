@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Bulk ingestion of a directory of documents into the vector database
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from config import CHUNK_SIZE, CHUNK_OVERLAP, INGEST_BATCH_SIZE
+from database import initialize_database, index_document_chunks
+from document_processor import extract_file_chunks
+from manifest import get_manifest
+from utils import list_supported_files, generate_doc_id
+
+def bulk_ingest(directory, index, workers=None, batch_size=INGEST_BATCH_SIZE):
+    """Ingest every supported file under a directory.
+
+    Text extraction and chunking run on a process pool while the calling
+    process acts as the single writer that embeds and upserts chunks in
+    batches. At most two files per worker are in flight at any time, so
+    memory stays bounded however large the directory is.
+
+    Args:
+        directory (str): Directory to scan recursively
+        index: Vector database index
+        workers (int): Number of extraction processes (defaults to CPU count)
+        batch_size (int): Number of chunks embedded and inserted per batch
+
+    Returns:
+        dict: Ingestion statistics
+    """
+    workers = workers or os.cpu_count() or 1
+    manifest = get_manifest()
+    files = list_supported_files(directory)
+    stats = {"files": 0, "skipped": 0, "failed": 0, "chunks_added": 0, "chunks_removed": 0}
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = {}
+        queue = iter(files)
+
+        def submit_next():
+            file_path = next(queue, None)
+            if file_path is None:
+                return False
+            doc_id = generate_doc_id(file_path)
+            future = executor.submit(
+                extract_file_chunks, file_path, CHUNK_SIZE, CHUNK_OVERLAP,
+                manifest.get_document_hash(doc_id),
+            )
+            pending[future] = (file_path, doc_id)
+            return True
+
+        for _ in range(workers * 2):
+            if not submit_next():
+                break
+
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                file_path, doc_id = pending.pop(future)
+                submit_next()
+                stats["files"] += 1
+                try:
+                    content_hash, chunks = future.result()
+                    if chunks is None:
+                        stats["skipped"] += 1
+                        continue
+                    result = index_document_chunks(
+                        doc_id, chunks, index, os.path.basename(file_path), content_hash,
+                        manifest=manifest, batch_size=batch_size,
+                        size_bytes=os.path.getsize(file_path),
+                    )
+                    stats["chunks_added"] += result["added"]
+                    stats["chunks_removed"] += result["removed"]
+                except Exception as e:
+                    stats["failed"] += 1
+                    print(f"❌ Error ingesting '{file_path}': {str(e)}")
+
+    elapsed = time.perf_counter() - start
+    stats["seconds"] = elapsed
+    stats["files_per_sec"] = stats["files"] / elapsed if elapsed else 0.0
+    stats["chunks_per_sec"] = stats["chunks_added"] / elapsed if elapsed else 0.0
+    return stats
+
+def main():
+    """Command line entry point for bulk ingestion."""
+    parser = argparse.ArgumentParser(description="Bulk ingest a directory of PDF and HTML files")
+    parser.add_argument("directory", help="Directory to scan recursively for documents")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of extraction processes (default: CPU count)")
+    parser.add_argument("--batch-size", type=int, default=INGEST_BATCH_SIZE,
+                        help="Chunks embedded and upserted per batch")
+    args = parser.parse_args()
+
+    print("🔄 Initializing database...")
+    index = initialize_database()
+
+    print(f"📂 Ingesting documents from {args.directory}...")
+    stats = bulk_ingest(args.directory, index, workers=args.workers, batch_size=args.batch_size)
+
+    print(f"\n✅ Processed {stats['files']} files in {stats['seconds']:.1f}s "
+          f"({stats['skipped']} unchanged, {stats['failed']} failed)")
+    print(f"   Chunks: {stats['chunks_added']} added, {stats['chunks_removed']} removed")
+    print(f"   Throughput: {stats['files_per_sec']:.2f} files/sec, "
+          f"{stats['chunks_per_sec']:.1f} chunks/sec")
+
+if __name__ == "__main__":
+    main()
@@ -2,20 +2,109 @@
 Configuration file for the RAG system
 """
 import os
-from llama_index.core import Settings
-from llama_index.embeddings.openai import OpenAIEmbedding
+
+# Embedding backend: "openai" for production, "hash" for a deterministic local stand-in
+EMBEDDING_BACKEND = os.getenv("RAG_EMBEDDING_BACKEND", "openai")
 
 # Set OpenAI API key
 openai_key = os.getenv("OPENAI_API_KEY", "Please enter your OpenAI API key here")
 
 # Verify API key is set
-if not openai_key or openai_key == "Please enter your OpenAI API key here":
+if EMBEDDING_BACKEND == "openai" and (
+    not openai_key or openai_key == "Please enter your OpenAI API key here"
+):
     raise RuntimeError("Please set the OPENAI_API_KEY environment variable or update config.py with your key.")
 
-# Initialize embeddings settings
-Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large")
-
 # Database configuration
 DB_PATH = "./db"
 COLLECTION_NAME = "documents"
 EMBEDDING_MODEL = "text-embedding-3-large"
+# Output dimension requested from the embedding model (None = the model's full size).
+# text-embedding-3 models are Matryoshka-trained, so e.g. 1024 or 256 keeps most of
+# the quality at a fraction of the storage; an index only accepts the dimension it was built with.
+EMBEDDING_DIMENSIONS = int(os.getenv("RAG_EMBEDDING_DIMENSIONS", "0")) or None
+MANIFEST_PATH = os.path.join(DB_PATH, "manifest.sqlite3")
+SPARSE_INDEX_PATH = os.path.join(DB_PATH, "sparse_index.sqlite3")
+
+# Ingestion configuration
+CHUNK_SIZE = 1024          # Maximum characters per chunk
+CHUNK_OVERLAP = 128        # Characters shared between consecutive chunks
+INGEST_BATCH_SIZE = 64     # Chunks embedded and upserted per batch
+
+# Chroma HNSW index parameters. M (graph degree) and ef_construction only apply
+# when a collection is created; ef_search (candidate list size at query time)
+# is applied to existing collections too. Use hnsw_sweep.py to pick values.
+HNSW_M = int(os.getenv("RAG_HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("RAG_HNSW_EF_CONSTRUCTION", "100"))
+HNSW_EF_SEARCH = int(os.getenv("RAG_HNSW_EF_SEARCH", "100"))
+
+# Staged ingestion pipeline: page extraction -> chunking -> embedding -> upserts,
+# with bounded queues between the stages (extraction concurrency is PDF_EXTRACT_WORKERS;
+# chunking is a single thread because chunk IDs depend on document order). Off by
+# default: ingestion jobs already run on worker threads
+INGEST_PIPELINE_ENABLED = os.getenv("RAG_INGEST_PIPELINE", "false").lower() == "true"
+PIPELINE_PAGE_QUEUE_SIZE = 32   # Extracted pages buffered ahead of chunking
+PIPELINE_BATCH_QUEUE_SIZE = 4   # Chunk batches buffered ahead of embedding and of upserts
+PIPELINE_EMBED_WORKERS = 4      # Batches being embedded at once
+PIPELINE_UPSERT_WORKERS = 1     # Batches being written to the vector store at once
+
+# Background ingestion jobs (Streamlit uploads). Pending uploads are persisted in the
+# job database, content included, until their job ends, so queued work survives a restart
+INGEST_JOBS_PATH = os.path.join(DB_PATH, "ingest_jobs.sqlite3")
+INGEST_JOB_WORKERS = 2     # Documents ingested concurrently
+INGEST_JOB_LEASE = 60      # Seconds a running job survives without a heartbeat
+
+# Embedding service configuration
+EMBED_BATCH_SIZE = 256          # Maximum texts per embedding request
+EMBED_BATCH_MAX_TOKENS = 100000 # Maximum estimated tokens per embedding request
+EMBED_FLUSH_INTERVAL = 0.05     # Seconds to wait for more texts before flushing a batch
+EMBED_CONCURRENCY = 4           # Embedding requests in flight at once
+
+# Persistent embedding cache (kept outside DB_PATH so it survives index rebuilds)
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_PATH = "./embedding_cache"
+EMBEDDING_CACHE_MAX_BYTES = 2 * 1024**3  # Vector storage budget before LRU eviction
+
+# Query cache configuration
+QUERY_CACHE_SIZE = 256     # Retrieval/answer entries kept in memory
+QUERY_CACHE_TTL = 600      # Seconds before a cached entry expires
+
+# Semantic answer cache (reuses answers to near-duplicate questions)
+SEMANTIC_CACHE_ENABLED = os.getenv("RAG_SEMANTIC_CACHE", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = 0.95   # Minimum cosine similarity for a cache hit
+SEMANTIC_CACHE_SIZE = 1024        # Answers kept before LRU eviction
+
+# Batch query configuration
+BATCH_QUERY_CONCURRENCY = 8   # Questions answered concurrently
+BATCH_QUERY_TIMEOUT = 120     # Seconds allowed per question
+
+# Retrieval configuration
+RETRIEVAL_MODE = os.getenv("RAG_RETRIEVAL_MODE", "vector")  # "vector" or "hybrid" (BM25 + vector)
+HYBRID_CANDIDATES = 20     # Candidates taken from each retriever before fusion
+RRF_K = 60                 # Reciprocal rank fusion constant
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Post-retrieval reranking (MMR de-duplication + lexical rerank before synthesis)
+RERANK_ENABLED = os.getenv("RAG_RERANK", "false").lower() == "true"
+RERANK_CANDIDATES = 20       # Candidates over-fetched for the reranker
+RERANK_TOP_N = int(os.getenv("RAG_RERANK_TOP_N", "2"))  # Nodes sent to synthesis (at most k)
+RERANK_MMR_LAMBDA = 0.7      # MMR trade-off: 1.0 = relevance only, 0.0 = diversity only
+RERANK_LEXICAL_WEIGHT = 0.3  # Weight of query-term coverage in the final score
+RERANK_DUPLICATE_SIMILARITY = 0.95  # Cosine above which a candidate repeats a kept one
+
+# PDF extraction configuration
+PDF_EXTRACT_WORKERS = None      # Extraction processes for large PDFs (None = CPU count)
+PDF_PARALLEL_MIN_PAGES = 64     # Smaller PDFs are extracted in-process
+PDF_PAGES_PER_TASK = 16         # Pages extracted per worker task
+
+# Vector store backend: "chroma" (persistent Chroma collection) or "flat"
+# (memory-mapped matrix with exact search, for collections under ~500k chunks)
+VECTOR_STORE_BACKEND = os.getenv("RAG_VECTOR_STORE", "chroma")
+FLAT_STORE_PATH = os.path.join(DB_PATH, "flat")
+FLAT_SEARCH_BLOCK_ROWS = 65536   # Rows scored per matrix product in flat search
+FLAT_QUANTIZATION = os.getenv("RAG_FLAT_QUANTIZATION", "none")  # "none", "int8" or "binary"
+FLAT_RESCORE_MULTIPLIER = 10     # Quantized shortlist size as a multiple of k before exact rescoring
+# Two-stage flat search: first pass over the leading dimensions of each embedding,
+# then the shortlist is rescored at full dimension (0 = single-stage)
+FLAT_SEARCH_DIMENSIONS = int(os.getenv("RAG_FLAT_SEARCH_DIMENSIONS", "0"))
@@ -1,13 +1,33 @@
 """
 Database operations for storing and retrieving documents
 """
+import os
+import math
+import threading
 import chromadb
-from llama_index.core import VectorStoreIndex, Document, Settings
-from llama_index.embeddings.openai import OpenAIEmbedding
+from itertools import islice
+from llama_index.core import VectorStoreIndex, Document
+from llama_index.core.schema import TextNode, NodeRelationship, RelatedNodeInfo, NodeWithScore
+from llama_index.core.vector_stores.types import VectorStoreQuery
+from llama_index.core.vector_stores.utils import metadata_dict_to_node
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.core import StorageContext
-from config import DB_PATH, COLLECTION_NAME, EMBEDDING_MODEL
-from document_processor import extract_text_from_file
+from config import (
+    DB_PATH, COLLECTION_NAME,
+    CHUNK_SIZE, CHUNK_OVERLAP, INGEST_BATCH_SIZE, RETRIEVAL_MODE,
+    VECTOR_STORE_BACKEND, FLAT_STORE_PATH, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH,
+    INGEST_PIPELINE_ENABLED,
+)
+from document_processor import extract_text_from_file, iter_pages, chunk_pages, as_buffer
+from embeddings import configure_embeddings
+from flat_store import FlatVectorStore
+from manifest import get_manifest
+from query_cache import bump_index_version
+from sparse_index import get_sparse_index
+from utils import compute_file_hash, compute_data_hash, compute_text_hash
+
+# Node metadata that is useful for filtering but should not be embedded
+CHUNK_METADATA_EXCLUDED_FROM_EMBED = ["doc_id", "source"]
 
 def initialize_database():
     """Initialize and return the vector database index.
@@ -16,34 +36,589 @@ def initialize_database():
         VectorStoreIndex: Initialized vector database index
     """
     try:
-        # Initialize embeddings & Chroma vector DB
-        Settings.embed_model = OpenAIEmbedding(model=EMBEDDING_MODEL)
-        
-        # Initialize Chroma
-        chroma_client = chromadb.PersistentClient(path=DB_PATH)
-        chroma_collection = chroma_client.get_or_create_collection(COLLECTION_NAME)
+        # Initialize embeddings & vector DB
+        embed_model = configure_embeddings()
         
         # Create vector store and index
-        vector_store = ChromaVectorStore(chroma_collection=chroma_collection)
+        vector_store = create_vector_store()
+        check_index_dimensions(vector_store, embed_model.service.backend.dimensions)
         storage_context = StorageContext.from_defaults(vector_store=vector_store)
         index = VectorStoreIndex([], storage_context=storage_context)
         
+        if RETRIEVAL_MODE == "hybrid":
+            backfill_sparse_index(index)
+        
         return index
     except Exception as e:
         raise Exception(f"Error initializing database: {str(e)}")
 
-def store_document_to_db(file_path, doc_id, index):
+def create_vector_store(backend=VECTOR_STORE_BACKEND):
+    """Open the vector store selected in the configuration.
+    
+    Args:
+        backend (str): "chroma" or "flat"
+        
+    Returns:
+        BasePydanticVectorStore: Vector store for COLLECTION_NAME
+        
+    Raises:
+        ValueError: If the backend is unknown
+    """
+    if backend == "flat":
+        return FlatVectorStore(os.path.join(FLAT_STORE_PATH, COLLECTION_NAME))
+    elif backend == "chroma":
+        chroma_client = chromadb.PersistentClient(path=DB_PATH)
+        chroma_collection = open_chroma_collection(chroma_client, COLLECTION_NAME)
+        return ChromaVectorStore(chroma_collection=chroma_collection)
+    else:
+        raise ValueError(f"Unknown vector store backend: {backend}. Use 'chroma' or 'flat'.")
+
+def open_chroma_collection(client, name, m=HNSW_M, ef_construction=HNSW_EF_CONSTRUCTION,
+                           ef_search=HNSW_EF_SEARCH):
+    """Open or create a Chroma collection with the given HNSW parameters.
+    
+    M and ef_construction shape the graph, so they only take effect when
+    the collection is created; a mismatch on an existing collection is
+    reported but not applied. ef_search is updated in place and used the
+    next time the index is loaded, so recall can be traded for latency
+    without re-indexing.
+    
+    Chroma 1.x takes the parameters as a collection configuration; older
+    releases, which have no configuration argument, read them from the
+    "hnsw:M", "hnsw:construction_ef" and "hnsw:search_ef" metadata keys.
+    
+    Args:
+        client (chromadb.ClientAPI): Chroma client
+        name (str): Collection name
+        m (int): Maximum neighbours per node in the HNSW graph
+        ef_construction (int): Candidate list size while building the graph
+        ef_search (int): Candidate list size while searching
+        
+    Returns:
+        chromadb.Collection: The collection
+    """
+    try:
+        collection = client.get_or_create_collection(name, configuration={
+            "hnsw": {"max_neighbors": m, "ef_construction": ef_construction, "ef_search": ef_search},
+        })
+    except TypeError:
+        # chromadb < 1.0
+        return open_legacy_chroma_collection(client, name, m, ef_construction, ef_search)
+    hnsw = (collection.configuration or {}).get("hnsw") or {}
+    if hnsw.get("ef_search") != ef_search:
+        collection.modify(configuration={"hnsw": {"ef_search": ef_search}})
+    warn_hnsw_mismatch(name, hnsw.get("max_neighbors"), hnsw.get("ef_construction"), m, ef_construction)
+    return collection
+
+def open_legacy_chroma_collection(client, name, m, ef_construction, ef_search):
+    """Open or create a collection with HNSW parameters in its metadata.
+    
+    Used with chromadb releases before 1.0, see open_chroma_collection().
+    
+    Args:
+        client (chromadb.ClientAPI): Chroma client
+        name (str): Collection name
+        m (int): Maximum neighbours per node in the HNSW graph
+        ef_construction (int): Candidate list size while building the graph
+        ef_search (int): Candidate list size while searching
+        
+    Returns:
+        chromadb.Collection: The collection
+    """
+    collection = client.get_or_create_collection(name, metadata={
+        "hnsw:M": m, "hnsw:construction_ef": ef_construction, "hnsw:search_ef": ef_search,
+    })
+    metadata = collection.metadata or {}
+    if metadata.get("hnsw:search_ef") != ef_search:
+        # modify() replaces the whole metadata dict
+        collection.modify(metadata={**metadata, "hnsw:search_ef": ef_search})
+    warn_hnsw_mismatch(name, metadata.get("hnsw:M"), metadata.get("hnsw:construction_ef"),
+                       m, ef_construction)
+    return collection
+
+def warn_hnsw_mismatch(name, built_m, built_ef_construction, m, ef_construction):
+    """Report a collection whose graph was built with other parameters.
+    
+    Args:
+        name (str): Collection name
+        built_m (int): M the collection was built with
+        built_ef_construction (int): ef_construction it was built with
+        m (int): Configured M
+        ef_construction (int): Configured ef_construction
+    """
+    if (built_m, built_ef_construction) != (m, ef_construction):
+        print(f"⚠️  Collection '{name}' was built with M={built_m}, "
+              f"ef_construction={built_ef_construction}; rebuild it to use "
+              f"M={m}, ef_construction={ef_construction}")
+
+def check_index_dimensions(vector_store, dimensions):
+    """Record the embedding dimension of an index and reject a mismatch.
+    
+    A Chroma collection keeps the dimension in its metadata (collections
+    built before it was recorded are checked against a stored embedding);
+    the flat store keeps it in its sidecar.
+    
+    Args:
+        vector_store (BasePydanticVectorStore): Store behind the index
+        dimensions (int): Dimension of the configured embedding model
+        
+    Raises:
+        ValueError: If the index was built with a different dimension
+    """
+    if not dimensions:
+        return
+    if isinstance(vector_store, FlatVectorStore):
+        built = vector_store.dimensions
+    else:
+        collection = vector_store.client
+        metadata = collection.metadata or {}
+        built = metadata.get("embedding_dimensions")
+        if built is None:
+            sample = collection.get(limit=1, include=["embeddings"])["embeddings"]
+            if sample is not None and len(sample):
+                built = len(sample[0])
+            if not built or built == dimensions:
+                collection.modify(metadata={**metadata, "embedding_dimensions": dimensions})
+    if built and built != dimensions:
+        raise ValueError(
+            f"Index was built with {built}-dimensional embeddings but the embedding model "
+            f"returns {dimensions}. Set RAG_EMBEDDING_DIMENSIONS={built} or rebuild {DB_PATH}."
+        )
+
+def assign_chunk_ids(chunks, doc_id):
+    """Attach content-derived IDs and hashes to a stream of chunks.
+    
+    The ID of a chunk depends only on its document, page and text, so an
+    unchanged chunk keeps its ID across re-ingestion runs. Identical chunks
+    on the same page get an occurrence suffix to keep IDs unique.
+    
+    Args:
+        chunks (iterable): Chunk dicts with 'text' and 'page_number' keys
+        doc_id (str): Identifier of the parent document
+        
+    Yields:
+        dict: Chunk with added 'chunk_id' and 'chunk_hash' keys
+    """
+    occurrences = {}
+    for chunk in chunks:
+        chunk_hash = compute_text_hash(f"{chunk['page_number']}\x00{chunk['text']}")
+        occurrence = occurrences.get(chunk_hash, 0)
+        occurrences[chunk_hash] = occurrence + 1
+        
+        chunk_id = f"{doc_id}:{chunk_hash[:16]}"
+        if occurrence:
+            chunk_id = f"{chunk_id}-{occurrence}"
+        yield {**chunk, "chunk_id": chunk_id, "chunk_hash": chunk_hash}
+
+def build_chunk_node(chunk, doc_id, source):
+    """Create a TextNode for a chunk that belongs to a document.
+    
+    Args:
+        chunk (dict): Chunk with 'chunk_id', 'text' and 'page_number' keys,
+            and optionally the 'section' heading path of HTML chunks
+        doc_id (str): Identifier of the parent document
+        source (str): Name of the file the chunk was extracted from
+        
+    Returns:
+        TextNode: Node linked to its parent document
+    """
+    metadata = {
+        "doc_id": doc_id,
+        "source": source,
+        "page_number": chunk["page_number"],
+    }
+    if chunk.get("section"):
+        metadata["section"] = chunk["section"]
+    return TextNode(
+        id_=chunk["chunk_id"],
+        text=chunk["text"],
+        metadata=metadata,
+        excluded_embed_metadata_keys=CHUNK_METADATA_EXCLUDED_FROM_EMBED,
+        relationships={NodeRelationship.SOURCE: RelatedNodeInfo(node_id=doc_id)},
+    )
+
+def iter_batches(items, batch_size):
+    """Group an iterable into lists of at most batch_size items.
+    
+    Args:
+        items (iterable): Items to group
+        batch_size (int): Maximum number of items per batch
+        
+    Yields:
+        list: Next batch of items
+    """
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def backfill_sparse_index(index, manifest=None, batch_size=500):
+    """Add chunks that are in the manifest but missing from the sparse index.
+    
+    This covers chunks ingested before the sparse index existed. When the
+    chunk counts already match, it returns without touching the store.
+    
+    Args:
+        index: Vector database index
+        manifest (DocumentManifest): Manifest listing the stored chunks
+        batch_size (int): Number of chunks fetched from the store at a time
+        
+    Returns:
+        int: Number of chunks added to the sparse index
+    """
+    manifest = manifest or get_manifest()
+    sparse_index = get_sparse_index()
+    if len(sparse_index) >= manifest.count_chunks():
+        return 0
+    
+    missing = [
+        chunk_id for chunk_id in manifest.get_all_chunk_ids()
+        if not sparse_index.contains(chunk_id)
+    ]
+    for batch in iter_batches(missing, batch_size):
+        nodes = index.vector_store.get_nodes(node_ids=batch)
+        sparse_index.add_chunks((node.node_id, node.get_content()) for node in nodes)
+    return len(missing)
+
+def delete_chunks(index, chunk_ids):
+    """Delete chunks from the vector store by ID.
+    
+    Args:
+        index: Vector database index
+        chunk_ids (list): IDs of the chunks to delete
+    """
+    if chunk_ids:
+        index.vector_store.delete_nodes(node_ids=list(chunk_ids))
+
+def get_node_embeddings(index, node_ids):
+    """Fetch the stored embeddings of nodes by ID.
+    
+    Args:
+        index: Vector database index
+        node_ids (list): IDs of the nodes
+        
+    Returns:
+        dict: Node ID to embedding, for the nodes whose embedding is stored
+    """
+    if not node_ids:
+        return {}
+    vector_store = index.vector_store
+    if isinstance(vector_store, FlatVectorStore):
+        return vector_store.get_embeddings(node_ids)
+    if isinstance(vector_store, ChromaVectorStore):
+        response = vector_store.client.get(ids=list(node_ids), include=["embeddings"])
+        return dict(zip(response["ids"], response["embeddings"]))
+    return {
+        node.node_id: node.embedding
+        for node in vector_store.get_nodes(node_ids=list(node_ids))
+        if node.embedding is not None
+    }
+
+def query_vector_store_batch(index, query_embeddings, k=3, batch_size=256):
+    """Run one nearest-neighbour search for many query embeddings.
+    
+    Chroma collections are searched with a single multi-query request per
+    batch_size queries and the flat store scores a whole batch in one pass;
+    other vector stores fall back to one query each.
+    
+    Args:
+        index: Vector database index
+        query_embeddings (list): One embedding per query
+        k (int): Number of nodes to return per query
+        batch_size (int): Maximum number of queries per search request
+        
+    Returns:
+        list: One ranked list of NodeWithScore per query embedding
+    """
+    vector_store = index.vector_store
+    if isinstance(vector_store, FlatVectorStore):
+        results = []
+        for batch in iter_batches(query_embeddings, batch_size):
+            results.extend(
+                [NodeWithScore(node=node, score=score)
+                 for node, score in zip(result.nodes, result.similarities)]
+                for result in vector_store.query_batch(batch, k)
+            )
+        return results
+    
+    if not isinstance(vector_store, ChromaVectorStore):
+        results = []
+        for query_embedding in query_embeddings:
+            result = vector_store.query(
+                VectorStoreQuery(query_embedding=query_embedding, similarity_top_k=k)
+            )
+            results.append([
+                NodeWithScore(node=node, score=score)
+                for node, score in zip(result.nodes, result.similarities)
+            ])
+        return results
+    
+    results = []
+    for batch in iter_batches(query_embeddings, batch_size):
+        response = vector_store.client.query(
+            query_embeddings=batch,
+            n_results=k,
+            include=["documents", "metadatas", "distances"],
+        )
+        for texts, metadatas, distances in zip(
+            response["documents"], response["metadatas"], response["distances"]
+        ):
+            # Same distance-to-similarity mapping as ChromaVectorStore.query
+            results.append([
+                NodeWithScore(node=metadata_dict_to_node(metadata, text=text),
+                              score=math.exp(-distance))
+                for text, metadata, distance in zip(texts, metadatas, distances)
+            ])
+    return results
+
+class ChunkSync:
+    """Bookkeeping for bringing the stored chunks of one document in line
+    with a new chunk stream.
+    
+    Shared by index_document_chunks() and pipeline.IngestPipeline:
+    new_chunks() diffs the stream against the manifest, write_batch()
+    stores a batch of new chunks and finish() deletes the chunks that no
+    longer appear and registers the document. A document without chunk
+    IDs in the manifest has any nodes stored under its ID deleted first. write_batch() may be called
+    from several threads at once.
+    """
+    
+    def __init__(self, doc_id, index, source, content_hash, manifest=None, size_bytes=None,
+                 progress=None, sparse_index=None):
+        """Start syncing a document.
+        
+        Args:
+            doc_id (str): Unique identifier for the document
+            index: Vector database index
+            source (str): Name of the file the chunks were extracted from
+            content_hash (str): Hash of the document content
+            manifest (DocumentManifest): Manifest to diff against
+            size_bytes (int): Size of the source file, kept in the registry
+            progress (callable): Called as progress(pages, chunks) with the
+                pages seen and chunks stored so far, after every batch
+            sparse_index (SparseIndex): Sparse index to update (default:
+                the shared one)
+        """
+        self.doc_id = doc_id
+        self.index = index
+        self.source = source
+        self.content_hash = content_hash
+        self.manifest = manifest or get_manifest()
+        self.size_bytes = size_bytes
+        self.progress = progress
+        self.sparse_index = sparse_index if sparse_index is not None else get_sparse_index()
+        self.existing_ids = self.manifest.get_chunk_ids(doc_id)
+        if not self.existing_ids:
+            # Nothing to diff against: the document is new, or was inserted
+            # whole (non-streaming path, or before chunk IDs were recorded)
+            # with node IDs assigned by LlamaIndex. Remove the latter by
+            # document ID, as delete_document() does, so they are not kept
+            # next to the new chunks.
+            index.vector_store.delete(ref_doc_id=doc_id)
+            bump_index_version(index)
+        self.current_ids = set()
+        self.pages = set()
+        self.added = 0
+        self._lock = threading.Lock()
+    
+    def new_chunks(self, chunks):
+        """Assign chunk IDs and drop the chunks the manifest already has.
+        
+        Args:
+            chunks (iterable): Chunk dicts with 'text' and 'page_number' keys
+            
+        Yields:
+            dict: Chunks that still need to be stored, with their IDs
+        """
+        for chunk in assign_chunk_ids(chunks, self.doc_id):
+            self.current_ids.add(chunk["chunk_id"])
+            self.pages.add(chunk["page_number"])
+            if chunk["chunk_id"] not in self.existing_ids:
+                yield chunk
+    
+    def write_batch(self, batch, nodes=None):
+        """Store a batch of new chunks and record them in the manifest.
+        
+        Args:
+            batch (list): Chunks yielded by new_chunks()
+            nodes (list): Nodes of the chunks with their embeddings set;
+                built (and embedded on insert) when not given
+        """
+        if nodes is None:
+            nodes = [build_chunk_node(chunk, self.doc_id, self.source) for chunk in batch]
+        self.index.insert_nodes(nodes)
+        self.sparse_index.add_chunks((chunk["chunk_id"], chunk["text"]) for chunk in batch)
+        self.manifest.add_chunks(self.doc_id, batch)
+        bump_index_version(self.index)
+        with self._lock:
+            self.added += len(batch)
+            if self.progress is not None:
+                self.progress(len(self.pages), self.added)
+    
+    def finish(self):
+        """Delete stale chunks and register the document.
+        
+        Returns:
+            dict: Counts of 'chunks', 'added' and 'removed' chunks
+        """
+        stale_ids = self.existing_ids - self.current_ids
+        if stale_ids:
+            delete_chunks(self.index, stale_ids)
+            self.sparse_index.remove_chunks(stale_ids)
+            self.manifest.remove_chunks(stale_ids)
+            bump_index_version(self.index)
+        self.manifest.set_document(self.doc_id, self.source, self.content_hash,
+                                   size_bytes=self.size_bytes, page_count=len(self.pages),
+                                   chunk_count=len(self.current_ids))
+        if self.progress is not None:
+            self.progress(len(self.pages), self.added)
+        return {"chunks": len(self.current_ids), "added": self.added, "removed": len(stale_ids)}
+
+def index_document_chunks(doc_id, chunks, index, source, content_hash,
+                          manifest=None, batch_size=INGEST_BATCH_SIZE, size_bytes=None,
+                          progress=None, sparse_index=None):
+    """Bring the stored chunks of a document in line with a new chunk stream.
+    
+    Chunks whose IDs are already in the manifest are left untouched, new
+    chunks are embedded and inserted batch_size at a time, and chunks that
+    no longer appear are deleted. The manifest is updated after every
+    batch, so an interrupted run resumes without re-embedding.
+    
+    Args:
+        doc_id (str): Unique identifier for the document
+        chunks (iterable): Chunk dicts with 'text' and 'page_number' keys
+        index: Vector database index
+        source (str): Name of the file the chunks were extracted from
+        content_hash (str): Hash of the document content
+        manifest (DocumentManifest): Manifest to diff against
+        batch_size (int): Number of chunks embedded and inserted per batch
+        size_bytes (int): Size of the source file, kept in the registry
+        progress (callable): Called as progress(pages, chunks) with the
+            pages extracted and chunks embedded so far, after every batch
+        sparse_index (SparseIndex): Sparse index to update (default: the
+            shared one)
+        
+    Returns:
+        dict: Counts of 'chunks', 'added' and 'removed' chunks
+    """
+    sync = ChunkSync(doc_id, index, source, content_hash, manifest=manifest,
+                     size_bytes=size_bytes, progress=progress, sparse_index=sparse_index)
+    for batch in iter_batches(sync.new_chunks(chunks), batch_size):
+        sync.write_batch(batch)
+    return sync.finish()
+
+def store_document_streaming(file_path, doc_id, index, batch_size=INGEST_BATCH_SIZE,
+                             manifest=None, data=None, progress=None):
+    """Store a document page by page as size-bounded chunks.
+    
+    Pages are read lazily and split into chunks which are embedded and
+    upserted batch_size at a time, so peak memory depends on the batch
+    size rather than on the size of the file. Files whose content hash
+    matches the manifest are skipped without being parsed.
+    
+    When data is given (e.g. an upload), it is hashed and parsed in place
+    and file_path only supplies the name and type of the document.
+    
+    Args:
+        file_path (str): Path to the document file, or its name when data
+            is given
+        doc_id (str): Unique identifier for the document
+        index: Vector database index
+        batch_size (int): Number of chunks embedded and inserted per batch
+        manifest (DocumentManifest): Manifest to diff against
+        data (bytes-like or file-like): Content of the document
+        progress (callable): Called as progress(pages, chunks) after every
+            batch, see index_document_chunks()
+        
+    Returns:
+        dict: Counts of 'chunks', 'added' and 'removed' chunks, or None if
+            the document is unchanged
+    """
+    manifest = manifest or get_manifest()
+    if data is None:
+        content_hash = compute_file_hash(file_path)
+        size_bytes = os.path.getsize(file_path)
+    else:
+        data = as_buffer(data)
+        content_hash = compute_data_hash(data)
+        size_bytes = data.nbytes
+    if manifest.get_document_hash(doc_id) == content_hash:
+        return None
+    
+    return ingest_pages(
+        doc_id, iter_pages(file_path, data=data), index, os.path.basename(file_path), content_hash,
+        manifest=manifest, batch_size=batch_size, size_bytes=size_bytes, progress=progress,
+    )
+
+def ingest_pages(doc_id, pages, index, source, content_hash, manifest=None,
+                 batch_size=INGEST_BATCH_SIZE, size_bytes=None, progress=None):
+    """Chunk, embed and store a stream of pages.
+    
+    With INGEST_PIPELINE_ENABLED the stages run concurrently through
+    pipeline.IngestPipeline, otherwise one after another through
+    index_document_chunks().
+    
+    Args:
+        doc_id (str): Unique identifier for the document
+        pages (iterable): (page_number, text) or (page_number, text,
+            section) tuples, as yielded by iter_pages()
+        index: Vector database index
+        source (str): Name of the file the pages were extracted from
+        content_hash (str): Hash of the document content
+        manifest (DocumentManifest): Manifest to diff against
+        batch_size (int): Number of chunks embedded and inserted per batch
+        size_bytes (int): Size of the source file, kept in the registry
+        progress (callable): Called as progress(pages, chunks) after every
+            batch, see index_document_chunks()
+        
+    Returns:
+        dict: Counts of 'chunks', 'added' and 'removed' chunks
+    """
+    if INGEST_PIPELINE_ENABLED:
+        # Imported here because pipeline builds on the helpers in this module
+        from pipeline import run_pipeline
+        return run_pipeline(
+            doc_id, pages, index, source, content_hash, manifest=manifest,
+            batch_size=batch_size, size_bytes=size_bytes, progress=progress,
+        )
+    
+    chunks = chunk_pages(pages, CHUNK_SIZE, CHUNK_OVERLAP)
+    return index_document_chunks(
+        doc_id, chunks, index, source, content_hash,
+        manifest=manifest, batch_size=batch_size, size_bytes=size_bytes, progress=progress,
+    )
+
+def store_document_to_db(file_path, doc_id, index, streaming=True, data=None):
     """Store a document in the vector database.
     
     Args:
-        file_path (str): Path to the document file
+        file_path (str): Path to the document file, or its name when data
+            is given
         doc_id (str): Unique identifier for the document
         index: Vector database index
+        streaming (bool): Ingest page by page in chunked batches instead of
+            inserting the whole text as a single document
+        data (bytes-like or file-like): Content of the document, ingested
+            in memory without a temporary file (streaming only)
         
     Returns:
         bool: True if successful, False otherwise
     """
     try:
+        if data is not None and not streaming:
+            raise ValueError("In-memory documents can only be ingested with streaming=True")
+        if streaming:
+            stats = store_document_streaming(file_path, doc_id, index, data=data)
+            if stats is None:
+                print(f"⏭️ Document '{doc_id}' is unchanged, skipping.")
+            else:
+                print(f"✅ Document '{doc_id}' stored successfully "
+                      f"({stats['added']} added, {stats['removed']} removed, "
+                      f"{stats['chunks']} total chunks).")
+            return True
+        
         # Extract text from file
         text = extract_text_from_file(file_path)
         
@@ -52,6 +627,14 @@ def store_document_to_db(file_path, doc_id, index):
         
         # Insert document into index
         index.insert(document)
+        bump_index_version(index)
+        
+        # Register the document; its chunk IDs are assigned by LlamaIndex,
+        # so delete_document removes them by document ID instead
+        get_manifest().set_document(
+            doc_id, os.path.basename(file_path), compute_file_hash(file_path),
+            size_bytes=os.path.getsize(file_path),
+        )
         
         print(f"✅ Document '{doc_id}' stored successfully.")
         return True
@@ -63,22 +646,28 @@ def store_document_to_db(file_path, doc_id, index):
 def list_documents(index):
     """List all documents in the database.
     
+    Documents are read from the registry, so listing never scans the
+    vector store.
+    
     Args:
         index: Vector database index
         
     Returns:
-        list: List of document IDs
+        list: Document records with 'doc_id', 'source', 'content_hash',
+            'updated_at', 'size_bytes', 'page_count' and 'chunk_count' keys
     """
     try:
-        # This would need to be implemented based on the specific vector store
-        # For now, we'll return a placeholder
-        return ["doc1", "doc2"]  # Placeholder
+        return get_manifest().list_documents()
     except Exception as e:
         print(f"❌ Error listing documents: {str(e)}")
         return []
 
 def delete_document(doc_id, index):
-    """Delete a document from the database.
+    """Delete a document and all of its chunks from the database.
+    
+    The chunk IDs come from the registry and are removed from the vector
+    store in a single batched delete, then from the sparse index and the
+    registry itself.
     
     Args:
         doc_id (str): Document ID to delete
@@ -88,9 +677,22 @@ def delete_document(doc_id, index):
         bool: True if successful, False otherwise
     """
     try:
-        # This would need to be implemented based on the specific vector store
-        # For now, we'll return a placeholder
-        print(f"✅ Document '{doc_id}' deleted successfully.")
+        manifest = get_manifest()
+        if manifest.get_document(doc_id) is None:
+            print(f"❌ Document '{doc_id}' not found.")
+            return False
+        
+        chunk_ids = manifest.get_chunk_ids(doc_id)
+        if chunk_ids:
+            delete_chunks(index, chunk_ids)
+            get_sparse_index().remove_chunks(chunk_ids)
+        else:
+            # Inserted whole by the non-streaming path
+            index.vector_store.delete(ref_doc_id=doc_id)
+        manifest.remove_document(doc_id)
+        bump_index_version(index)
+        
+        print(f"✅ Document '{doc_id}' deleted successfully ({len(chunk_ids)} chunks).")
         return True
     except Exception as e:
         print(f"❌ Error deleting document '{doc_id}': {str(e)}")
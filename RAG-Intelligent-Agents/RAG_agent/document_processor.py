@@ -1,43 +1,485 @@
 """
 Document processing utilities for extracting text from various file formats
 """
+import codecs
+import os
+import re
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import fitz  # PyMuPDF
 from bs4 import BeautifulSoup
+from config import CHUNK_SIZE, PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_PAGES_PER_TASK
+from utils import compute_file_hash, clean_text
+
+try:
+    from lxml import etree
+except ImportError:  # Fall back to BeautifulSoup's html.parser
+    etree = None
+
+# Elements whose content is never document text
+HTML_SKIPPED_TAGS = frozenset({
+    "script", "style", "noscript", "template", "iframe", "svg", "canvas",
+    "nav", "footer", "aside", "form", "button", "select", "dialog",
+})
+
+# ARIA roles and class/id words that mark site chrome rather than content
+HTML_BOILERPLATE_ROLES = frozenset({"navigation", "banner", "contentinfo", "search", "complementary"})
+HTML_BOILERPLATE_WORDS = frozenset({
+    "nav", "navbar", "navigation", "menu", "breadcrumb", "breadcrumbs", "footer",
+    "sidebar", "cookie", "cookies", "banner", "skip", "share", "social",
+})
+
+# Containers that hold the main content and are never treated as boilerplate
+HTML_CONTENT_TAGS = frozenset({"html", "body", "main", "article"})
+
+# Elements that start a new line of text
+HTML_BLOCK_TAGS = frozenset({
+    "p", "div", "section", "article", "main", "header", "li", "ul", "ol", "dl", "dt", "dd",
+    "table", "tr", "td", "th", "blockquote", "pre", "br", "hr", "figure", "figcaption",
+    "h1", "h2", "h3", "h4", "h5", "h6",
+})
+
+HTML_HEADING_LEVELS = {f"h{level}": level for level in range(1, 7)}
 
 def extract_text_from_pdf(pdf_path):
     """Extract text from a PDF file.
     
+    Pages are collected in a list and joined once, so the cost is linear
+    in the size of the document.
+    
     Args:
-        pdf_path (str): Path to the PDF file
+        pdf_path (str, bytes-like or file-like): Path to the PDF file, or
+            its content
         
     Returns:
         str: Extracted text content
     """
-    text = ""
-    try:
-        with fitz.open(pdf_path) as pdf:
-            for page in pdf:
-                text += page.get_text("text") + "\n"
-    except Exception as e:
-        raise Exception(f"Error reading PDF file {pdf_path}: {str(e)}")
+    return "".join(text + "\n" for _, text in iter_pdf_pages(pdf_path))
+
+def open_pdf(source):
+    """Open a PDF from a path or from its content in memory.
+    
+    In-memory content is handed to PyMuPDF as a stream without being
+    copied or written to disk.
+    
+    Args:
+        source (str, bytes-like or file-like): Path to the PDF file, or
+            its content
+        
+    Returns:
+        fitz.Document: Open document
+    """
+    if _is_path(source):
+        return fitz.open(source)
+    return fitz.open(stream=as_buffer(source), filetype="pdf")
+
+def as_buffer(data):
+    """Return a view of in-memory document content, copying only if unavoidable.
     
-    return text
+    Args:
+        data (bytes-like or file-like): Content, or a binary file object
+            such as a Streamlit upload
+        
+    Returns:
+        memoryview: View of the content
+    """
+    if hasattr(data, "getbuffer"):
+        return data.getbuffer()
+    if hasattr(data, "read"):
+        return memoryview(data.read())
+    return memoryview(data)
+
+def _is_path(source):
+    return isinstance(source, (str, os.PathLike))
+
+def _describe_source(source):
+    return source if _is_path(source) else "from memory"
 
 def extract_text_from_html(html_path):
     """Extract text from an HTML file.
     
+    Navigation, scripts, footers and other boilerplate are dropped, and
+    whitespace is collapsed line by line.
+    
     Args:
-        html_path (str): Path to the HTML file
+        html_path (str, bytes-like or file-like): Path to the HTML file,
+            or its UTF-8 content
         
     Returns:
         str: Extracted text content
     """
+    return "\n\n".join(_section_text(headings, text) for headings, text in iter_html_sections(html_path))
+
+def iter_html_sections(html_path, block_size=64 * 1024):
+    """Yield the sections of an HTML file with their heading paths.
+    
+    The file is fed to lxml's event-driven HTML parser block_size
+    characters at a time, so sections are yielded while the rest of the
+    file is still being read. Boilerplate elements are skipped and every
+    line of text is normalised with clean_text. Without lxml the whole
+    file is parsed with BeautifulSoup and returned as one section.
+    
+    Args:
+        html_path (str, bytes-like or file-like): Path to the HTML file,
+            or its UTF-8 content
+        block_size (int): Characters read and parsed per step
+        
+    Yields:
+        tuple: (headings, text) where headings lists the enclosing h1-h6
+            titles, outermost first
+    """
     try:
-        with open(html_path, "r", encoding="utf-8") as f:
-            soup = BeautifulSoup(f, "html.parser")
-        return soup.get_text(separator="\n")
+        if etree is None:
+            soup = BeautifulSoup("".join(_read_html(html_path, block_size)), "html.parser")
+            text = "\n".join(
+                line for line in map(clean_text, soup.get_text(separator="\n").splitlines()) if line
+            )
+            if text:
+                yield (), text
+            return
+        
+        collector = _HTMLSectionCollector()
+        parser = etree.HTMLParser(target=collector)
+        for block in _read_html(html_path, block_size):
+            parser.feed(block)
+            yield from collector.drain()
+        parser.close()
+        yield from collector.drain()
     except Exception as e:
-        raise Exception(f"Error reading HTML file {html_path}: {str(e)}")
+        raise Exception(f"Error reading HTML file {_describe_source(html_path)}: {str(e)}")
+
+def _read_html(source, block_size):
+    # Text blocks from a path, or from UTF-8 content in memory or in a file object
+    if _is_path(source):
+        with open(source, "r", encoding="utf-8") as f:
+            yield from iter(lambda: f.read(block_size), "")
+        return
+    
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    if hasattr(source, "read"):
+        blocks = iter(lambda: source.read(block_size), source.read(0))
+    else:
+        view = memoryview(source)
+        blocks = (view[start:start + block_size] for start in range(0, len(view), block_size))
+    for block in blocks:
+        yield block if isinstance(block, str) else decoder.decode(block)
+    yield decoder.decode(b"", final=True)
+
+class _HTMLSectionCollector:
+    """lxml parser target that groups text into sections between headings."""
+    
+    def __init__(self):
+        self.headings = []      # (level, title) of the enclosing headings
+        self.sections = []      # finished (headings, text) sections
+        self._stack = []        # (tag, skipped) for every open element
+        self._skip_depth = 0
+        self._heading = None    # (level, parts) while inside a heading
+        self._lines = []
+        self._line = []
+    
+    def start(self, tag, attrib):
+        tag = tag.lower() if isinstance(tag, str) else ""
+        skipped = self._skip_depth > 0 or tag in HTML_SKIPPED_TAGS or (
+            tag not in HTML_CONTENT_TAGS and _is_boilerplate(attrib)
+        )
+        self._stack.append((tag, skipped))
+        if skipped:
+            self._skip_depth += 1
+            return
+        
+        if tag in HTML_HEADING_LEVELS:
+            self._end_section()
+            self._heading = (HTML_HEADING_LEVELS[tag], [])
+        elif tag in HTML_BLOCK_TAGS:
+            self._end_line()
+    
+    def end(self, tag):
+        # libxml2 closes unclosed elements itself, so events are balanced
+        tag, skipped = self._stack.pop()
+        if skipped:
+            self._skip_depth -= 1
+        elif tag in HTML_HEADING_LEVELS and self._heading is not None:
+            level, parts = self._heading
+            self._heading = None
+            title = clean_text("".join(parts))
+            if title:
+                self.headings = [h for h in self.headings if h[0] < level] + [(level, title)]
+        elif tag in HTML_BLOCK_TAGS:
+            self._end_line()
+    
+    def data(self, text):
+        if self._skip_depth:
+            return
+        if self._heading is not None:
+            self._heading[1].append(text)
+        else:
+            self._line.append(text)
+    
+    def comment(self, text):
+        pass
+    
+    def close(self):
+        self._end_section()
+    
+    def drain(self):
+        sections, self.sections = self.sections, []
+        return sections
+    
+    def _end_line(self):
+        line = clean_text("".join(self._line))
+        self._line = []
+        if line:
+            self._lines.append(line)
+    
+    def _end_section(self):
+        self._end_line()
+        if self._lines:
+            self.sections.append((tuple(title for _, title in self.headings), "\n".join(self._lines)))
+        self._lines = []
+
+def _is_boilerplate(attrib):
+    if attrib.get("role", "").lower() in HTML_BOILERPLATE_ROLES:
+        return True
+    if attrib.get("aria-hidden", "").lower() == "true" or "hidden" in attrib:
+        return True
+    words = re.split(r"[\s_-]+", f"{attrib.get('class', '')} {attrib.get('id', '')}".lower())
+    return not HTML_BOILERPLATE_WORDS.isdisjoint(words)
+
+def iter_pdf_pages(pdf_path, workers=PDF_EXTRACT_WORKERS):
+    """Yield the text of a PDF file one page at a time.
+    
+    Only a bounded number of pages is held in memory, so large PDFs can
+    be processed without materialising the whole document as one string.
+    PDFs with at least PDF_PARALLEL_MIN_PAGES pages are extracted by a
+    pool of worker processes; pages are still yielded in order.
+    
+    Args:
+        pdf_path (str, bytes-like or file-like): Path to the PDF file, or
+            its content
+        workers (int): Number of extraction processes (None = CPU count,
+            1 = extract in this process)
+        
+    Yields:
+        tuple: (page_number, text) with 1-based page numbers
+    """
+    workers = workers or os.cpu_count() or 1
+    if not _is_path(pdf_path):
+        pdf_path = as_buffer(pdf_path)
+    try:
+        with open_pdf(pdf_path) as pdf:
+            page_count = pdf.page_count
+            if workers <= 1 or page_count < PDF_PARALLEL_MIN_PAGES:
+                for page_number, page in enumerate(pdf, start=1):
+                    yield page_number, page.get_text("text")
+                return
+        
+        yield from iter_pdf_pages_parallel(pdf_path, page_count, workers)
+    except Exception as e:
+        raise Exception(f"Error reading PDF file {_describe_source(pdf_path)}: {str(e)}")
+
+def iter_pdf_pages_parallel(pdf_path, page_count, workers, pages_per_task=PDF_PAGES_PER_TASK):
+    """Extract page ranges of a PDF in worker processes, yielding pages in order.
+    
+    Each worker opens the document once when it starts and then extracts
+    one range of pages_per_task pages per task. At most two tasks per
+    worker are in flight, which bounds memory while keeping every worker
+    busy.
+    
+    Args:
+        pdf_path (str or bytes-like): Path to the PDF file, or its content
+        page_count (int): Number of pages in the document
+        workers (int): Number of extraction processes
+        pages_per_task (int): Pages extracted per task
+        
+    Yields:
+        tuple: (page_number, text) with 1-based page numbers
+    """
+    ranges = iter(
+        (start, min(start + pages_per_task, page_count))
+        for start in range(0, page_count, pages_per_task)
+    )
+    # Workers receive a pickled copy of in-memory content, and views cannot be pickled
+    source = pdf_path if _is_path(pdf_path) else bytes(as_buffer(pdf_path))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_pdf_worker, initargs=(source,)
+    ) as executor:
+        pending = deque()
+        for page_range in ranges:
+            pending.append(executor.submit(_extract_page_range, *page_range))
+            if len(pending) >= workers * 2:
+                break
+        
+        while pending:
+            pages = pending.popleft().result()
+            next_range = next(ranges, None)
+            if next_range is not None:
+                pending.append(executor.submit(_extract_page_range, *next_range))
+            yield from pages
+
+# Document opened by each extraction worker process
+_worker_pdf = None
+
+def _init_pdf_worker(pdf_path):
+    global _worker_pdf
+    _worker_pdf = open_pdf(pdf_path)
+
+def _extract_page_range(start, stop):
+    return [
+        (page_number + 1, _worker_pdf[page_number].get_text("text"))
+        for page_number in range(start, stop)
+    ]
+
+def iter_html_pages(html_path, page_size=CHUNK_SIZE):
+    """Yield the sections of an HTML file grouped into pages.
+    
+    Consecutive sections are merged until a page would exceed page_size
+    characters, so pages with many short sections do not turn into many
+    tiny chunks. Each section keeps its own title as a line of text.
+    
+    Args:
+        html_path (str, bytes-like or file-like): Path to the HTML file,
+            or its UTF-8 content
+        page_size (int): Characters after which a new page is started
+        
+    Yields:
+        tuple: (page_number, text, section) where section is the heading
+            path of the first section on the page, e.g.
+            "Usage > Installation"
+    """
+    page_number = 0
+    parts, size, section = [], 0, ""
+    for headings, text in iter_html_sections(html_path):
+        text = _section_text(headings, text)
+        if parts and size + len(text) > page_size:
+            page_number += 1
+            yield page_number, "\n\n".join(parts), section
+            parts, size = [], 0
+        if not parts:
+            section = " > ".join(headings)
+        parts.append(text)
+        size += len(text) + 2
+    if parts:
+        yield page_number + 1, "\n\n".join(parts), section
+
+def _section_text(headings, text):
+    return f"{headings[-1]}\n{text}" if headings else text
+
+def file_extension(file_path):
+    """Return the lowercase extension of a file name, e.g. ".pdf" for "X.PDF".
+    
+    Args:
+        file_path (str): Path to the file, or only its name
+        
+    Returns:
+        str: Extension including the dot, or "" if there is none
+    """
+    return os.path.splitext(file_path)[1].lower()
+
+def iter_pages(file_path, workers=PDF_EXTRACT_WORKERS, data=None):
+    """Yield the text of a file page by page based on its extension.
+    
+    Args:
+        file_path (str): Path to the file, or only its name when data is
+            given
+        workers (int): Number of PDF extraction processes (None = CPU
+            count, 1 = extract in this process)
+        data (bytes-like or file-like): Content of the file, parsed in
+            memory instead of reading file_path
+        
+    Yields:
+        tuple: (page_number, text)
+        
+    Raises:
+        ValueError: If file type is not supported
+    """
+    source = file_path if data is None else as_buffer(data)
+    extension = file_extension(file_path)
+    if extension == ".pdf":
+        return iter_pdf_pages(source, workers)
+    elif extension == ".html":
+        return iter_html_pages(source)
+    else:
+        raise ValueError(f"Unsupported file type: {file_path}. Use PDF or HTML.")
+
+def count_pages(file_path, data=None):
+    """Return the number of pages a file will yield, when known up front.
+    
+    Args:
+        file_path (str): Path to the file, or only its name when data is
+            given
+        data (bytes-like or file-like): Content of the file
+        
+    Returns:
+        int: Page count for PDFs, None for other types
+    """
+    if file_extension(file_path) != ".pdf":
+        return None
+    with open_pdf(file_path if data is None else as_buffer(data)) as pdf:
+        return pdf.page_count
+
+def split_text(text, chunk_size, chunk_overlap=0):
+    """Split text into chunks of at most chunk_size characters.
+    
+    Chunks are cut at the last paragraph, line, sentence or word break
+    inside the window when one exists, and consecutive chunks share up
+    to chunk_overlap characters.
+    
+    Args:
+        text (str): Text to split
+        chunk_size (int): Maximum number of characters per chunk
+        chunk_overlap (int): Number of characters repeated between chunks
+        
+    Returns:
+        list: List of non-empty chunk strings
+    """
+    if chunk_overlap >= chunk_size:
+        raise ValueError("chunk_overlap must be smaller than chunk_size")
+    
+    text = text.strip()
+    chunks = []
+    start = 0
+    while start < len(text):
+        end = min(start + chunk_size, len(text))
+        if end < len(text):
+            # Prefer the most natural break in the second half of the window
+            for separator in ("\n\n", "\n", ". ", " "):
+                cut = text.rfind(separator, start + chunk_size // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        
+        chunk = text[start:end].strip()
+        if chunk:
+            chunks.append(chunk)
+        if end >= len(text):
+            break
+        start = max(end - chunk_overlap, start + 1)
+    
+    return chunks
+
+def chunk_pages(pages, chunk_size, chunk_overlap=0):
+    """Split a stream of pages into size-bounded chunks.
+    
+    Chunks never span a page boundary, so every chunk records the page
+    it came from. Pages that carry a section heading path pass it on to
+    their chunks.
+    
+    Args:
+        pages (iterable): Iterable of (page_number, text) or
+            (page_number, text, section) tuples
+        chunk_size (int): Maximum number of characters per chunk
+        chunk_overlap (int): Number of characters repeated between chunks
+        
+    Yields:
+        dict: Chunk with 'text' and 'page_number' keys, plus 'section'
+            when the page has a heading path
+    """
+    for page_number, text, *section in pages:
+        for chunk in split_text(text, chunk_size, chunk_overlap):
+            if section and section[0]:
+                yield {"text": chunk, "page_number": page_number, "section": section[0]}
+            else:
+                yield {"text": chunk, "page_number": page_number}
 
 def extract_text_from_file(file_path):
     """Extract text from a file based on its extension.
@@ -51,9 +493,32 @@ def extract_text_from_file(file_path):
     Raises:
         ValueError: If file type is not supported
     """
-    if file_path.endswith(".pdf"):
+    extension = file_extension(file_path)
+    if extension == ".pdf":
         return extract_text_from_pdf(file_path)
-    elif file_path.endswith(".html"):
+    elif extension == ".html":
         return extract_text_from_html(file_path)
     else:
         raise ValueError(f"Unsupported file type: {file_path}. Use PDF or HTML.")
+
+def extract_file_chunks(file_path, chunk_size, chunk_overlap=0, known_hash=None):
+    """Hash, extract and chunk a whole file in one call.
+    
+    Meant to run in a worker process: everything it needs is passed in
+    and everything it returns is picklable. PDFs are extracted in-process,
+    since parallelism already comes from the pool running this function.
+    
+    Args:
+        file_path (str): Path to the file
+        chunk_size (int): Maximum number of characters per chunk
+        chunk_overlap (int): Number of characters repeated between chunks
+        known_hash (str): Content hash already indexed for this file
+        
+    Returns:
+        tuple: (content_hash, chunks) where chunks is None if the content
+            hash equals known_hash
+    """
+    content_hash = compute_file_hash(file_path)
+    if content_hash == known_hash:
+        return content_hash, None
+    return content_hash, list(chunk_pages(iter_pages(file_path, workers=1), chunk_size, chunk_overlap))
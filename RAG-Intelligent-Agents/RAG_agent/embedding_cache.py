@@ -0,0 +1,219 @@
+"""
+Persistent on-disk cache of embedding vectors
+"""
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from config import EMBEDDING_CACHE_PATH, EMBEDDING_CACHE_MAX_BYTES
+from utils import clean_text
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    slot INTEGER NOT NULL,
+    last_used REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS entries_by_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS free_slots (slot INTEGER PRIMARY KEY);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER);
+"""
+
+# Keys per IN (...) query, below SQLite's limit on bound parameters
+LOOKUP_BATCH = 500
+
+def cache_key(text, model_name, dimensions):
+    """Build the cache key for a text embedded by a given model.
+
+    Args:
+        text (str): Text that was embedded
+        model_name (str): Name of the embedding model
+        dimensions (int): Vector dimension
+
+    Returns:
+        str: Hex digest identifying the (text, model, dimension) triple
+    """
+    payload = f"{model_name}\x00{dimensions}\x00{clean_text(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class EmbeddingCache:
+    """Embedding vectors stored in a memory-mapped float32 file.
+
+    A SQLite index maps each key to a row ("slot") of the vector file and
+    tracks when it was last used. When the vectors exceed `max_bytes`, the
+    least recently used entries are evicted and their slots reused.
+    Each (model, dimension) pair gets its own subdirectory.
+
+    Several processes can share a cache: reads and writes each run in an
+    immediate (write-locked) transaction, so a slot cannot be evicted and
+    reused between looking up a key and copying its row. A process maps
+    the vector file again when it meets a slot past the end of its own
+    mapping, because another process has grown the file.
+    """
+
+    def __init__(self, model_name, dimensions, path=EMBEDDING_CACHE_PATH,
+                 max_bytes=EMBEDDING_CACHE_MAX_BYTES):
+        """Open (and create if needed) the cache for a model.
+
+        Args:
+            model_name (str): Name of the embedding model
+            dimensions (int): Vector dimension
+            path (str): Root directory of the cache
+            max_bytes (int): Vector storage budget before eviction
+        """
+        self.model_name = model_name
+        self.dimensions = dimensions
+        self.max_entries = max(1, max_bytes // (dimensions * 4))
+        self.directory = os.path.join(path, f"{re.sub(r'[^A-Za-z0-9._-]', '_', model_name)}-{dimensions}")
+        os.makedirs(self.directory, exist_ok=True)
+
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"),
+                                     check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._vectors_path = os.path.join(self.directory, "vectors.f32")
+        self._vectors = None
+        self._capacity = 0
+        self._open_vectors(self._get_meta("next_slot"))
+
+    def get_many(self, texts):
+        """Look up cached vectors for a batch of texts.
+
+        Args:
+            texts (list): Texts to look up
+
+        Returns:
+            list: Vector (list of floats) per text, or None for misses
+        """
+        keys = [cache_key(text, self.model_name, self.dimensions) for text in texts]
+        with self._lock, self._conn:
+            # Rows are copied before the transaction ends, so no other
+            # process can evict these keys and refill their slots meanwhile
+            self._conn.execute("BEGIN IMMEDIATE")
+            slots = self._lookup(keys)
+            if slots:
+                found = list(slots)
+                now = time.time()
+                for start in range(0, len(found), LOOKUP_BATCH):
+                    part = found[start:start + LOOKUP_BATCH]
+                    self._conn.execute(
+                        f"UPDATE entries SET last_used = ? WHERE key IN ({','.join('?' * len(part))})",
+                        [now] + part,
+                    )
+                highest = max(slots.values())
+                if highest >= self._capacity:
+                    self._open_vectors(highest + 1)
+
+            results = [
+                self._vectors[slots[key]].tolist() if key in slots else None
+                for key in keys
+            ]
+            self.stats["hits"] += len([key for key in keys if key in slots])
+            self.stats["misses"] += len([key for key in keys if key not in slots])
+        return results
+
+    def put_many(self, texts, vectors):
+        """Store vectors for a batch of texts, evicting old entries if needed.
+
+        Args:
+            texts (list): Texts that were embedded
+            vectors (list): One vector per text
+        """
+        entries = {}
+        for text, vector in zip(texts, vectors):
+            entries[cache_key(text, self.model_name, self.dimensions)] = vector
+        if not entries:
+            return
+
+        with self._lock, self._conn:
+            # Holds the write lock from the first read, so no other process
+            # can take the same slots or insert the same keys meanwhile
+            self._conn.execute("BEGIN IMMEDIATE")
+            existing = self._lookup(list(entries))
+            new_keys = [key for key in entries if key not in existing][:self.max_entries]
+            if not new_keys:
+                return
+
+            self._evict(len(new_keys))
+            slots = self._allocate_slots(len(new_keys))
+            for key, slot in zip(new_keys, slots):
+                self._vectors[slot] = np.asarray(entries[key], dtype=np.float32)
+            self._vectors.flush()
+
+            now = time.time()
+            self._conn.executemany(
+                "INSERT INTO entries (key, slot, last_used) VALUES (?, ?, ?)",
+                [(key, slot, now) for key, slot in zip(new_keys, slots)],
+            )
+
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+
+    def _lookup(self, keys):
+        slots = {}
+        for start in range(0, len(keys), LOOKUP_BATCH):
+            part = keys[start:start + LOOKUP_BATCH]
+            slots.update(self._conn.execute(
+                f"SELECT key, slot FROM entries WHERE key IN ({','.join('?' * len(part))})", part
+            ).fetchall())
+        return slots
+
+    def _evict(self, incoming):
+        overflow = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0] + incoming - self.max_entries
+        if overflow <= 0:
+            return
+        rows = self._conn.execute(
+            "SELECT key, slot FROM entries ORDER BY last_used LIMIT ?", (overflow,)
+        ).fetchall()
+        self._conn.executemany("DELETE FROM entries WHERE key = ?", [(key,) for key, _ in rows])
+        self._conn.executemany("INSERT INTO free_slots (slot) VALUES (?)", [(slot,) for _, slot in rows])
+        self.stats["evictions"] += len(rows)
+
+    def _allocate_slots(self, count):
+        reused = [row[0] for row in self._conn.execute(
+            "SELECT slot FROM free_slots LIMIT ?", (count,)
+        )]
+        self._conn.executemany("DELETE FROM free_slots WHERE slot = ?", [(slot,) for slot in reused])
+
+        next_slot = self._get_meta("next_slot")
+        fresh = list(range(next_slot, next_slot + count - len(reused)))
+        if fresh:
+            self._set_meta("next_slot", fresh[-1] + 1)
+        slots = reused + fresh
+        # Reused slots too may lie in rows another process has added
+        if max(slots) >= self._capacity:
+            self._open_vectors(max(slots) + 1)
+        return slots
+
+    def _open_vectors(self, required_rows):
+        # Starts from the current file size, which another process may have grown
+        file_rows = 0
+        if os.path.exists(self._vectors_path):
+            file_rows = os.path.getsize(self._vectors_path) // (self.dimensions * 4)
+        capacity = max(1024, self._capacity, file_rows)
+        while capacity < required_rows:
+            capacity *= 2
+        if self._vectors is not None and capacity == self._capacity:
+            return
+
+        size = capacity * self.dimensions * 4
+        with open(self._vectors_path, "ab") as f:
+            if f.tell() < size:
+                f.truncate(size)
+        self._vectors = np.memmap(self._vectors_path, dtype=np.float32, mode="r+",
+                                  shape=(capacity, self.dimensions))
+        self._capacity = capacity
+
+    def _get_meta(self, name):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_meta(self, name, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
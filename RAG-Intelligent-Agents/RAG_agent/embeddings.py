@@ -0,0 +1,370 @@
+"""
+Embedding service that batches texts from concurrent callers
+"""
+import asyncio
+import hashlib
+import math
+import queue
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from llama_index.core import Settings
+from llama_index.core.base.embeddings.base import BaseEmbedding
+from llama_index.core.bridge.pydantic import PrivateAttr
+
+from config import (
+    EMBEDDING_BACKEND, EMBEDDING_MODEL, EMBEDDING_DIMENSIONS, EMBEDDING_CACHE_ENABLED,
+    EMBED_BATCH_SIZE, EMBED_BATCH_MAX_TOKENS, EMBED_FLUSH_INTERVAL, EMBED_CONCURRENCY,
+)
+
+# Output dimensions of the OpenAI embedding models
+OPENAI_MODEL_DIMENSIONS = {
+    "text-embedding-3-large": 3072,
+    "text-embedding-3-small": 1536,
+    "text-embedding-ada-002": 1536,
+}
+
+def estimate_tokens(text):
+    """Estimate the number of tokens in a text string.
+
+    Uses the rough rule of 1 token per 4 characters of English text.
+
+    Args:
+        text (str): Text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    return len(text) // 4 + 1
+
+class EmbeddingBackend:
+    """Interface for anything that turns a batch of texts into vectors."""
+
+    model_name = "unknown"
+    dimensions = None
+
+    def embed(self, texts):
+        """Embed a batch of texts.
+
+        Args:
+            texts (list): Texts to embed
+
+        Returns:
+            list: One vector (list of floats) per text, in input order
+        """
+        raise NotImplementedError
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+    """Backend that calls the OpenAI embeddings API.
+
+    When `dimensions` is given, the API returns embeddings shortened to that
+    size (supported by the text-embedding-3 models).
+    """
+
+    def __init__(self, model=EMBEDDING_MODEL, dimensions=EMBEDDING_DIMENSIONS):
+        from openai import OpenAI
+
+        full_dimensions = OPENAI_MODEL_DIMENSIONS.get(model)
+        if dimensions and full_dimensions and dimensions > full_dimensions:
+            raise ValueError(f"{model} returns at most {full_dimensions} dimensions, not {dimensions}")
+        self.model_name = model
+        self.dimensions = dimensions or full_dimensions
+        self._request_dimensions = dimensions
+        self._client = OpenAI()
+
+    def embed(self, texts):
+        options = {"dimensions": self._request_dimensions} if self._request_dimensions else {}
+        response = self._client.embeddings.create(model=self.model_name, input=texts, **options)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+class HashEmbeddingBackend(EmbeddingBackend):
+    """Deterministic local backend for tests and benchmarks.
+
+    Each word is hashed into one of `dimensions` buckets with a hashed
+    sign, and the result is L2-normalised. Texts that share words get
+    similar vectors, which is enough to exercise retrieval offline.
+    """
+
+    def __init__(self, dimensions=256):
+        self.model_name = f"hash-{dimensions}"
+        self.dimensions = dimensions
+
+    def embed(self, texts):
+        return [self._embed_one(text) for text in texts]
+
+    def _embed_one(self, text):
+        vector = [0.0] * self.dimensions
+        for word in re.findall(r"\w+", text.lower()):
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.dimensions
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(value * value for value in vector)) or 1.0
+        return [value / norm for value in vector]
+
+class CachedEmbeddingBackend(EmbeddingBackend):
+    """Backend wrapper that serves repeated texts from an EmbeddingCache.
+
+    Only texts missing from the cache are sent to the wrapped backend, and
+    their vectors are written back to the cache.
+    """
+
+    def __init__(self, backend, cache=None):
+        from embedding_cache import EmbeddingCache
+
+        if backend.dimensions is None:
+            raise ValueError(f"Cannot cache embeddings of unknown dimension for {backend.model_name}")
+        self.backend = backend
+        self.model_name = backend.model_name
+        self.dimensions = backend.dimensions
+        self.cache = cache or EmbeddingCache(backend.model_name, backend.dimensions)
+
+    def embed(self, texts):
+        vectors = self.cache.get_many(texts)
+        missing = [position for position, vector in enumerate(vectors) if vector is None]
+        if missing:
+            missing_texts = [texts[position] for position in missing]
+            fresh = self.backend.embed(missing_texts)
+            self.cache.put_many(missing_texts, fresh)
+            for position, vector in zip(missing, fresh):
+                vectors[position] = vector
+        return vectors
+
+def create_embedding_backend(name=EMBEDDING_BACKEND, cached=EMBEDDING_CACHE_ENABLED):
+    """Create an embedding backend by name.
+
+    Args:
+        name (str): "openai" or "hash"
+        cached (bool): Put the persistent embedding cache in front of the backend
+
+    Returns:
+        EmbeddingBackend: Backend instance
+    """
+    if name == "openai":
+        backend = OpenAIEmbeddingBackend()
+    elif name == "hash":
+        backend = HashEmbeddingBackend(dimensions=EMBEDDING_DIMENSIONS or 256)
+    else:
+        raise ValueError(f"Unknown embedding backend: {name}. Use 'openai' or 'hash'.")
+    return CachedEmbeddingBackend(backend) if cached else backend
+
+class _PendingText:
+    """A single text waiting in the service queue."""
+
+    __slots__ = ("text", "tokens", "future")
+
+    def __init__(self, text):
+        self.text = text
+        self.tokens = estimate_tokens(text)
+        self.future = Future()
+
+class EmbeddingService:
+    """Coalesce texts from concurrent callers into batched backend calls.
+
+    Texts submitted from any thread are queued and grouped into batches of
+    at most `max_batch_size` texts and `max_batch_tokens` estimated tokens.
+    Up to `concurrency` batches are in flight at once. While a request slot
+    is free, a batch is sent as soon as the queue runs dry, so a lone query
+    pays no extra latency; when all slots are busy, texts keep accumulating
+    until the batch is full or `flush_interval` seconds have passed.
+    """
+
+    def __init__(self, backend, max_batch_size=EMBED_BATCH_SIZE,
+                 max_batch_tokens=EMBED_BATCH_MAX_TOKENS,
+                 flush_interval=EMBED_FLUSH_INTERVAL, concurrency=EMBED_CONCURRENCY):
+        self.backend = backend
+        self.max_batch_size = max_batch_size
+        self.max_batch_tokens = max_batch_tokens
+        self.flush_interval = flush_interval
+        self.concurrency = concurrency
+        self.stats = {"texts": 0, "batches": 0}
+        self._stats_lock = threading.Lock()
+        self._in_flight = 0
+        self._queue = queue.Queue()
+        self._executor = ThreadPoolExecutor(max_workers=concurrency,
+                                            thread_name_prefix="embedding-batch")
+        self._thread = threading.Thread(target=self._run, name="embedding-service", daemon=True)
+        self._thread.start()
+
+    def submit(self, texts):
+        """Queue texts for embedding without waiting for the result.
+
+        Args:
+            texts (list): Texts to embed
+
+        Returns:
+            list: One Future per text resolving to its vector
+        """
+        pending = [_PendingText(text) for text in texts]
+        for item in pending:
+            self._queue.put(item)
+        return [item.future for item in pending]
+
+    def embed(self, texts):
+        """Embed texts, blocking until all vectors are available.
+
+        Args:
+            texts (list): Texts to embed
+
+        Returns:
+            list: One vector per text, in input order
+        """
+        return [future.result() for future in self.submit(texts)]
+
+    async def aembed(self, texts):
+        """Embed texts without blocking the event loop.
+
+        Args:
+            texts (list): Texts to embed
+
+        Returns:
+            list: One vector per text, in input order
+        """
+        futures = [asyncio.wrap_future(future) for future in self.submit(texts)]
+        return list(await asyncio.gather(*futures))
+
+    def close(self):
+        """Flush queued texts and stop the service."""
+        self._queue.put(None)
+        self._thread.join()
+        self._executor.shutdown(wait=True)
+
+    def _run(self):
+        carry = None
+        while True:
+            item = carry or self._queue.get()
+            carry = None
+            if item is None:
+                return
+
+            batch = [item]
+            tokens = item.tokens
+            deadline = time.monotonic() + self.flush_interval
+            stopping = False
+            while len(batch) < self.max_batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    timeout = deadline - time.monotonic()
+                    if self._in_flight < self.concurrency or timeout <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=timeout)
+                    except queue.Empty:
+                        break
+                if item is None:
+                    stopping = True
+                    break
+                if tokens + item.tokens > self.max_batch_tokens:
+                    carry = item
+                    break
+                batch.append(item)
+                tokens += item.tokens
+
+            with self._stats_lock:
+                self._in_flight += 1
+            self._executor.submit(self._flush, batch)
+            if stopping:
+                return
+
+    def _flush(self, batch):
+        try:
+            self._embed_batch(batch)
+        finally:
+            with self._stats_lock:
+                self._in_flight -= 1
+
+    def _embed_batch(self, batch):
+        # Drop texts whose caller gave up (e.g. a timed-out query)
+        batch = [item for item in batch if item.future.set_running_or_notify_cancel()]
+        if not batch:
+            return
+        try:
+            vectors = self.backend.embed([item.text for item in batch])
+            if len(vectors) != len(batch):
+                raise RuntimeError(
+                    f"Embedding backend returned {len(vectors)} vectors for {len(batch)} texts"
+                )
+        except Exception as e:
+            for item in batch:
+                item.future.set_exception(e)
+            return
+
+        with self._stats_lock:
+            self.stats["texts"] += len(batch)
+            self.stats["batches"] += 1
+        for item, vector in zip(batch, vectors):
+            item.future.set_result(vector)
+
+class ServiceEmbedding(BaseEmbedding):
+    """LlamaIndex embedding model that routes every call through an EmbeddingService."""
+
+    _service: EmbeddingService = PrivateAttr()
+
+    def __init__(self, service, **kwargs):
+        super().__init__(
+            model_name=service.backend.model_name,
+            embed_batch_size=min(service.max_batch_size, 2048),
+            **kwargs,
+        )
+        self._service = service
+
+    @classmethod
+    def class_name(cls):
+        return "ServiceEmbedding"
+
+    @property
+    def service(self):
+        return self._service
+
+    def _get_query_embedding(self, query):
+        return self._service.embed([query])[0]
+
+    async def _aget_query_embedding(self, query):
+        return (await self._service.aembed([query]))[0]
+
+    def _get_text_embedding(self, text):
+        return self._service.embed([text])[0]
+
+    async def _aget_text_embedding(self, text):
+        return (await self._service.aembed([text]))[0]
+
+    def _get_text_embeddings(self, texts):
+        return self._service.embed(texts)
+
+    async def _aget_text_embeddings(self, texts):
+        return await self._service.aembed(texts)
+
+_service = None
+_service_lock = threading.Lock()
+
+def get_embedding_service():
+    """Return the process-wide embedding service, creating it on first use.
+
+    Returns:
+        EmbeddingService: Shared service
+    """
+    global _service
+    with _service_lock:
+        if _service is None:
+            _service = EmbeddingService(create_embedding_backend())
+        return _service
+
+def configure_embeddings(service=None):
+    """Point LlamaIndex at the shared embedding service.
+
+    This is the single place where `Settings.embed_model` is set.
+
+    Args:
+        service (EmbeddingService): Service to use instead of the shared one
+
+    Returns:
+        ServiceEmbedding: The configured embedding model
+    """
+    service = service or get_embedding_service()
+    current = Settings._embed_model
+    if isinstance(current, ServiceEmbedding) and current.service is service:
+        return current
+    Settings.embed_model = ServiceEmbedding(service)
+    return Settings.embed_model
@@ -0,0 +1,129 @@
+"""
+Reusable retrievers and query engines owned by an index
+"""
+import threading
+
+DEFAULT_RESPONSE_MODE = "compact"
+
+class QueryEnginePool:
+    """Retrievers and query engines for one index, built once per configuration.
+
+    Building a query engine creates a retriever, a response synthesizer and
+    its prompt templates, and resolves Settings.llm. Retrieval-only paths
+    therefore use get_retriever(), which needs no LLM, and engines are only
+    built where an answer is synthesized. Both only read the vector store
+    at query time, so they stay valid when documents are inserted or
+    deleted and can be shared by every query on the index.
+    """
+
+    def __init__(self, index):
+        """Create an empty pool for an index.
+
+        Args:
+            index: Vector database index
+        """
+        self._index = index
+        self._engines = {}
+        self._retrievers = {}
+        self._lock = threading.Lock()
+
+    def get_retriever(self, k):
+        """Return the retriever for k, building it on first use.
+
+        Args:
+            k (int): Number of similar documents to retrieve
+
+        Returns:
+            BaseRetriever: Shared retriever
+        """
+        retriever = self._retrievers.get(k)
+        if retriever is None:
+            with self._lock:
+                retriever = self._retrievers.get(k)
+                if retriever is None:
+                    retriever = self._retrievers[k] = self._index.as_retriever(similarity_top_k=k)
+        return retriever
+
+    def get(self, k, response_mode=DEFAULT_RESPONSE_MODE, streaming=False):
+        """Return the query engine for a configuration, building it on first use.
+
+        Args:
+            k (int): Number of similar documents to retrieve
+            response_mode (str): LlamaIndex response synthesis mode
+            streaming (bool): Whether the engine streams its response
+
+        Returns:
+            BaseQueryEngine: Shared query engine
+        """
+        key = (k, response_mode, streaming)
+        engine = self._engines.get(key)
+        if engine is None:
+            with self._lock:
+                engine = self._engines.get(key)
+                if engine is None:
+                    engine = self._index.as_query_engine(
+                        similarity_top_k=k, response_mode=response_mode, streaming=streaming,
+                    )
+                    self._engines[key] = engine
+        return engine
+
+    def clear(self):
+        """Drop all engines and retrievers, e.g. after changing Settings.llm."""
+        with self._lock:
+            self._engines.clear()
+            self._retrievers.clear()
+
+    def __len__(self):
+        return len(self._engines)
+
+# Attribute of the index that holds its pool
+_POOL_ATTRIBUTE = "_rag_engine_pool"
+_pools_lock = threading.Lock()
+
+def get_engine_pool(index):
+    """Return the query engine pool that belongs to an index.
+
+    The pool is stored on the index itself, so it lives and dies with it
+    (the reference cycle through the engines is left to the garbage
+    collector).
+
+    Args:
+        index: Vector database index
+
+    Returns:
+        QueryEnginePool: Pool that lives as long as the index
+    """
+    pool = getattr(index, _POOL_ATTRIBUTE, None)
+    if pool is None:
+        with _pools_lock:
+            pool = getattr(index, _POOL_ATTRIBUTE, None)
+            if pool is None:
+                pool = QueryEnginePool(index)
+                setattr(index, _POOL_ATTRIBUTE, pool)
+    return pool
+
+def get_retriever(index, k=3):
+    """Return a pooled retriever for an index.
+
+    Args:
+        index: Vector database index
+        k (int): Number of similar documents to retrieve
+
+    Returns:
+        BaseRetriever: Shared retriever
+    """
+    return get_engine_pool(index).get_retriever(k)
+
+def get_query_engine(index, k=3, response_mode=DEFAULT_RESPONSE_MODE, streaming=False):
+    """Return a pooled query engine for an index.
+
+    Args:
+        index: Vector database index
+        k (int): Number of similar documents to retrieve
+        response_mode (str): LlamaIndex response synthesis mode
+        streaming (bool): Whether the engine streams its response
+
+    Returns:
+        BaseQueryEngine: Shared query engine
+    """
+    return get_engine_pool(index).get(k, response_mode, streaming)
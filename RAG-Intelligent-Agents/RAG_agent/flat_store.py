@@ -0,0 +1,566 @@
+"""
+Memory-mapped flat vector store with exact top-k search
+"""
+import json
+import os
+import sqlite3
+import threading
+
+import numpy as np
+from llama_index.core.schema import MetadataMode
+from llama_index.core.vector_stores.types import BasePydanticVectorStore, VectorStoreQueryResult
+from llama_index.core.vector_stores.utils import node_to_metadata_dict, metadata_dict_to_node
+from pydantic import PrivateAttr
+
+from config import (
+    FLAT_SEARCH_BLOCK_ROWS, FLAT_QUANTIZATION, FLAT_RESCORE_MULTIPLIER, FLAT_SEARCH_DIMENSIONS,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS nodes (
+    slot INTEGER PRIMARY KEY,
+    node_id TEXT NOT NULL UNIQUE,
+    ref_doc_id TEXT,
+    text TEXT,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS nodes_by_ref_doc ON nodes (ref_doc_id);
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER);
+"""
+
+QUANTIZATION_MODES = {"none": 0, "int8": 1, "binary": 2}
+
+# Largest int8 block converted to float32 at once during search
+INT8_BLOCK_VALUES = 2 ** 23
+
+# Set bits per byte value, for NumPy versions without bitwise_count
+POPCOUNT_TABLE = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+class FlatVectorStore(BasePydanticVectorStore):
+    """Vector store that keeps embeddings in a memory-mapped float32 matrix.
+
+    Row i of `vectors.f32` holds the L2-normalised embedding of the node
+    in slot i; a SQLite sidecar maps slots to node IDs, text and metadata.
+    Queries are answered exactly with blocked matrix products and a
+    partial sort, so results match a brute-force cosine search. Several
+    processes can open the same directory: the matrix is shared through
+    the page cache and each process reloads its slot map when another
+    one commits a change.
+
+    With quantization set to "int8" (per-row scaled, 4x smaller) or
+    "binary" (sign bits, 32x smaller), the first pass scans only the
+    compact codes, and a shortlist of rescore_multiplier * k candidates
+    is rescored against the full-precision rows, which stay on disk and
+    are read only for the shortlist. Processes sharing a store should use
+    the same quantization mode.
+
+    With search_dimensions set below the embedding dimension, the first
+    pass compares only the re-normalised leading dimensions of each
+    embedding (kept in their own matrix, and quantized too if requested)
+    and the shortlist is rescored at full dimension. This suits
+    Matryoshka embeddings such as text-embedding-3, whose prefixes are
+    embeddings in their own right.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+    path: str
+    block_rows: int = FLAT_SEARCH_BLOCK_ROWS
+    quantization: str = FLAT_QUANTIZATION
+    rescore_multiplier: int = FLAT_RESCORE_MULTIPLIER
+    search_dimensions: int = FLAT_SEARCH_DIMENSIONS
+
+    _lock = PrivateAttr()
+    _conn = PrivateAttr()
+    _vectors_path = PrivateAttr()
+    _vectors = PrivateAttr(default=None)
+    _codes = PrivateAttr(default=None)
+    _scales = PrivateAttr(default=None)
+    _capacity = PrivateAttr(default=0)
+    _dimensions = PrivateAttr(default=0)
+    _node_ids = PrivateAttr()
+    _slots = PrivateAttr()
+    _valid = PrivateAttr()
+    _data_version = PrivateAttr(default=None)
+
+    def __init__(self, path, block_rows=FLAT_SEARCH_BLOCK_ROWS, quantization=FLAT_QUANTIZATION,
+                 rescore_multiplier=FLAT_RESCORE_MULTIPLIER, search_dimensions=FLAT_SEARCH_DIMENSIONS,
+                 **kwargs):
+        """Open (and create if needed) a store directory.
+
+        Args:
+            path (str): Directory holding the vector file and sidecar
+            block_rows (int): Rows scored per matrix product during search
+            quantization (str): "none", "int8" or "binary"
+            rescore_multiplier (int): Quantized shortlist size as a
+                multiple of k
+            search_dimensions (int): Leading dimensions scanned by the
+                first pass (0 = all)
+
+        Raises:
+            ValueError: If the quantization mode is unknown
+        """
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Unknown quantization: {quantization}. Use 'none', 'int8' or 'binary'.")
+        super().__init__(path=path, block_rows=block_rows, quantization=quantization,
+                         rescore_multiplier=rescore_multiplier, search_dimensions=search_dimensions,
+                         **kwargs)
+        os.makedirs(path, exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(os.path.join(path, "index.sqlite3"), check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._reload()
+
+    @classmethod
+    def class_name(cls):
+        return "FlatVectorStore"
+
+    @property
+    def client(self):
+        return self
+
+    @property
+    def dimensions(self):
+        """Embedding dimension of the store (0 until the first insert)."""
+        return self._dimensions
+
+    def add(self, nodes, **add_kwargs):
+        """Insert nodes, replacing nodes that already exist under the same ID.
+
+        Args:
+            nodes (list): Nodes with embeddings
+
+        Returns:
+            list: IDs of the inserted nodes
+        """
+        if not nodes:
+            return []
+        vectors = _normalize(np.asarray([node.get_embedding() for node in nodes], dtype=np.float32))
+
+        with self._lock:
+            self._refresh()
+            try:
+                with self._conn:
+                    self._set_dimensions(vectors.shape[1])
+                    slots = self._allocate_slots([node.node_id for node in nodes])
+                    for slot, vector in zip(slots, vectors):
+                        self._vectors[slot] = vector
+                    self._vectors.flush()
+                    self._encode(np.asarray(slots), vectors)
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO nodes (slot, node_id, ref_doc_id, text, metadata) "
+                        "VALUES (?, ?, ?, ?, ?)",
+                        [self._node_row(slot, node) for slot, node in zip(slots, nodes)],
+                    )
+            except Exception:
+                # The transaction was rolled back; drop the in-memory changes too
+                self._reload()
+                raise
+        return [node.node_id for node in nodes]
+
+    def delete(self, ref_doc_id, **delete_kwargs):
+        """Delete every node that belongs to a document.
+
+        Args:
+            ref_doc_id (str): ID of the source document
+        """
+        with self._lock:
+            node_ids = [row[0] for row in self._conn.execute(
+                "SELECT node_id FROM nodes WHERE ref_doc_id = ?", (ref_doc_id,)
+            )]
+        self.delete_nodes(node_ids)
+
+    def delete_nodes(self, node_ids=None, filters=None, **delete_kwargs):
+        """Delete nodes by ID.
+
+        Args:
+            node_ids (list): IDs of the nodes to delete
+            filters: Not supported
+        """
+        if filters is not None:
+            raise ValueError("FlatVectorStore does not support metadata filters")
+        with self._lock, self._conn:
+            self._refresh()
+            slots = [self._slots.pop(node_id) for node_id in node_ids or [] if node_id in self._slots]
+            for slot in slots:
+                self._node_ids[slot] = None
+                self._valid[slot] = False
+            self._conn.executemany("DELETE FROM nodes WHERE slot = ?", [(slot,) for slot in slots])
+
+    def clear(self):
+        """Delete every node."""
+        with self._lock:
+            with self._conn:
+                self._conn.execute("DELETE FROM nodes")
+                self._conn.execute("DELETE FROM meta")
+            self._vectors = self._codes = self._scales = None
+            for name in ("vectors.f32", "prefix.f32", "codes.i8", "scales.f32", "codes.bin"):
+                if os.path.exists(os.path.join(self.path, name)):
+                    os.remove(os.path.join(self.path, name))
+            self._reload()
+
+    def get_nodes(self, node_ids=None, filters=None):
+        """Fetch nodes, with their embeddings, by ID.
+
+        Args:
+            node_ids (list): IDs of the nodes to fetch
+            filters: Not supported
+
+        Returns:
+            list: Stored nodes in the order they were found
+        """
+        if filters is not None:
+            raise ValueError("FlatVectorStore does not support metadata filters")
+        with self._lock:
+            self._refresh()
+            slots = [self._slots[node_id] for node_id in node_ids or [] if node_id in self._slots]
+            nodes = []
+            for slot, node in self._load_nodes(slots):
+                node.embedding = self._vectors[slot].tolist()
+                nodes.append(node)
+        return nodes
+
+    def get_embeddings(self, node_ids):
+        """Return the stored (normalised) embeddings of nodes by ID.
+
+        Args:
+            node_ids (list): IDs of the nodes
+
+        Returns:
+            dict: Node ID to embedding for the nodes that exist
+        """
+        with self._lock:
+            self._refresh()
+            return {
+                node_id: self._vectors[self._slots[node_id]].tolist()
+                for node_id in node_ids if node_id in self._slots
+            }
+
+    def query(self, query, **kwargs):
+        """Return the exact top-k nodes by cosine similarity.
+
+        Args:
+            query (VectorStoreQuery): Query with an embedding and
+                similarity_top_k
+
+        Returns:
+            VectorStoreQueryResult: Nodes, similarities and IDs, best first
+        """
+        if query.filters is not None:
+            raise ValueError("FlatVectorStore does not support metadata filters")
+        return self.query_batch([query.query_embedding], query.similarity_top_k)[0]
+
+    def query_batch(self, query_embeddings, k):
+        """Answer many queries with one pass over the vector matrix.
+
+        Args:
+            query_embeddings (list): One embedding per query
+            k (int): Number of nodes to return per query
+
+        Returns:
+            list: One VectorStoreQueryResult per query
+        """
+        queries = _normalize(np.asarray(query_embeddings, dtype=np.float32))
+        with self._lock:
+            self._refresh()
+            if self._dimensions and queries.shape[1] != self._dimensions:
+                raise ValueError(
+                    f"Query dimension {queries.shape[1]} does not match the store "
+                    f"dimension {self._dimensions}"
+                )
+            rows = len(self._node_ids)
+            arrays = (self._vectors, self._codes, self._scales)
+            valid = self._valid[:rows].copy()
+
+        top_slots, top_scores = self._search(queries, arrays, valid, rows, k)
+
+        with self._lock:
+            results = []
+            for slots, scores in zip(top_slots, top_scores):
+                score_by_slot = dict(zip(slots, scores.tolist()))
+                found = self._load_nodes(slots)
+                results.append(VectorStoreQueryResult(
+                    nodes=[node for _, node in found],
+                    similarities=[score_by_slot[slot] for slot, _ in found],
+                    ids=[node.node_id for _, node in found],
+                ))
+        return results
+
+    def memory_footprint(self):
+        """Return the bytes scanned by the first search pass and in total.
+
+        Returns:
+            dict: 'search_bytes' (codes or prefixes, or full vectors when
+                neither is used) and 'vector_bytes' (full-precision rows
+                on disk)
+        """
+        with self._lock:
+            self._refresh()
+            rows = len(self._node_ids)
+            code_dimensions = self._prefix_dimensions() or self._dimensions
+            vector_bytes = rows * self._dimensions * 4
+            if self.quantization == "int8":
+                search_bytes = rows * (code_dimensions + 4)
+            elif self.quantization == "binary":
+                search_bytes = rows * _binary_code_bytes(code_dimensions)
+            else:
+                search_bytes = rows * code_dimensions * 4
+            return {"search_bytes": search_bytes, "vector_bytes": vector_bytes}
+
+    def count(self):
+        """Return the number of stored nodes.
+
+        Returns:
+            int: Node count
+        """
+        with self._lock:
+            self._refresh()
+            return len(self._slots)
+
+    def _search(self, queries, arrays, valid, rows, k):
+        vectors, codes, scales = arrays
+        if codes is None:
+            return _finite(*self._top_k(
+                lambda start, stop: queries @ vectors[start:stop].T,
+                len(queries), valid, rows, k, self.block_rows,
+            ))
+
+        # First pass over the compact codes or leading dimensions
+        shortlist = k * self.rescore_multiplier
+        search_queries = self._search_space(queries)
+        block_rows = self.block_rows
+        if self.quantization == "int8":
+            block_rows = max(1, min(block_rows, INT8_BLOCK_VALUES // max(1, codes.shape[1])))
+            buffer = np.empty((block_rows, codes.shape[1]), dtype=np.float32)
+
+            def score_block(start, stop):
+                block = buffer[:stop - start]
+                np.copyto(block, codes[start:stop])
+                return (block @ search_queries.T).T * scales[start:stop]
+        elif self.quantization == "binary":
+            query_bits = _pack_bits(search_queries).view(np.uint64)
+            score_block = lambda start, stop: -np.stack([
+                _hamming(codes[start:stop].view(np.uint64), bits) for bits in query_bits
+            ]).astype(np.float32)
+        else:
+            score_block = lambda start, stop: search_queries @ codes[start:stop].T
+        candidate_slots, _ = _finite(*self._top_k(score_block, len(queries), valid, rows,
+                                                  shortlist, block_rows))
+
+        # Exact rescoring of the shortlist against the full-precision rows
+        top_slots, top_scores = [], []
+        for query, slots in zip(queries, candidate_slots):
+            slots = np.sort(np.asarray(slots, dtype=np.int64))
+            scores = vectors[slots] @ query if len(slots) else np.zeros(0, dtype=np.float32)
+            order = np.argsort(-scores, kind="stable")[:k]
+            top_slots.append(slots[order].tolist())
+            top_scores.append(scores[order])
+        return top_slots, top_scores
+
+    @staticmethod
+    def _top_k(score_block, query_count, valid, rows, k, block_rows):
+        # Running top-k per query, merged block by block with argpartition
+        best_scores = np.full((query_count, 0), -np.inf, dtype=np.float32)
+        best_slots = np.zeros((query_count, 0), dtype=np.int64)
+        for start in range(0, rows, block_rows):
+            stop = min(start + block_rows, rows)
+            scores = score_block(start, stop)
+            scores[:, ~valid[start:stop]] = -np.inf
+            slots = np.broadcast_to(np.arange(start, stop), scores.shape)
+
+            scores = np.concatenate([best_scores, scores], axis=1)
+            slots = np.concatenate([best_slots, slots], axis=1)
+            if scores.shape[1] > k:
+                keep = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+                scores = np.take_along_axis(scores, keep, axis=1)
+                slots = np.take_along_axis(slots, keep, axis=1)
+            best_scores, best_slots = scores, slots
+
+        order = np.argsort(-best_scores, axis=1, kind="stable")
+        return np.take_along_axis(best_slots, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _prefix_dimensions(self):
+        # Leading dimensions scanned by the first pass, 0 when it uses all of them
+        if 0 < self.search_dimensions < self._dimensions:
+            return self.search_dimensions
+        return 0
+
+    def _search_space(self, vectors):
+        # Re-normalised prefixes when searching at reduced dimension
+        prefix = self._prefix_dimensions()
+        return _normalize(vectors[:, :prefix]) if prefix else vectors
+
+    def _encode(self, slots, vectors):
+        vectors = self._search_space(vectors)
+        if self.quantization == "int8":
+            scales = np.abs(vectors).max(axis=1) / 127
+            scales[scales == 0] = 1.0
+            self._codes[slots] = np.rint(vectors / scales[:, None]).astype(np.int8)
+            self._scales[slots] = scales
+            self._scales.flush()
+        elif self.quantization == "binary":
+            self._codes[slots] = _pack_bits(vectors)
+        elif self._prefix_dimensions():
+            self._codes[slots] = vectors
+        else:
+            return
+        self._codes.flush()
+
+    def _rebuild_codes(self, rows):
+        # Encode every row after the quantization mode or search dimension changed
+        for start in range(0, rows, self.block_rows):
+            stop = min(start + self.block_rows, rows)
+            self._encode(np.arange(start, stop), np.asarray(self._vectors[start:stop]))
+        with self._conn:
+            self._set_meta("quantization", QUANTIZATION_MODES[self.quantization])
+            self._set_meta("search_dimensions", self._prefix_dimensions())
+
+    def _node_row(self, slot, node):
+        self._node_ids[slot] = node.node_id
+        metadata = node_to_metadata_dict(node, remove_text=True, flat_metadata=self.flat_metadata)
+        return (slot, node.node_id, node.ref_doc_id,
+                node.get_content(metadata_mode=MetadataMode.NONE), json.dumps(metadata))
+
+    def _load_nodes(self, slots):
+        # (slot, node) pairs in slot order, skipping slots deleted meanwhile
+        if not slots:
+            return []
+        rows = {}
+        for start in range(0, len(slots), 500):
+            part = slots[start:start + 500]
+            rows.update((row[0], row) for row in self._conn.execute(
+                f"SELECT slot, text, metadata FROM nodes WHERE slot IN ({','.join('?' * len(part))})",
+                part,
+            ))
+        return [
+            (slot, metadata_dict_to_node(json.loads(rows[slot][2]), text=rows[slot][1]))
+            for slot in slots if slot in rows
+        ]
+
+    def _allocate_slots(self, node_ids):
+        # Existing IDs keep their slot, new IDs take free slots, then new rows
+        free = iter(np.flatnonzero(~self._valid[:len(self._node_ids)]).tolist())
+        slots = []
+        for node_id in node_ids:
+            slot = self._slots.get(node_id)
+            if slot is None:
+                slot = next(free, None)
+            if slot is None:
+                slot = len(self._node_ids)
+                self._node_ids.append(None)
+            self._slots[node_id] = slot
+            slots.append(slot)
+        self._open_vectors(len(self._node_ids))
+        self._valid[slots] = True
+        self._set_meta("rows", len(self._node_ids))
+        return slots
+
+    def _set_dimensions(self, dimensions):
+        if self._dimensions == 0:
+            self._dimensions = dimensions
+            self._set_meta("dimensions", dimensions)
+            self._set_meta("quantization", QUANTIZATION_MODES[self.quantization])
+            self._set_meta("search_dimensions", self._prefix_dimensions())
+            self._open_vectors(len(self._node_ids))
+        elif dimensions != self._dimensions:
+            raise ValueError(
+                f"Embedding dimension {dimensions} does not match the store dimension {self._dimensions}"
+            )
+
+    def _refresh(self):
+        # PRAGMA data_version changes only when another connection commits
+        if self._conn.execute("PRAGMA data_version").fetchone()[0] != self._data_version:
+            self._reload()
+
+    def _reload(self):
+        self._data_version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+        self._dimensions = self._get_meta("dimensions")
+        rows = self._get_meta("rows")
+        self._node_ids = [None] * rows
+        self._slots = {}
+        for slot, node_id in self._conn.execute("SELECT slot, node_id FROM nodes"):
+            self._node_ids[slot] = node_id
+            self._slots[node_id] = slot
+        self._vectors, self._codes, self._scales, self._capacity = None, None, None, 0
+        self._valid = np.zeros(0, dtype=bool)
+        self._open_vectors(rows)
+        self._valid[:rows] = [node_id is not None for node_id in self._node_ids]
+        if self._dimensions and (
+            self._get_meta("quantization") != QUANTIZATION_MODES[self.quantization]
+            or self._get_meta("search_dimensions") != self._prefix_dimensions()
+        ):
+            self._rebuild_codes(rows)
+
+    def _open_vectors(self, required_rows):
+        capacity = max(1024, self._capacity)
+        while capacity < required_rows:
+            capacity *= 2
+        if (self._vectors is not None and capacity == self._capacity
+                and self._vectors.shape[1] == self._dimensions):
+            return
+
+        valid = np.zeros(capacity, dtype=bool)
+        valid[:len(self._valid)] = self._valid
+        self._valid = valid
+        self._capacity = capacity
+        if not self._dimensions:
+            self._vectors = np.zeros((capacity, 0), dtype=np.float32)
+            return
+
+        self._vectors = _open_memmap(self._vectors_path, np.float32, (capacity, self._dimensions))
+        code_dimensions = self._prefix_dimensions() or self._dimensions
+        if self.quantization == "int8":
+            self._codes = _open_memmap(os.path.join(self.path, "codes.i8"), np.int8,
+                                       (capacity, code_dimensions))
+            self._scales = _open_memmap(os.path.join(self.path, "scales.f32"), np.float32, (capacity,))
+        elif self.quantization == "binary":
+            self._codes = _open_memmap(os.path.join(self.path, "codes.bin"), np.uint8,
+                                       (capacity, _binary_code_bytes(code_dimensions)))
+        elif self._prefix_dimensions():
+            self._codes = _open_memmap(os.path.join(self.path, "prefix.f32"), np.float32,
+                                       (capacity, code_dimensions))
+
+    def _get_meta(self, name):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_meta(self, name, value):
+        self._conn.execute("INSERT OR REPLACE INTO meta (name, value) VALUES (?, ?)", (name, value))
+
+def _open_memmap(path, dtype, shape):
+    # Grow the file to the requested shape, then map it
+    size = int(np.prod(shape)) * np.dtype(dtype).itemsize
+    with open(path, "ab") as f:
+        if f.tell() < size:
+            f.truncate(size)
+    return np.memmap(path, dtype=dtype, mode="r+", shape=shape)
+
+def _binary_code_bytes(dimensions):
+    # Sign bits padded to whole 64-bit words
+    return (dimensions + 63) // 64 * 8
+
+def _pack_bits(vectors):
+    bits = np.packbits(vectors > 0, axis=1)
+    padded = np.zeros((len(vectors), _binary_code_bytes(vectors.shape[1])), dtype=np.uint8)
+    padded[:, :bits.shape[1]] = bits
+    return padded
+
+def _hamming(codes, query_bits):
+    # codes: (rows, words) uint64, query_bits: (words,) uint64
+    differing = np.bitwise_xor(codes, query_bits)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(differing).sum(axis=1, dtype=np.int32)
+    return POPCOUNT_TABLE[differing.view(np.uint8)].sum(axis=1, dtype=np.int32)
+
+def _finite(slots, scores):
+    # Drop the -inf padding left by deleted or missing rows
+    return (
+        [row_slots[np.isfinite(row_scores)].tolist() for row_slots, row_scores in zip(slots, scores)],
+        [row_scores[np.isfinite(row_scores)] for row_scores in scores],
+    )
+
+def _normalize(vectors):
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return vectors / norms
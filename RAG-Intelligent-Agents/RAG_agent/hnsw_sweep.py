@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+"""
+Recall/latency sweep of Chroma HNSW parameters over the stored embeddings
+"""
+import argparse
+import shutil
+import tempfile
+import time
+
+import chromadb
+import numpy as np
+
+from config import DB_PATH, COLLECTION_NAME
+from database import open_chroma_collection
+
+def load_embeddings(collection, limit=None, page_size=5000):
+    """Read the stored embeddings of a collection.
+
+    Args:
+        collection (chromadb.Collection): Collection to read
+        limit (int): Maximum number of embeddings to read
+        page_size (int): Embeddings fetched per request
+
+    Returns:
+        numpy.ndarray: One float32 row per stored chunk
+    """
+    total = collection.count() if limit is None else min(limit, collection.count())
+    pages = []
+    for offset in range(0, total, page_size):
+        page = collection.get(limit=min(page_size, total - offset), offset=offset,
+                              include=["embeddings"])
+        pages.append(np.asarray(page["embeddings"], dtype=np.float32))
+    return np.concatenate(pages) if pages else np.zeros((0, 0), dtype=np.float32)
+
+def exact_neighbours(embeddings, queries, k, block_rows=65536):
+    """Return the exact k nearest rows (L2, as in Chroma's default space).
+
+    Args:
+        embeddings (numpy.ndarray): Indexed vectors
+        queries (numpy.ndarray): Query vectors
+        k (int): Neighbours per query
+
+    Returns:
+        list: One set of row numbers per query
+    """
+    best = np.zeros((len(queries), 0), dtype=np.int64)
+    best_distances = np.zeros((len(queries), 0), dtype=np.float32)
+    for start in range(0, len(embeddings), block_rows):
+        block = embeddings[start:start + block_rows]
+        # ||q - x||^2 up to the per-query constant ||q||^2
+        distances = (block * block).sum(axis=1) - 2 * queries @ block.T
+        rows = np.broadcast_to(np.arange(start, start + len(block)), distances.shape)
+        distances = np.concatenate([best_distances, distances], axis=1)
+        rows = np.concatenate([best, rows], axis=1)
+        keep = np.argpartition(distances, min(k, distances.shape[1]) - 1, axis=1)[:, :k]
+        best_distances = np.take_along_axis(distances, keep, axis=1)
+        best = np.take_along_axis(rows, keep, axis=1)
+    return [set(row.tolist()) for row in best]
+
+def sweep(embeddings, queries, k, m_values, ef_construction_values, ef_search_values, directory):
+    """Build one HNSW index per (M, ef_construction) and time every ef_search.
+
+    Args:
+        embeddings (numpy.ndarray): Vectors to index
+        queries (numpy.ndarray): Held-out query vectors
+        k (int): Neighbours per query
+        m_values (list): M values to try
+        ef_construction_values (list): ef_construction values to try
+        ef_search_values (list): ef_search values to try on each index
+        directory (str): Scratch directory for the temporary collections
+
+    Returns:
+        list: One dict per setting with 'm', 'ef_construction', 'ef_search',
+            'recall', 'p50_ms', 'p99_ms' and 'build_s' (adds up to the first
+            query answered)
+    """
+    expected = exact_neighbours(embeddings, queries, k)
+    client = chromadb.PersistentClient(path=directory)
+    batch_size = client.get_max_batch_size()
+    ids = [str(row) for row in range(len(embeddings))]
+    results = []
+    for m in m_values:
+        for ef_construction in ef_construction_values:
+            name = f"sweep_m{m}_efc{ef_construction}"
+            collection = open_chroma_collection(client, name, m, ef_construction, ef_search_values[0])
+            start = time.perf_counter()
+            for offset in range(0, len(embeddings), batch_size):
+                collection.add(ids=ids[offset:offset + batch_size],
+                               embeddings=embeddings[offset:offset + batch_size])
+            # Chroma may index added vectors in the background; the first
+            # query waits for the graph, so it is part of the build
+            collection.query(query_embeddings=queries[:1], n_results=k, include=[])
+            build_seconds = time.perf_counter() - start
+            print(f"🔄 Built M={m}, ef_construction={ef_construction} in {build_seconds:.1f}s")
+
+            for ef_search in ef_search_values:
+                open_chroma_collection(client, name, m, ef_construction, ef_search)
+                # A loaded HNSW index keeps its ef_search, so reopen the client to apply it
+                client.clear_system_cache()
+                client = chromadb.PersistentClient(path=directory)
+                collection = client.get_collection(name)
+                collection.query(query_embeddings=queries[:1], n_results=k, include=[])
+                latencies, recalls = [], []
+                for query, neighbours in zip(queries, expected):
+                    begin = time.perf_counter()
+                    found = collection.query(query_embeddings=query[None, :], n_results=k, include=[])
+                    latencies.append((time.perf_counter() - begin) * 1000)
+                    recalls.append(len({int(i) for i in found["ids"][0]} & neighbours) / len(neighbours))
+                results.append({
+                    "m": m,
+                    "ef_construction": ef_construction,
+                    "ef_search": ef_search,
+                    "recall": float(np.mean(recalls)),
+                    "p50_ms": float(np.percentile(latencies, 50)),
+                    "p99_ms": float(np.percentile(latencies, 99)),
+                    "build_s": build_seconds,
+                })
+            client.delete_collection(name)
+    return results
+
+def format_table(results, k):
+    """Render sweep results as a Markdown table, best recall first.
+
+    Args:
+        results (list): Rows returned by sweep()
+        k (int): Neighbours per query
+
+    Returns:
+        str: Markdown table
+    """
+    lines = [
+        f"| M | ef_construction | ef_search | recall@{k} | p50 ms | p99 ms | build s |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for row in sorted(results, key=lambda row: (-row["recall"], row["p99_ms"])):
+        lines.append(
+            f"| {row['m']} | {row['ef_construction']} | {row['ef_search']} | {row['recall']:.3f} "
+            f"| {row['p50_ms']:.2f} | {row['p99_ms']:.2f} | {row['build_s']:.1f} |"
+        )
+    return "\n".join(lines)
+
+def main():
+    """Command line entry point for the HNSW sweep."""
+    parser = argparse.ArgumentParser(description="Sweep Chroma HNSW parameters over the stored embeddings")
+    parser.add_argument("--m", default="8,16,32", help="Comma-separated M values")
+    parser.add_argument("--ef-construction", default="100,200", help="Comma-separated ef_construction values")
+    parser.add_argument("--ef-search", default="10,20,50,100,200", help="Comma-separated ef_search values")
+    parser.add_argument("--queries", type=int, default=200, help="Stored embeddings held out as queries")
+    parser.add_argument("--k", type=int, default=10, help="Neighbours per query")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum stored embeddings to use")
+    parser.add_argument("--target-recall", type=float, default=0.95,
+                        help="Recall the recommended setting must reach")
+    parser.add_argument("--output", default="hnsw_sweep.md", help="Markdown file for the result table")
+    args = parser.parse_args()
+    to_ints = lambda values: [int(value) for value in values.split(",")]
+
+    print(f"🔄 Loading embeddings from '{COLLECTION_NAME}' in {DB_PATH}...")
+    collection = chromadb.PersistentClient(path=DB_PATH).get_collection(COLLECTION_NAME)
+    embeddings = load_embeddings(collection, args.limit)
+    if len(embeddings) <= args.queries:
+        print(f"❌ Need more than {args.queries} stored embeddings, found {len(embeddings)}")
+        return
+
+    # Held-out queries: the index is built over the remaining embeddings
+    order = np.random.default_rng(0).permutation(len(embeddings))
+    queries, embeddings = embeddings[order[:args.queries]], embeddings[order[args.queries:]]
+    print(f"📊 {len(embeddings)} vectors x {embeddings.shape[1]} dimensions, {len(queries)} queries")
+
+    directory = tempfile.mkdtemp(prefix="hnsw_sweep_")
+    try:
+        results = sweep(embeddings, queries, args.k, to_ints(args.m), to_ints(args.ef_construction),
+                        to_ints(args.ef_search), directory)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    table = format_table(results, args.k)
+    with open(args.output, "w") as f:
+        f.write(table + "\n")
+    print(f"\n{table}\n")
+    print(f"✅ Table written to {args.output}")
+
+    eligible = [row for row in results if row["recall"] >= args.target_recall]
+    if eligible:
+        best = min(eligible, key=lambda row: row["p99_ms"])
+        print(f"   Fastest p99 with recall@{args.k} >= {args.target_recall}: "
+              f"RAG_HNSW_M={best['m']} RAG_HNSW_EF_CONSTRUCTION={best['ef_construction']} "
+              f"RAG_HNSW_EF_SEARCH={best['ef_search']} ({best['p99_ms']:.2f} ms)")
+    else:
+        print(f"   No setting reached recall@{args.k} >= {args.target_recall}")
+
+if __name__ == "__main__":
+    main()
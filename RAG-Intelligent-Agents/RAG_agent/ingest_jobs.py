@@ -0,0 +1,337 @@
+"""
+Persistent background ingestion jobs and the worker pool that runs them
+"""
+import os
+import sqlite3
+import threading
+import time
+import uuid
+
+from config import INGEST_JOBS_PATH, INGEST_JOB_WORKERS, INGEST_JOB_LEASE
+from database import store_document_streaming
+from document_processor import as_buffer, count_pages
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id TEXT PRIMARY KEY,
+    doc_id TEXT NOT NULL,
+    file_name TEXT NOT NULL,
+    status TEXT NOT NULL,
+    page_total INTEGER,
+    pages INTEGER NOT NULL DEFAULT 0,
+    chunks INTEGER NOT NULL DEFAULT 0,
+    error TEXT,
+    created_at REAL,
+    updated_at REAL,
+    payload BLOB,
+    lease_expires REAL
+);
+CREATE INDEX IF NOT EXISTS jobs_by_status ON jobs (status, created_at);
+"""
+
+JOB_FIELDS = (
+    "job_id", "doc_id", "file_name", "status", "page_total", "pages", "chunks",
+    "error", "created_at", "updated_at",
+)
+
+class IngestJobQueue:
+    """SQLite-backed queue of uploaded documents waiting to be ingested.
+
+    The content of each upload is written to its job row, so queued jobs
+    survive a restart; it is dropped when the job ends. The queue is
+    therefore a persistent copy of every pending upload (see
+    INGEST_JOBS_PATH), not an in-memory hand-off. A claimed
+    job holds a lease that its worker renews while it runs (see renew());
+    a running job whose lease has expired belonged to a process that
+    stopped, and is queued again by the next claim. Several processes can
+    share one queue this way without taking over each other's jobs.
+    Progress (pages extracted, chunks embedded) is written to the job row,
+    so any session or process can display it.
+    """
+
+    def __init__(self, path=INGEST_JOBS_PATH, lease_seconds=INGEST_JOB_LEASE):
+        """Open (and create if needed) the job database.
+
+        Args:
+            path (str): Path to the SQLite file
+            lease_seconds (float): How long a claimed job stays running
+                without its lease being renewed
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def submit(self, file_name, doc_id, data):
+        """Queue a document for ingestion.
+
+        Args:
+            file_name (str): Name of the uploaded file (its extension picks
+                the parser)
+            doc_id (str): Unique identifier for the document
+            data (bytes-like or file-like): Content of the file
+
+        Returns:
+            str: Job ID
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._available, self._conn:
+            self._conn.execute(
+                "INSERT INTO jobs (job_id, doc_id, file_name, status, created_at, updated_at, payload) "
+                "VALUES (?, ?, ?, 'queued', ?, ?, ?)",
+                (job_id, doc_id, file_name, now, now, sqlite3.Binary(as_buffer(data))),
+            )
+            self._available.notify()
+        return job_id
+
+    def claim(self, timeout=None):
+        """Take the oldest queued job and mark it running.
+
+        Jobs for a document that is already being ingested wait their turn,
+        so two uploads of the same document never run at once. Running jobs
+        whose lease has expired are queued again first.
+
+        Args:
+            timeout (float): Seconds to wait for a job (None = no wait)
+
+        Returns:
+            dict: Job record, or None if no job became available
+        """
+        deadline = time.monotonic() + (timeout or 0)
+        with self._available:
+            while True:
+                now = time.time()
+                self._reclaim_expired(now)
+                row = self._conn.execute(
+                    f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE status = 'queued' "
+                    "AND doc_id NOT IN (SELECT doc_id FROM jobs WHERE status = 'running') "
+                    "ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is not None:
+                    # Conditional update, so only one process claims the job
+                    # even when several saw it queued
+                    with self._conn:
+                        claimed = self._conn.execute(
+                            "UPDATE jobs SET status = 'running', lease_expires = ?, updated_at = ? "
+                            "WHERE job_id = ? AND status = 'queued' AND doc_id NOT IN "
+                            "(SELECT doc_id FROM jobs WHERE status = 'running')",
+                            (now + self.lease_seconds, now, row[0]),
+                        ).rowcount
+                    if claimed:
+                        return {**dict(zip(JOB_FIELDS, row)), "status": "running"}
+                    continue
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self._available.wait(remaining)
+
+    def _reclaim_expired(self, now):
+        # Checked with a read first: workers poll every second, and an idle
+        # or healthy queue should not take the write lock on every poll
+        expired = self._conn.execute(
+            "SELECT 1 FROM jobs WHERE status = 'running' AND lease_expires < ? LIMIT 1", (now,)
+        ).fetchone()
+        if expired is not None:
+            with self._conn:
+                self._conn.execute(
+                    "UPDATE jobs SET status = 'queued', lease_expires = NULL, updated_at = ? "
+                    "WHERE status = 'running' AND lease_expires < ?",
+                    (now, now),
+                )
+
+    def read_payload(self, job_id):
+        """Return the uploaded content of a job.
+
+        Args:
+            job_id (str): Job ID
+
+        Returns:
+            bytes: File content
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT payload FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or row[0] is None:
+            raise FileNotFoundError(f"No content stored for job {job_id}")
+        return bytes(row[0])
+
+    def renew(self, job_ids):
+        """Extend the lease of running jobs.
+
+        Args:
+            job_ids (iterable): IDs of jobs this process is running
+        """
+        job_ids = list(job_ids)
+        if not job_ids:
+            return
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                f"UPDATE jobs SET lease_expires = ? WHERE status = 'running' "
+                f"AND job_id IN ({', '.join('?' * len(job_ids))})",
+                [now + self.lease_seconds] + job_ids,
+            )
+
+    def update_progress(self, job_id, pages, chunks, page_total=None):
+        """Record how far a running job has got.
+
+        Progress also renews the lease of the job.
+
+        Args:
+            job_id (str): Job ID
+            pages (int): Pages extracted so far
+            chunks (int): Chunks embedded so far
+            page_total (int): Pages in the document, if known
+        """
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET pages = ?, chunks = ?, page_total = COALESCE(?, page_total), "
+                "lease_expires = ?, updated_at = ? WHERE job_id = ? AND status = 'running'",
+                (pages, chunks, page_total, now + self.lease_seconds, now, job_id),
+            )
+
+    def finish(self, job_id, status, error=None):
+        """Mark a job as ended and drop its uploaded content.
+
+        Args:
+            job_id (str): Job ID
+            status (str): "done", "skipped" or "failed"
+            error (str): Error message of a failed job
+        """
+        with self._available, self._conn:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, payload = NULL, lease_expires = NULL, "
+                "updated_at = ? WHERE job_id = ?",
+                (status, error, time.time(), job_id),
+            )
+            # Another job for the same document may now be claimable
+            self._available.notify_all()
+
+    def list_jobs(self, limit=20):
+        """Return the most recent jobs, newest first.
+
+        Args:
+            limit (int): Maximum number of jobs
+
+        Returns:
+            list: Job records with 'job_id', 'doc_id', 'file_name', 'status',
+                'page_total', 'pages', 'chunks', 'error', 'created_at' and
+                'updated_at' keys
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM jobs ORDER BY created_at DESC LIMIT ?",
+                (limit,),
+            ).fetchall()
+        return [dict(zip(JOB_FIELDS, row)) for row in rows]
+
+    def clear_finished(self):
+        """Forget every job that has ended.
+
+        Returns:
+            int: Number of jobs removed
+        """
+        with self._lock, self._conn:
+            return self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'skipped', 'failed')"
+            ).rowcount
+
+class IngestWorkerPool:
+    """Background threads that take jobs from a queue and ingest them.
+
+    Each worker ingests one document at a time through the streaming
+    path, reporting progress after every embedded batch. Embedding calls
+    from all workers (and from queries) are coalesced by the shared
+    embedding service. A heartbeat thread renews the leases of the jobs
+    being run, so long steps without progress (a slow page, a large
+    embedding batch) do not let another process take them over.
+    """
+
+    def __init__(self, queue, index, workers=INGEST_JOB_WORKERS):
+        """Create a pool; call start() to begin taking jobs.
+
+        Args:
+            queue (IngestJobQueue): Queue to take jobs from
+            index: Vector database index to ingest into
+            workers (int): Number of worker threads
+        """
+        self.queue = queue
+        self.index = index
+        self.workers = workers
+        self._threads = []
+        self._stopped = threading.Event()
+        self._running = set()
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        """Start the worker threads and the lease heartbeat."""
+        for number in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"ingest-worker-{number}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        threading.Thread(target=self._heartbeat, name="ingest-heartbeat", daemon=True).start()
+
+    def stop(self, timeout=None):
+        """Stop taking jobs and wait for the running ones to finish.
+
+        Args:
+            timeout (float): Seconds to wait for each worker
+        """
+        self._stopped.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def _run(self):
+        while not self._stopped.is_set():
+            job = self.queue.claim(timeout=1.0)
+            if job is not None:
+                with self._running_lock:
+                    self._running.add(job["job_id"])
+                try:
+                    self._process(job)
+                finally:
+                    with self._running_lock:
+                        self._running.discard(job["job_id"])
+
+    def _heartbeat(self):
+        # Renews well before expiry; after stop() it keeps going until the
+        # last running job has ended
+        while True:
+            time.sleep(self.queue.lease_seconds / 3)
+            with self._running_lock:
+                job_ids = list(self._running)
+            if self._stopped.is_set() and not job_ids:
+                return
+            try:
+                self.queue.renew(job_ids)
+            except sqlite3.Error as e:
+                print(f"⚠️ Could not renew ingestion job leases: {str(e)}")
+
+    def _process(self, job):
+        job_id, file_name = job["job_id"], job["file_name"]
+        try:
+            data = self.queue.read_payload(job_id)
+            self.queue.update_progress(job_id, 0, 0, count_pages(file_name, data))
+            stats = store_document_streaming(
+                file_name, job["doc_id"], self.index, data=data,
+                progress=lambda pages, chunks: self.queue.update_progress(job_id, pages, chunks),
+            )
+            if stats is None:
+                self.queue.finish(job_id, "skipped")
+                print(f"⏭️ Document '{job['doc_id']}' is unchanged, skipping.")
+            else:
+                self.queue.finish(job_id, "done")
+                print(f"✅ Document '{job['doc_id']}' stored successfully "
+                      f"({stats['added']} added, {stats['removed']} removed, "
+                      f"{stats['chunks']} total chunks).")
+        except Exception as e:
+            print(f"❌ Error ingesting '{file_name}': {str(e)}")
+            self.queue.finish(job_id, "failed", str(e))
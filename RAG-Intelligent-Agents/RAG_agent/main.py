@@ -1,9 +1,13 @@
 """
 Main application file that demonstrates the RAG system
 """
+import argparse
+import json
+import time
 from database import initialize_database, store_document_to_db
-from query_engine import query_database, batch_query
-from config import openai_key
+from query_engine import query_database, batch_query, stream_query
+from config import openai_key, BATCH_QUERY_CONCURRENCY, BATCH_QUERY_TIMEOUT
+from utils import load_questions_jsonl
 
 def main():
     """Main function to demonstrate the RAG system."""
@@ -44,7 +48,7 @@ def main():
         "What are the important dates mentioned?"
     ]
     
-    results = batch_query(questions, index, k=3)
+    results = batch_query(questions, index, k=3, concurrency=BATCH_QUERY_CONCURRENCY)
     for result in results:
         print(f"\nQ: {result['question']}")
         print(f"A: {result['answer']}")
@@ -61,13 +65,70 @@ def interactive_mode():
             print("👋 Goodbye!")
             break
         
-        answer = query_database(question, index, k=3)
-        print(f"Answer: {answer}\n")
+        print("Answer: ", end="", flush=True)
+        try:
+            stream = stream_query(question, index, k=3)
+            for token in stream:
+                print(token, end="", flush=True)
+            print()
+            
+            pages = [
+                f"{source['doc_id']} p.{source['page_number']}" if source.get('page_number')
+                else str(source.get('doc_id'))
+                for source in stream.sources
+            ]
+            print(f"📚 Sources: {', '.join(pages)}\n")
+        except Exception as e:
+            print(f"\n❌ Error querying database: {str(e)}\n")
+
+def batch_file_mode(questions_path, k=3, concurrency=BATCH_QUERY_CONCURRENCY,
+                    timeout=BATCH_QUERY_TIMEOUT, output_path=None):
+    """Answer every question in a JSONL file concurrently.
+    
+    Args:
+        questions_path (str): JSONL file of questions
+        k (int): Number of similar documents to retrieve
+        concurrency (int): Maximum number of questions answered at once
+        timeout (float): Seconds allowed per question
+        output_path (str): Optional JSONL file to write the results to
+    """
+    questions = load_questions_jsonl(questions_path)
+    print(f"🔄 Initializing database for {len(questions)} questions...")
+    index = initialize_database()
+    
+    start = time.perf_counter()
+    results = batch_query(questions, index, k=k, concurrency=concurrency, timeout=timeout)
+    elapsed = time.perf_counter() - start
+    
+    if output_path:
+        with open(output_path, "w", encoding="utf-8") as f:
+            for result in results:
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        print(f"💾 Results written to {output_path}")
+    else:
+        for result in results:
+            print(f"\nQ: {result['question']}")
+            print(f"A: {result['answer']}")
+    
+    print(f"\n✅ Answered {len(results)} questions in {elapsed:.1f}s "
+          f"({len(results) / elapsed if elapsed else 0:.2f} questions/sec, concurrency {concurrency})")
 
 if __name__ == "__main__":
-    import sys
+    parser = argparse.ArgumentParser(description="RAG system demo")
+    parser.add_argument("--interactive", action="store_true", help="Ask questions in a REPL")
+    parser.add_argument("--questions", help="JSONL file of questions to answer in batch")
+    parser.add_argument("--output", help="JSONL file for batch results (default: print)")
+    parser.add_argument("--k", type=int, default=3, help="Number of similar documents to retrieve")
+    parser.add_argument("--concurrency", type=int, default=BATCH_QUERY_CONCURRENCY,
+                        help="Questions answered concurrently in batch mode")
+    parser.add_argument("--timeout", type=float, default=BATCH_QUERY_TIMEOUT,
+                        help="Seconds allowed per question in batch mode")
+    args = parser.parse_args()
     
-    if len(sys.argv) > 1 and sys.argv[1] == "--interactive":
+    if args.interactive:
         interactive_mode()
+    elif args.questions:
+        batch_file_mode(args.questions, k=args.k, concurrency=args.concurrency,
+                        timeout=args.timeout, output_path=args.output)
     else:
         main()
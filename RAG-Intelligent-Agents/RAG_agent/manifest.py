@@ -0,0 +1,208 @@
+"""
+Document registry and chunk content hashes for incremental re-indexing
+"""
+import os
+import sqlite3
+import threading
+import time
+from config import MANIFEST_PATH
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    doc_id TEXT PRIMARY KEY,
+    source TEXT,
+    content_hash TEXT,
+    updated_at REAL,
+    size_bytes INTEGER,
+    page_count INTEGER,
+    chunk_count INTEGER
+);
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id TEXT PRIMARY KEY,
+    doc_id TEXT NOT NULL,
+    chunk_hash TEXT NOT NULL,
+    page_number INTEGER
+);
+CREATE INDEX IF NOT EXISTS chunks_by_doc ON chunks (doc_id);
+"""
+
+DOCUMENT_FIELDS = (
+    "doc_id", "source", "content_hash", "updated_at", "size_bytes", "page_count", "chunk_count",
+)
+
+class DocumentManifest:
+    """SQLite-backed record of what has been indexed for each document.
+
+    The manifest stores a content hash per document and per chunk, which
+    lets ingestion skip unchanged files, embed only new chunks and delete
+    chunks that no longer exist. It doubles as the document registry:
+    listing documents and finding the chunks to delete read only this
+    database, never the vector store.
+    """
+
+    def __init__(self, path=MANIFEST_PATH):
+        """Open (and create if needed) the manifest database.
+
+        Args:
+            path (str): Path to the SQLite file
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+
+    def get_document_hash(self, doc_id):
+        """Return the content hash recorded for a document.
+
+        Args:
+            doc_id (str): Document ID
+
+        Returns:
+            str: Content hash, or None if the document is not indexed
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content_hash FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        return row[0] if row else None
+
+    def get_chunk_ids(self, doc_id):
+        """Return the IDs of all chunks recorded for a document.
+
+        Args:
+            doc_id (str): Document ID
+
+        Returns:
+            set: Chunk IDs
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_id FROM chunks WHERE doc_id = ?", (doc_id,)
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def get_all_chunk_ids(self):
+        """Return the IDs of every chunk in the manifest.
+
+        Returns:
+            list: Chunk IDs
+        """
+        with self._lock:
+            return [row[0] for row in self._conn.execute("SELECT chunk_id FROM chunks")]
+
+    def count_chunks(self):
+        """Return the number of chunks in the manifest.
+
+        Returns:
+            int: Chunk count
+        """
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM chunks").fetchone()[0]
+
+    def add_chunks(self, doc_id, chunks):
+        """Record chunks that have been written to the vector store.
+
+        Args:
+            doc_id (str): Document ID
+            chunks (list): Chunk dicts with 'chunk_id', 'chunk_hash' and
+                'page_number' keys
+        """
+        rows = [
+            (chunk["chunk_id"], doc_id, chunk["chunk_hash"], chunk["page_number"])
+            for chunk in chunks
+        ]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO chunks (chunk_id, doc_id, chunk_hash, page_number) "
+                "VALUES (?, ?, ?, ?)",
+                rows,
+            )
+
+    def remove_chunks(self, chunk_ids):
+        """Forget chunks that have been deleted from the vector store.
+
+        Args:
+            chunk_ids (list): Chunk IDs to remove
+        """
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "DELETE FROM chunks WHERE chunk_id = ?",
+                [(chunk_id,) for chunk_id in chunk_ids],
+            )
+
+    def set_document(self, doc_id, source, content_hash, size_bytes=None,
+                     page_count=None, chunk_count=None):
+        """Record a fully indexed document.
+
+        Args:
+            doc_id (str): Document ID
+            source (str): Name of the source file
+            content_hash (str): Hash of the file content
+            size_bytes (int): Size of the source file
+            page_count (int): Number of pages that produced chunks
+            chunk_count (int): Number of chunks stored for the document
+        """
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO documents (doc_id, source, content_hash, updated_at, "
+                "size_bytes, page_count, chunk_count) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (doc_id, source, content_hash, time.time(), size_bytes, page_count, chunk_count),
+            )
+
+    def get_document(self, doc_id):
+        """Return the registry record of a document.
+
+        Args:
+            doc_id (str): Document ID
+
+        Returns:
+            dict: Document record, or None if the document is not indexed
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(DOCUMENT_FIELDS)} FROM documents WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        return dict(zip(DOCUMENT_FIELDS, row)) if row else None
+
+    def list_documents(self):
+        """Return the registry records of all documents, oldest first.
+
+        Returns:
+            list: Dicts with 'doc_id', 'source', 'content_hash', 'updated_at',
+                'size_bytes', 'page_count' and 'chunk_count' keys
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {', '.join(DOCUMENT_FIELDS)} FROM documents ORDER BY updated_at"
+            ).fetchall()
+        return [dict(zip(DOCUMENT_FIELDS, row)) for row in rows]
+
+    def remove_document(self, doc_id):
+        """Forget a document and all of its chunks.
+
+        Args:
+            doc_id (str): Document ID
+        """
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM chunks WHERE doc_id = ?", (doc_id,))
+            self._conn.execute("DELETE FROM documents WHERE doc_id = ?", (doc_id,))
+
+_manifests = {}
+_manifests_lock = threading.Lock()
+
+def get_manifest(path=MANIFEST_PATH):
+    """Return the shared manifest for a path, opening it on first use.
+
+    Args:
+        path (str): Path to the SQLite file
+
+    Returns:
+        DocumentManifest: Manifest instance
+    """
+    with _manifests_lock:
+        if path not in _manifests:
+            _manifests[path] = DocumentManifest(path)
+        return _manifests[path]
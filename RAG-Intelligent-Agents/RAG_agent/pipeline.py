@@ -0,0 +1,312 @@
+"""
+Staged ingestion pipeline: extraction, chunking, embedding and upserts overlap
+"""
+import queue
+import threading
+import time
+
+from llama_index.core import Settings
+from llama_index.core.schema import MetadataMode
+
+from config import (
+    CHUNK_SIZE, CHUNK_OVERLAP, INGEST_BATCH_SIZE,
+    PIPELINE_PAGE_QUEUE_SIZE, PIPELINE_BATCH_QUEUE_SIZE,
+    PIPELINE_EMBED_WORKERS, PIPELINE_UPSERT_WORKERS,
+)
+from database import ChunkSync, build_chunk_node, iter_batches
+from document_processor import chunk_pages
+from manifest import get_manifest
+
+# Put on a queue once per consumer when the producing stage has finished
+_END = object()
+
+# Seconds between checks for cancellation while waiting on a queue
+_POLL_INTERVAL = 0.1
+
+class _Cancelled(Exception):
+    """Raised inside a stage when another stage has failed."""
+
+class PipelineStage:
+    """The worker threads of one stage and the bounded queue that feeds them.
+
+    Wall time of every worker is split into time starved (waiting for
+    input), time blocked (waiting for room in the next queue) and busy
+    time, so the bottleneck is the stage that is busy most of the time
+    while the stage before it is blocked.
+    """
+
+    def __init__(self, name, workers, queue_size=0):
+        """Create a stage.
+
+        Args:
+            name (str): Stage name used in statistics
+            workers (int): Number of worker threads
+            queue_size (int): Capacity of the input queue (0 = no input
+                queue, for the first stage)
+        """
+        self.name = name
+        self.workers = workers
+        self.queue_size = queue_size
+        self.inbox = queue.Queue(maxsize=queue_size) if queue_size else None
+        self._lock = threading.Lock()
+        self._items = 0
+        self._starved = 0.0
+        self._blocked = 0.0
+        self._max_depth = 0
+        self._running = workers
+        self._started = time.perf_counter()
+        self._finished = None
+
+    def stats(self):
+        """Return the counters of the stage so far.
+
+        Returns:
+            dict: 'workers', 'queue_depth', 'max_queue_depth', 'queue_size',
+                'items', 'items_per_sec', 'busy' (fraction of worker time),
+                'starved_seconds' and 'blocked_seconds'
+        """
+        with self._lock:
+            elapsed = (self._finished or time.perf_counter()) - self._started
+            worker_seconds = elapsed * self.workers
+            busy = max(0.0, worker_seconds - self._starved - self._blocked)
+            return {
+                "workers": self.workers,
+                "queue_depth": self.inbox.qsize() if self.inbox is not None else 0,
+                "max_queue_depth": self._max_depth,
+                "queue_size": self.queue_size,
+                "items": self._items,
+                "items_per_sec": self._items / elapsed if elapsed else 0.0,
+                "busy": busy / worker_seconds if worker_seconds else 0.0,
+                "starved_seconds": self._starved,
+                "blocked_seconds": self._blocked,
+            }
+
+    def _record(self, items=0, starved=0.0, blocked=0.0):
+        with self._lock:
+            self._items += items
+            self._starved += starved
+            self._blocked += blocked
+            if self.inbox is not None:
+                self._max_depth = max(self._max_depth, self.inbox.qsize())
+
+    def _worker_done(self):
+        # True for the last worker of the stage to finish
+        with self._lock:
+            self._running -= 1
+            if self._running == 0:
+                self._finished = time.perf_counter()
+                return True
+            return False
+
+class IngestPipeline:
+    """Ingest one document through four concurrent stages.
+
+    extract: pulls pages from the page iterator (large PDFs are already
+        extracted by a process pool, see iter_pdf_pages)
+    chunk: splits pages into chunks, assigns chunk IDs, drops chunks the
+        manifest already has and groups the rest into batches
+    embed: embeds batches through the shared embedding service
+    upsert: writes embedded batches to the vector store, the sparse index
+        and the manifest
+
+    Bounded queues between the stages apply backpressure, so a slow stage
+    holds back the ones before it instead of buffering the document. The
+    manifest diff and the writes go through database.ChunkSync, shared
+    with index_document_chunks(): the manifest is updated after every
+    batch and stale chunks are deleted at the end.
+    """
+
+    def __init__(self, index, batch_size=INGEST_BATCH_SIZE, embed_workers=PIPELINE_EMBED_WORKERS,
+                 upsert_workers=PIPELINE_UPSERT_WORKERS, page_queue_size=PIPELINE_PAGE_QUEUE_SIZE,
+                 batch_queue_size=PIPELINE_BATCH_QUEUE_SIZE, manifest=None, sparse_index=None):
+        """Create a pipeline for one document.
+
+        Args:
+            index: Vector database index
+            batch_size (int): Number of chunks embedded and inserted per batch
+            embed_workers (int): Batches being embedded at once
+            upsert_workers (int): Batches being written at once
+            page_queue_size (int): Pages buffered ahead of chunking
+            batch_queue_size (int): Batches buffered ahead of embedding and
+                of upserts
+            manifest (DocumentManifest): Manifest to diff against
+            sparse_index (SparseIndex): Sparse index to update (default:
+                the shared one)
+        """
+        self.index = index
+        self.batch_size = batch_size
+        self.manifest = manifest or get_manifest()
+        self.sparse_index = sparse_index
+        self.stages = [
+            PipelineStage("extract", 1),
+            PipelineStage("chunk", 1, page_queue_size),
+            PipelineStage("embed", embed_workers, batch_queue_size),
+            PipelineStage("upsert", upsert_workers, batch_queue_size),
+        ]
+        self._cancelled = threading.Event()
+        self._errors = []
+
+    def run(self, doc_id, pages, source, content_hash, size_bytes=None, progress=None):
+        """Ingest the pages of a document.
+
+        Args:
+            doc_id (str): Unique identifier for the document
+            pages (iterable): (page_number, text) or (page_number, text,
+                section) tuples, as yielded by iter_pages()
+            source (str): Name of the file the pages were extracted from
+            content_hash (str): Hash of the document content
+            size_bytes (int): Size of the source file, kept in the registry
+            progress (callable): Called as progress(pages, chunks) with the
+                pages extracted and chunks embedded so far, after every batch
+
+        Returns:
+            dict: Counts of 'chunks', 'added' and 'removed' chunks
+        """
+        extract, chunk, embed, upsert = self.stages
+        sync = ChunkSync(doc_id, self.index, source, content_hash, manifest=self.manifest,
+                         size_bytes=size_bytes, progress=progress, sparse_index=self.sparse_index)
+
+        def extract_pages():
+            try:
+                for page in pages:
+                    self._put(extract, chunk, page)
+            finally:
+                # Lets iter_pages() shut down its extraction pool early on failure
+                if hasattr(pages, "close"):
+                    pages.close()
+
+        def chunk_pages_into_batches():
+            chunks = chunk_pages(self._drain(chunk), CHUNK_SIZE, CHUNK_OVERLAP)
+            for batch in iter_batches(sync.new_chunks(chunks), self.batch_size):
+                self._put(chunk, embed, batch)
+
+        def embed_batches():
+            for batch in self._drain(embed):
+                nodes = [build_chunk_node(item, doc_id, source) for item in batch]
+                embeddings = Settings.embed_model.get_text_embedding_batch(
+                    [node.get_content(metadata_mode=MetadataMode.EMBED) for node in nodes]
+                )
+                for node, embedding in zip(nodes, embeddings):
+                    node.embedding = embedding
+                self._put(embed, upsert, (batch, nodes))
+
+        def upsert_batches():
+            for batch, nodes in self._drain(upsert):
+                # Nodes already carry their embeddings, so this only writes
+                sync.write_batch(batch, nodes)
+                upsert._record(items=1)
+
+        bodies = [extract_pages, chunk_pages_into_batches, embed_batches, upsert_batches]
+        threads = []
+        for position, (stage, body) in enumerate(zip(self.stages, bodies)):
+            next_stage = self.stages[position + 1] if position + 1 < len(self.stages) else None
+            for number in range(stage.workers):
+                thread = threading.Thread(
+                    target=self._run_worker, args=(stage, body, next_stage),
+                    name=f"ingest-{stage.name}-{number}", daemon=True,
+                )
+                thread.start()
+                threads.append(thread)
+        for thread in threads:
+            thread.join()
+        if self._errors:
+            raise self._errors[0]
+        return sync.finish()
+
+    def stats(self):
+        """Return per-stage statistics, readable while the pipeline runs.
+
+        Returns:
+            dict: Stage name to the dict returned by PipelineStage.stats()
+        """
+        return {stage.name: stage.stats() for stage in self.stages}
+
+    def _run_worker(self, stage, body, next_stage):
+        try:
+            body()
+        except _Cancelled:
+            pass
+        except Exception as e:
+            self._errors.append(e)
+            self._cancelled.set()
+        finally:
+            if stage._worker_done() and next_stage is not None:
+                for _ in range(next_stage.workers):
+                    try:
+                        self._put(stage, next_stage, _END, count=False)
+                    except _Cancelled:
+                        break
+
+    def _put(self, stage, next_stage, item, count=True):
+        # Blocks while the next stage's queue is full (backpressure); end
+        # markers (count=False) are sent after the stage has finished and
+        # are left out of its statistics
+        start = time.perf_counter()
+        while True:
+            if self._cancelled.is_set():
+                raise _Cancelled()
+            try:
+                next_stage.inbox.put(item, timeout=_POLL_INTERVAL)
+                break
+            except queue.Full:
+                continue
+        if count:
+            stage._record(items=1, blocked=time.perf_counter() - start)
+        next_stage._record()
+
+    def _drain(self, stage):
+        # Items from a stage's queue until the previous stage has finished
+        while True:
+            start = time.perf_counter()
+            while True:
+                if self._cancelled.is_set():
+                    raise _Cancelled()
+                try:
+                    item = stage.inbox.get(timeout=_POLL_INTERVAL)
+                    break
+                except queue.Empty:
+                    continue
+            stage._record(starved=time.perf_counter() - start)
+            if item is _END:
+                return
+            yield item
+
+_latest = None
+_latest_lock = threading.Lock()
+
+def run_pipeline(doc_id, pages, index, source, content_hash, manifest=None,
+                 batch_size=INGEST_BATCH_SIZE, size_bytes=None, progress=None):
+    """Ingest a document with a new IngestPipeline.
+
+    The pipeline stays available through get_pipeline_stats() while it
+    runs and after it finishes.
+
+    Args:
+        doc_id (str): Unique identifier for the document
+        pages (iterable): Pages as yielded by iter_pages()
+        index: Vector database index
+        source (str): Name of the file the pages were extracted from
+        content_hash (str): Hash of the document content
+        manifest (DocumentManifest): Manifest to diff against
+        batch_size (int): Number of chunks embedded and inserted per batch
+        size_bytes (int): Size of the source file, kept in the registry
+        progress (callable): Called as progress(pages, chunks) after every batch
+
+    Returns:
+        dict: Counts of 'chunks', 'added' and 'removed' chunks
+    """
+    global _latest
+    pipeline = IngestPipeline(index, batch_size=batch_size, manifest=manifest)
+    with _latest_lock:
+        _latest = pipeline
+    return pipeline.run(doc_id, pages, source, content_hash, size_bytes=size_bytes, progress=progress)
+
+def get_pipeline_stats():
+    """Return per-stage statistics of the most recently started pipeline.
+
+    Returns:
+        dict: Stage name to statistics, or None if no pipeline has run
+    """
+    with _latest_lock:
+        pipeline = _latest
+    return pipeline.stats() if pipeline is not None else None
@@ -0,0 +1,98 @@
+"""
+In-memory cache of retrieval results and answers
+"""
+import itertools
+import threading
+import time
+import weakref
+from collections import OrderedDict
+
+from config import QUERY_CACHE_SIZE, QUERY_CACHE_TTL
+
+class QueryCache:
+    """Thread-safe LRU cache whose entries also expire after a TTL."""
+
+    def __init__(self, max_entries=QUERY_CACHE_SIZE, ttl=QUERY_CACHE_TTL):
+        """Create an empty cache.
+
+        Args:
+            max_entries (int): Maximum number of entries before LRU eviction
+            ttl (float): Seconds an entry stays valid after it was stored
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached value for a key.
+
+        Args:
+            key: Hashable cache key
+
+        Returns:
+            The cached value, or None if missing or expired
+        """
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None or time.monotonic() - item[0] > self.ttl:
+                if item is not None:
+                    del self._entries[key]
+                self.stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self.stats["hits"] += 1
+            return item[1]
+
+    def put(self, key, value):
+        """Store a value, evicting the least recently used entry if full.
+
+        Args:
+            key: Hashable cache key
+            value: Value to store
+        """
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+
+    def clear(self):
+        """Remove every entry."""
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+_index_versions = weakref.WeakKeyDictionary()
+_index_tokens = itertools.count()
+_versions_lock = threading.Lock()
+
+def get_index_version(index):
+    """Return a value that changes whenever the index content changes.
+
+    Args:
+        index: Vector database index
+
+    Returns:
+        tuple: (index token, version number)
+    """
+    with _versions_lock:
+        if index not in _index_versions:
+            _index_versions[index] = [next(_index_tokens), 0]
+        return tuple(_index_versions[index])
+
+def bump_index_version(index):
+    """Mark an index as changed so that cached results for it are ignored.
+
+    Args:
+        index: Vector database index
+    """
+    with _versions_lock:
+        if index in _index_versions:
+            _index_versions[index][1] += 1
+        else:
+            _index_versions[index] = [next(_index_tokens), 1]
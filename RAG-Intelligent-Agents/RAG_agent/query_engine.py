@@ -1,7 +1,364 @@
 """
 Query engine for retrieving information from the vector database
 """
-from database import initialize_database
+import asyncio
+import time
+from llama_index.core import Settings, QueryBundle
+from llama_index.core.schema import NodeWithScore
+from config import (
+    SEMANTIC_CACHE_ENABLED, BATCH_QUERY_CONCURRENCY, BATCH_QUERY_TIMEOUT,
+    RETRIEVAL_MODE, HYBRID_CANDIDATES, RERANK_ENABLED, RERANK_CANDIDATES,
+)
+from database import query_vector_store_batch, get_node_embeddings
+from engine_pool import get_query_engine, get_retriever
+from query_cache import QueryCache, get_index_version
+from rerank import Reranker
+from semantic_cache import SemanticCache
+from sparse_index import get_sparse_index, reciprocal_rank_fusion
+
+# Retrieval results and answers keyed by (question, k, index version)
+query_cache = QueryCache()
+
+# Answers reused for near-duplicate questions (None when disabled)
+semantic_cache = SemanticCache() if SEMANTIC_CACHE_ENABLED else None
+
+# Narrows over-fetched candidates to the best k before synthesis (None when disabled)
+reranker = Reranker() if RERANK_ENABLED else None
+
+def retrieve(question, index, k=3, query_embedding=None):
+    """Retrieve the nodes for a question, reusing cached results.
+    
+    The cache entry holds the query embedding, the retrieved nodes with
+    their scores and, once synthesized, the answer. Entries are keyed by
+    the index version, so inserts and deletes invalidate them.
+    
+    Args:
+        question (str): The question to ask
+        index: Vector database index
+        k (int): Number of similar documents to retrieve
+        query_embedding (list): Embedding of the question, if already known
+        
+    Returns:
+        dict: Cache entry with 'query_embedding', 'nodes', 'node_ids',
+            'rerank' and 'answer' keys
+    """
+    key = _cache_key(question, index, k)
+    entry = query_cache.get(key)
+    if entry is not None:
+        return entry
+    
+    if query_embedding is None:
+        query_embedding = Settings.embed_model.get_query_embedding(question)
+    retriever = get_retriever(index, _candidate_k(k))
+    nodes = retriever.retrieve(QueryBundle(question, embedding=query_embedding))
+    nodes, rerank = select_nodes(question, index, nodes, k, query_embedding)
+    return _cache_retrieval(key, query_embedding, nodes, rerank)
+
+async def aretrieve(question, index, k=3, query_embedding=None):
+    """Async version of retrieve().
+    
+    Args:
+        question (str): The question to ask
+        index: Vector database index
+        k (int): Number of similar documents to retrieve
+        query_embedding (list): Embedding of the question, if already known
+        
+    Returns:
+        dict: Cache entry as returned by retrieve()
+    """
+    key = _cache_key(question, index, k)
+    entry = query_cache.get(key)
+    if entry is not None:
+        return entry
+    
+    if query_embedding is None:
+        query_embedding = await Settings.embed_model.aget_query_embedding(question)
+    retriever = get_retriever(index, _candidate_k(k))
+    nodes = await retriever.aretrieve(QueryBundle(question, embedding=query_embedding))
+    nodes, rerank = select_nodes(question, index, nodes, k, query_embedding)
+    return _cache_retrieval(key, query_embedding, nodes, rerank)
+
+def fuse_hybrid(question, index, vector_nodes, k=3):
+    """Fuse vector results with BM25 keyword results.
+    
+    In hybrid mode the BM25 ranking from the sparse index and the vector
+    ranking are combined with reciprocal rank fusion, and chunks found only
+    by BM25 are fetched from the vector store. In vector mode the vector
+    results are returned unchanged.
+    
+    Args:
+        question (str): The question being answered
+        index: Vector database index
+        vector_nodes (list): Nodes with scores from the vector search
+        k (int): Number of nodes to return
+        
+    Returns:
+        list: Top k nodes in fused order. Nodes keep their vector
+            similarity as score, so displayed scores stay comparable;
+            chunks found only by BM25 have no vector score (None)
+    """
+    if RETRIEVAL_MODE != "hybrid":
+        return vector_nodes[:k]
+    
+    sparse_hits = get_sparse_index().search(question, _candidate_k(k))
+    fused = reciprocal_rank_fusion([
+        [node.node_id for node in vector_nodes],
+        [chunk_id for chunk_id, _ in sparse_hits],
+    ])[:k]
+    
+    nodes_by_id = {node.node_id: node.node for node in vector_nodes}
+    missing = [chunk_id for chunk_id, _ in fused if chunk_id not in nodes_by_id]
+    if missing:
+        for node in index.vector_store.get_nodes(node_ids=missing):
+            nodes_by_id[node.node_id] = node
+    
+    vector_scores = {node.node_id: node.score for node in vector_nodes}
+    return [
+        NodeWithScore(node=nodes_by_id[chunk_id], score=vector_scores.get(chunk_id))
+        for chunk_id, _ in fused if chunk_id in nodes_by_id
+    ]
+
+def select_nodes(question, index, candidates, k=3, query_embedding=None):
+    """Turn the raw vector search results into the nodes used for synthesis.
+    
+    Without reranking this is fuse_hybrid(). With reranking, the fused
+    candidate set is kept at its over-fetched size and the reranker picks
+    the best RERANK_TOP_N (at most k) from it.
+    
+    Args:
+        question (str): The question being answered
+        index: Vector database index
+        candidates (list): Nodes with scores from the vector search
+        k (int): Number of nodes to return
+        query_embedding (list): Embedding of the question
+        
+    Returns:
+        tuple: (nodes with scores, rerank report or None)
+    """
+    if reranker is None:
+        return fuse_hybrid(question, index, candidates, k), None
+    
+    nodes = fuse_hybrid(question, index, candidates, _candidate_k(k))
+    node_embeddings = get_node_embeddings(index, [node.node_id for node in nodes])
+    return reranker.rerank(question, query_embedding, nodes, k, node_embeddings)
+
+def _candidate_k(k):
+    candidates = k
+    if RETRIEVAL_MODE == "hybrid":
+        candidates = max(candidates, HYBRID_CANDIDATES)
+    if reranker is not None:
+        candidates = max(candidates, RERANK_CANDIDATES)
+    return candidates
+
+def _cache_key(question, index, k):
+    return (question.strip(), k, get_index_version(index))
+
+def _cache_retrieval(key, query_embedding, nodes, rerank=None):
+    entry = {
+        "query_embedding": query_embedding,
+        "nodes": nodes,
+        "node_ids": [(node.node_id, node.score) for node in nodes],
+        "rerank": rerank,
+        "answer": None,
+    }
+    query_cache.put(key, entry)
+    return entry
+
+def batch_retrieve(questions, index, k=3):
+    """Retrieve nodes for many questions with batched embedding and search.
+    
+    All questions are embedded in one request to the embedding service and
+    searched with a single multi-query request to the vector store. The
+    results are also stored in the query cache.
+    
+    Args:
+        questions (list): List of questions
+        index: Vector database index
+        k (int): Number of similar documents to retrieve per question
+        
+    Returns:
+        list: One ranked list of nodes with scores per question
+    """
+    return [entry["nodes"] for entry in _batch_retrieve_entries(questions, index, k)]
+
+def _batch_retrieve_entries(questions, index, k):
+    keys = [_cache_key(question, index, k) for question in questions]
+    entries = [query_cache.get(key) for key in keys]
+    missing = [position for position, entry in enumerate(entries) if entry is None]
+    if not missing:
+        return entries
+    
+    query_embeddings = Settings.embed_model.get_text_embedding_batch(
+        [questions[position] for position in missing]
+    )
+    results = query_vector_store_batch(index, query_embeddings, _candidate_k(k))
+    for position, query_embedding, nodes in zip(missing, query_embeddings, results):
+        nodes, rerank = select_nodes(questions[position], index, nodes, k, query_embedding)
+        entries[position] = _cache_retrieval(keys[position], query_embedding, nodes, rerank)
+    return entries
+
+def format_sources(nodes):
+    """Convert retrieved nodes into plain source dictionaries.
+    
+    Args:
+        nodes (list): Retrieved nodes with scores
+        
+    Returns:
+        list: Dicts with 'text', 'score', 'doc_id' and 'page_number' keys
+            ('score' is None for chunks found only by keyword search)
+    """
+    return [
+        {
+            "text": node.text,
+            "score": node.score,
+            "doc_id": node.metadata.get("doc_id"),
+            "page_number": node.metadata.get("page_number"),
+        }
+        for node in nodes
+    ]
+
+def query_with_sources(question, index, k=3, entry=None):
+    """Answer a question and return the answer with its sources.
+    
+    Exact repeats are served from the query cache. When the semantic cache
+    is enabled, a near-duplicate of an earlier question returns that
+    question's answer without retrieval or synthesis.
+    
+    Args:
+        question (str): The question to ask
+        index: Vector database index
+        k (int): Number of similar documents to retrieve
+        entry (dict): Retrieval result already fetched for this question,
+            e.g. by batch_retrieve()
+        
+    Returns:
+        dict: 'answer', 'sources' and 'cache' ("exact", "semantic" or None)
+    """
+    entry = entry or query_cache.get(_cache_key(question, index, k))
+    if entry is not None and entry["answer"] is not None:
+        return _exact_hit(entry)
+    
+    query_embedding = entry["query_embedding"] if entry else Settings.embed_model.get_query_embedding(question)
+    hit = _semantic_hit(question, query_embedding, index, k)
+    if hit is not None:
+        return hit
+    
+    entry = entry or retrieve(question, index, k, query_embedding)
+    
+    # Synthesize an answer from the retrieved nodes
+    query_engine = get_query_engine(index, k)
+    response = query_engine.synthesize(QueryBundle(question), entry["nodes"])
+    return _store_answer(question, index, k, entry, str(response))
+
+async def aquery_with_sources(question, index, k=3, entry=None):
+    """Async version of query_with_sources() using the engine's async APIs.
+    
+    Args:
+        question (str): The question to ask
+        index: Vector database index
+        k (int): Number of similar documents to retrieve
+        entry (dict): Retrieval result already fetched for this question,
+            e.g. by batch_retrieve()
+        
+    Returns:
+        dict: 'answer', 'sources' and 'cache' ("exact", "semantic" or None)
+    """
+    entry = entry or query_cache.get(_cache_key(question, index, k))
+    if entry is not None and entry["answer"] is not None:
+        return _exact_hit(entry)
+    
+    if entry:
+        query_embedding = entry["query_embedding"]
+    else:
+        query_embedding = await Settings.embed_model.aget_query_embedding(question)
+    hit = _semantic_hit(question, query_embedding, index, k)
+    if hit is not None:
+        return hit
+    
+    entry = entry or await aretrieve(question, index, k, query_embedding)
+    
+    # Synthesize an answer from the retrieved nodes
+    query_engine = get_query_engine(index, k)
+    response = await query_engine.asynthesize(QueryBundle(question), entry["nodes"])
+    return _store_answer(question, index, k, entry, str(response))
+
+def _exact_hit(entry):
+    return {"answer": entry["answer"], "sources": format_sources(entry["nodes"]), "cache": "exact"}
+
+def _semantic_hit(question, query_embedding, index, k):
+    if semantic_cache is None:
+        return None
+    hit = semantic_cache.lookup(question, query_embedding, k, get_index_version(index))
+    if hit is None:
+        return None
+    return {"answer": hit["answer"], "sources": hit["sources"], "cache": "semantic"}
+
+def _store_answer(question, index, k, entry, answer):
+    entry["answer"] = answer
+    sources = format_sources(entry["nodes"])
+    if semantic_cache is not None:
+        semantic_cache.add(question, entry["query_embedding"], k, answer, sources,
+                           get_index_version(index))
+    return {"answer": answer, "sources": sources, "cache": None}
+
+class AnswerStream:
+    """Iterable of answer tokens whose sources are attached when it ends.
+    
+    Iterate over the stream to receive tokens as the synthesizer produces
+    them. Once the stream is exhausted, `answer` holds the full text and
+    `sources` the nodes the answer was built from.
+    """
+    
+    def __init__(self, tokens, sources=None, on_complete=None, cache=None):
+        self.answer = None
+        self.sources = None
+        self.cache = cache
+        self._tokens = tokens
+        self._final_sources = sources
+        self._on_complete = on_complete
+    
+    def __iter__(self):
+        parts = []
+        for token in self._tokens:
+            parts.append(token)
+            yield token
+        self.answer = "".join(parts)
+        if self._on_complete is not None:
+            self._final_sources = self._on_complete(self.answer)["sources"]
+        self.sources = self._final_sources
+
+def stream_query(question, index, k=3):
+    """Answer a question, yielding tokens as they are generated.
+    
+    Cached answers are returned as a single token.
+    
+    Args:
+        question (str): The question to ask
+        index: Vector database index
+        k (int): Number of similar documents to retrieve
+        
+    Returns:
+        AnswerStream: Token stream with sources attached at the end
+    """
+    entry = query_cache.get(_cache_key(question, index, k))
+    if entry is not None and entry["answer"] is not None:
+        hit = _exact_hit(entry)
+        return AnswerStream(iter([hit["answer"]]), hit["sources"], cache="exact")
+    
+    query_embedding = entry["query_embedding"] if entry else Settings.embed_model.get_query_embedding(question)
+    hit = _semantic_hit(question, query_embedding, index, k)
+    if hit is not None:
+        return AnswerStream(iter([hit["answer"]]), hit["sources"], cache="semantic")
+    
+    entry = entry or retrieve(question, index, k, query_embedding)
+    
+    # Stream the synthesized answer from the retrieved nodes
+    query_engine = get_query_engine(index, k, streaming=True)
+    response = query_engine.synthesize(QueryBundle(question), entry["nodes"])
+    return AnswerStream(
+        response.response_gen,
+        on_complete=lambda answer: _store_answer(question, index, k, entry, answer),
+    )
 
 def query_database(question, index, k=3):
     """Query the vector database and return an answer.
@@ -15,17 +372,55 @@ def query_database(question, index, k=3):
         str: The answer to the question
     """
     try:
-        # Create query engine
-        query_engine = index.as_query_engine(similarity_top_k=k)
-        
-        # Query the index
-        response = query_engine.query(question)
-        
-        return str(response)
+        return query_with_sources(question, index, k)["answer"]
         
     except Exception as e:
         return f"❌ Error querying database: {str(e)}"
 
+def warm_up(index, k=3):
+    """Pay the cold-start costs of a process before its first question.
+    
+    Embeds a short text (creating the embedding client and its
+    connection), runs one vector search (loading the vector index into
+    memory), opens the sparse index and builds the pooled retriever and
+    the streaming query engine for k. Nothing is written to the query or semantic caches.
+    
+    Args:
+        index: Vector database index
+        k (int): Number of similar documents the first questions will use
+        
+    Returns:
+        float: Seconds spent warming up
+    """
+    start = time.perf_counter()
+    query_embedding = Settings.embed_model.get_query_embedding("warm up")
+    query_vector_store_batch(index, [query_embedding], k=1)
+    if RETRIEVAL_MODE == "hybrid":
+        get_sparse_index().search("warm up", 1)
+    get_retriever(index, _candidate_k(k))
+    get_query_engine(index, k, streaming=True)
+    return time.perf_counter() - start
+
+def get_cache_stats():
+    """Return statistics for the query and semantic caches.
+    
+    Returns:
+        dict: 'query_cache' and 'semantic_cache' statistics (the latter is
+            None when the semantic cache is disabled)
+    """
+    return {
+        "query_cache": {**query_cache.stats, "entries": len(query_cache)},
+        "semantic_cache": semantic_cache.stats() if semantic_cache is not None else None,
+    }
+
+def get_rerank_stats():
+    """Return latency and token savings of the rerank stage.
+    
+    Returns:
+        dict: Reranker statistics, or None when reranking is disabled
+    """
+    return reranker.stats() if reranker is not None else None
+
 def get_similar_documents(question, index, k=3):
     """Get similar documents without generating an answer.
     
@@ -38,31 +433,81 @@ def get_similar_documents(question, index, k=3):
         list: List of similar document chunks
     """
     try:
-        # Create retriever
-        retriever = index.as_retriever(similarity_top_k=k)
-        
-        # Retrieve similar documents
-        nodes = retriever.retrieve(question)
+        nodes = retrieve(question, index, k)["nodes"]
         
-        return [{"text": node.text, "score": node.score} for node in nodes]
+        return format_sources(nodes)
         
     except Exception as e:
         return f"❌ Error retrieving documents: {str(e)}"
 
-def batch_query(questions, index, k=3):
+def batch_query(questions, index, k=3, concurrency=None, timeout=BATCH_QUERY_TIMEOUT):
     """Process multiple queries at once.
     
     Args:
         questions (list): List of questions to ask
         index: Vector database index
         k (int): Number of similar documents to retrieve
+        concurrency (int): Answer up to this many questions at once using
+            asyncio; None answers them one after another
+        timeout (float): Seconds allowed per question in concurrent mode
         
     Returns:
         list: List of answers corresponding to each question
     """
+    if concurrency:
+        return asyncio.run(abatch_query(questions, index, k, concurrency, timeout))
+    
+    entries = _prefetch_retrieval(questions, index, k)
     results = []
-    for question in questions:
-        answer = query_database(question, index, k)
+    for question, entry in zip(questions, entries):
+        try:
+            answer = query_with_sources(question, index, k, entry)["answer"]
+        except Exception as e:
+            answer = f"❌ Error querying database: {str(e)}"
         results.append({"question": question, "answer": answer})
     
     return results
+
+async def abatch_query(questions, index, k=3, concurrency=BATCH_QUERY_CONCURRENCY,
+                       timeout=BATCH_QUERY_TIMEOUT):
+    """Answer questions concurrently with a limit on questions in flight.
+    
+    Args:
+        questions (list): List of questions to ask
+        index: Vector database index
+        k (int): Number of similar documents to retrieve
+        concurrency (int): Maximum number of questions answered at once
+        timeout (float): Seconds allowed per question
+        
+    Returns:
+        list: Dicts with 'question', 'answer' and 'elapsed' keys, in the
+            same order as the questions
+    """
+    entries = await asyncio.to_thread(_prefetch_retrieval, questions, index, k)
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def answer_one(question, entry):
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(
+                    aquery_with_sources(question, index, k, entry), timeout
+                )
+                answer = result["answer"]
+            except asyncio.TimeoutError:
+                answer = f"❌ Timed out after {timeout}s"
+            except Exception as e:
+                answer = f"❌ Error querying database: {str(e)}"
+            return {"question": question, "answer": answer,
+                    "elapsed": time.perf_counter() - start}
+    
+    return list(await asyncio.gather(
+        *(answer_one(question, entry) for question, entry in zip(questions, entries))
+    ))
+
+def _prefetch_retrieval(questions, index, k):
+    # Batched retrieval up front; on failure each question retrieves on its own
+    try:
+        return _batch_retrieve_entries(questions, index, k)
+    except Exception:
+        return [None] * len(questions)
@@ -0,0 +1,179 @@
+"""
+Post-retrieval reranking: near-duplicate removal with MMR and a lexical rerank
+"""
+import threading
+import time
+
+import numpy as np
+from llama_index.core.schema import NodeWithScore
+
+from config import (
+    RERANK_TOP_N, RERANK_MMR_LAMBDA, RERANK_LEXICAL_WEIGHT, RERANK_DUPLICATE_SIMILARITY
+)
+from embeddings import HashEmbeddingBackend, estimate_tokens
+from sparse_index import tokenize
+
+class Reranker:
+    """Cheap CPU stage that narrows a large candidate set to the best few nodes.
+
+    Candidates are first ordered with maximal marginal relevance over their
+    embeddings, which pushes near-duplicates (overlapping chunks, repeated
+    pages) to the back. The 2k most diverse candidates are then rescored by
+    a mix of embedding similarity and query-term coverage, and only the top
+    n (at most k) go to synthesis, skipping any that nearly repeat a chunk
+    already taken, so the LLM reads fewer chunks than the plain top k.
+    Candidates without stored embeddings are compared with
+    hashed bag-of-words vectors instead.
+    """
+
+    def __init__(self, top_n=RERANK_TOP_N, mmr_lambda=RERANK_MMR_LAMBDA,
+                 lexical_weight=RERANK_LEXICAL_WEIGHT,
+                 duplicate_similarity=RERANK_DUPLICATE_SIMILARITY):
+        """Create a reranker.
+
+        Args:
+            top_n (int): Number of nodes to keep; requests for fewer (a
+                smaller k) keep k
+            mmr_lambda (float): MMR trade-off between relevance (1.0) and
+                diversity (0.0)
+            lexical_weight (float): Weight of query-term coverage in the
+                final score
+            duplicate_similarity (float): Cosine similarity at or above
+                which a candidate is dropped as a repeat of a kept one
+        """
+        self.top_n = top_n
+        self.mmr_lambda = mmr_lambda
+        self.lexical_weight = lexical_weight
+        self.duplicate_similarity = duplicate_similarity
+        self._lexical = HashEmbeddingBackend(dimensions=1024)
+        self._lock = threading.Lock()
+        self._stats = {"calls": 0, "candidates": 0, "selected": 0,
+                       "baseline_tokens": 0, "tokens_saved": 0, "seconds": 0.0}
+
+    def rerank(self, question, query_embedding, nodes, k, node_embeddings=None):
+        """Select the best min(top_n, k) nodes from the candidates.
+
+        Args:
+            question (str): The question being answered
+            query_embedding (list): Embedding of the question
+            nodes (list): Candidate nodes with scores
+            k (int): Number of nodes requested
+            node_embeddings (dict): Node ID to stored embedding
+
+        Returns:
+            tuple: (selected nodes with rerank scores, report dict with
+                'candidates', 'selected', 'tokens_saved' and 'latency_ms';
+                tokens_saved compares with the first k candidates, which
+                is what synthesis would get without reranking, and can be
+                negative)
+        """
+        start = time.perf_counter()
+        keep = min(self.top_n, k)
+        selected = nodes
+        if len(nodes) > keep:
+            query, vectors = self._vectors(question, query_embedding, nodes, node_embeddings or {})
+            relevance = vectors @ query
+            pool = self._mmr(relevance, vectors, min(len(nodes), 2 * k))
+            coverage = self._coverage(question, [nodes[i].node.get_content() for i in pool])
+            scores = (1 - self.lexical_weight) * relevance[pool] + self.lexical_weight * coverage
+            order = self._distinct(np.argsort(-scores, kind="stable"), vectors[pool], keep)
+            selected = [
+                NodeWithScore(node=nodes[pool[i]].node, score=float(scores[i])) for i in order
+            ]
+
+        # Without reranking the top k candidates would have been sent, not all of them
+        baseline_tokens = sum(estimate_tokens(node.node.get_content()) for node in nodes[:k])
+        selected_tokens = sum(estimate_tokens(node.node.get_content()) for node in selected)
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self._stats["calls"] += 1
+            self._stats["candidates"] += len(nodes)
+            self._stats["selected"] += len(selected)
+            self._stats["baseline_tokens"] += baseline_tokens
+            self._stats["tokens_saved"] += baseline_tokens - selected_tokens
+            self._stats["seconds"] += elapsed
+
+        return selected, {
+            "candidates": len(nodes),
+            "selected": len(selected),
+            "tokens_saved": baseline_tokens - selected_tokens,
+            "latency_ms": elapsed * 1000,
+        }
+
+    def stats(self):
+        """Return totals for every rerank call so far.
+
+        Returns:
+            dict: Calls, candidates, selected nodes, tokens saved and mean
+                latency in milliseconds
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        calls = stats.pop("calls")
+        seconds = stats.pop("seconds")
+        return {
+            "calls": calls,
+            **stats,
+            "avg_latency_ms": seconds / calls * 1000 if calls else 0.0,
+        }
+
+    def _vectors(self, question, query_embedding, nodes, node_embeddings):
+        # Stored embeddings when every candidate has one, hashed words otherwise
+        embeddings = [node_embeddings.get(node.node_id) for node in nodes]
+        if query_embedding is not None and all(e is not None for e in embeddings):
+            query = np.array(query_embedding, dtype=np.float32)
+            vectors = np.asarray(embeddings, dtype=np.float32)
+        else:
+            query = np.asarray(self._lexical.embed([question])[0], dtype=np.float32)
+            vectors = np.asarray(
+                self._lexical.embed([node.node.get_content() for node in nodes]), dtype=np.float32
+            )
+        query /= np.linalg.norm(query) or 1.0
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return query, vectors / norms
+
+    def _mmr(self, relevance, vectors, count):
+        # Greedy MMR: each step takes the candidate that best balances
+        # relevance against similarity to the candidates already taken
+        selected = [int(np.argmax(relevance))]
+        max_similarity = vectors @ vectors[selected[0]]
+        remaining = np.ones(len(relevance), dtype=bool)
+        remaining[selected[0]] = False
+        while len(selected) < count:
+            mmr = self.mmr_lambda * relevance - (1 - self.mmr_lambda) * max_similarity
+            mmr[~remaining] = -np.inf
+            best = int(np.argmax(mmr))
+            selected.append(best)
+            remaining[best] = False
+            np.maximum(max_similarity, vectors @ vectors[best], out=max_similarity)
+        return np.array(selected)
+
+    def _distinct(self, order, vectors, count):
+        # Best-scoring candidates first, skipping repeats of those already kept
+        kept = []
+        for i in order:
+            if kept and np.max(vectors[kept] @ vectors[i]) >= self.duplicate_similarity:
+                continue
+            kept.append(int(i))
+            if len(kept) == count:
+                break
+        return kept
+
+    @staticmethod
+    def _coverage(question, texts):
+        # Fraction of distinct query terms (and adjacent term pairs) found in each text
+        terms = tokenize(question)
+        unique_terms = set(terms)
+        pairs = set(zip(terms, terms[1:]))
+        if not unique_terms:
+            return np.zeros(len(texts), dtype=np.float32)
+        coverage = []
+        for text in texts:
+            tokens = tokenize(text)
+            token_set = set(tokens)
+            matched = len(unique_terms & token_set) / len(unique_terms)
+            if pairs:
+                matched = 0.8 * matched + 0.2 * len(pairs & set(zip(tokens, tokens[1:]))) / len(pairs)
+            coverage.append(matched)
+        return np.asarray(coverage, dtype=np.float32)
@@ -0,0 +1,158 @@
+"""
+Semantic cache that reuses answers for near-duplicate questions
+"""
+import re
+import threading
+import time
+
+import numpy as np
+
+from config import SEMANTIC_CACHE_THRESHOLD, SEMANTIC_CACHE_SIZE
+from sparse_index import TOKEN_PATTERN
+
+# Words written in capitals, such as "ABN" or "GST"
+ACRONYM_PATTERN = re.compile(r"\b[A-Z][A-Z0-9]+\b")
+
+def identifier_tokens(question):
+    """Return the tokens of a question that a cached answer must share.
+
+    Embeddings barely move when only a number or an identifier changes
+    ("section 51" vs "section 52"), so these tokens are compared exactly:
+    tokens containing a digit or inner punctuation ("s.51", "51-xxix",
+    "2023") and acronyms.
+
+    Args:
+        question (str): Question text
+
+    Returns:
+        frozenset: Lowercase identifier tokens
+    """
+    tokens = {
+        token for token in TOKEN_PATTERN.findall(question.lower())
+        if any(char.isdigit() for char in token) or any(char in "./-" for char in token)
+    }
+    tokens.update(acronym.lower() for acronym in ACRONYM_PATTERN.findall(question))
+    return frozenset(tokens)
+
+class SemanticCache:
+    """Small in-process vector index of previously answered questions.
+
+    Question embeddings are stored L2-normalised in a preallocated matrix,
+    so a lookup is a single matrix-vector product. A lookup hits when the
+    best cosine similarity reaches `threshold` for the same k and index
+    version, and the two questions contain the same numbers and
+    identifiers (see identifier_tokens()). When full, the least recently
+    used answer is evicted.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, max_entries=SEMANTIC_CACHE_SIZE):
+        """Create an empty cache.
+
+        Args:
+            threshold (float): Minimum cosine similarity for a hit
+            max_entries (int): Maximum number of cached answers
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+        self._reset(None)
+
+    def lookup(self, question, query_embedding, k, index_version):
+        """Find a cached answer for a question similar to the query.
+
+        Args:
+            question (str): The incoming question
+            query_embedding (list): Embedding of the incoming question
+            k (int): Number of nodes the answer must have been built from
+            index_version: Current version of the index
+
+        Returns:
+            dict: Entry with 'question', 'answer', 'sources' and
+                'similarity' keys, or None on a miss
+        """
+        query = self._normalize(query_embedding)
+        identifiers = identifier_tokens(question)
+        with self._lock:
+            if (index_version != self._version or not self._entries
+                    or self._matrix.shape[1] != len(query)):
+                self._misses += 1
+                return None
+
+            similarities = self._matrix[:len(self._entries)] @ query
+            for slot in np.argsort(-similarities):
+                if similarities[slot] < self.threshold:
+                    break
+                entry = self._entries[slot]
+                if entry["k"] == k and entry["identifiers"] == identifiers:
+                    self._last_used[slot] = time.monotonic()
+                    self._hits += 1
+                    return {**entry, "similarity": float(similarities[slot])}
+
+            self._misses += 1
+            return None
+
+    def add(self, question, query_embedding, k, answer, sources, index_version):
+        """Store an answer under its question embedding.
+
+        Args:
+            question (str): The question that was answered
+            query_embedding (list): Embedding of the question
+            k (int): Number of nodes the answer was built from
+            answer (str): Synthesized answer
+            sources (list): Sources the answer was built from
+            index_version: Version of the index the answer was built on
+        """
+        vector = self._normalize(query_embedding)
+        with self._lock:
+            if index_version != self._version or self._matrix.shape[1] != len(vector):
+                self._reset(index_version, len(vector))
+
+            if len(self._entries) < self.max_entries:
+                slot = len(self._entries)
+                self._entries.append(None)
+            else:
+                slot = int(np.argmin(self._last_used))
+                self._evictions += 1
+
+            self._matrix[slot] = vector
+            self._last_used[slot] = time.monotonic()
+            self._entries[slot] = {"question": question, "k": k, "answer": answer, "sources": sources,
+                                   "identifiers": identifier_tokens(question)}
+
+    def clear(self):
+        """Remove every cached answer."""
+        with self._lock:
+            self._reset(None)
+
+    def stats(self):
+        """Return hit rate, threshold and eviction counters.
+
+        Returns:
+            dict: Cache statistics
+        """
+        with self._lock:
+            lookups = self._hits + self._misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "threshold": self.threshold,
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else 0.0,
+                "evictions": self._evictions,
+            }
+
+    def _reset(self, index_version, dimensions=0):
+        self._version = index_version
+        self._entries = []
+        self._matrix = np.zeros((self.max_entries, dimensions), dtype=np.float32)
+        self._last_used = np.zeros(self.max_entries, dtype=np.float64)
+
+    @staticmethod
+    def _normalize(embedding):
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
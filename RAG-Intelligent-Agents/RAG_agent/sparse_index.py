@@ -0,0 +1,398 @@
+"""
+Persistent BM25 inverted index for keyword retrieval
+"""
+import heapq
+import math
+import os
+import re
+import sqlite3
+import threading
+from collections import Counter
+
+from config import SPARSE_INDEX_PATH, BM25_K1, BM25_B, RRF_K
+
+# Keeps section numbers and defined terms such as "s.51", "51-xxix" or "3/4" together
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[./-][a-z0-9]+)*")
+
+STOPWORDS = frozenset("""
+a an and are as at be by for from has have in is it its of on or that the this
+to was were which with what who whom when where why how do does did
+""".split())
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS postings (
+    term TEXT NOT NULL,
+    chunk_id TEXT NOT NULL,
+    tf INTEGER NOT NULL,
+    length INTEGER NOT NULL,
+    impact REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (term, chunk_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS postings_by_chunk ON postings (chunk_id);
+CREATE INDEX IF NOT EXISTS postings_by_impact ON postings (term, impact DESC);
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk_id TEXT PRIMARY KEY,
+    length INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS terms (
+    term TEXT PRIMARY KEY,
+    df INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+# Stored impacts are recomputed when the average chunk length drifts further than this
+IMPACT_REFRESH_DRIFT = 0.05
+
+# Postings read from each query term's impact-ordered list in the first
+# step; the block doubles every step up to MAX_POSTINGS_BLOCK
+POSTINGS_BLOCK = 64
+MAX_POSTINGS_BLOCK = 4096
+
+# Most promising read chunks scored exactly per step
+SCORE_BATCH = 4096
+
+# Chunk IDs bound to one scoring statement
+SCORE_GROUP = 500
+
+def tokenize(text):
+    """Split text into lowercase index terms, dropping stopwords.
+
+    Args:
+        text (str): Text to tokenize
+
+    Returns:
+        list: Terms in order of appearance
+    """
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+class SparseIndex:
+    """BM25 inverted index stored in SQLite.
+
+    Postings are clustered by term (a WITHOUT ROWID table keyed on
+    (term, chunk_id)), so looking up a term is a single B-tree range scan.
+    Each posting carries the chunk length, which keeps scoring free of
+    joins. Chunks can be added and removed incrementally; a chunks table
+    records every added chunk with its length, including chunks without
+    any terms, and drives contains() and the corpus statistics.
+
+    Each posting also stores its impact, the BM25 term-frequency factor
+    computed with a reference average chunk length, and an index keeps
+    every term's postings in impact order. search() reads the lists of
+    the query terms best first and stops once no unread posting can reach
+    the current top k (the threshold algorithm), so common terms cost a
+    few blocks of postings instead of a full scan. The impacts are only
+    used for that bound; candidates are scored exactly with the current
+    statistics. Impacts are recomputed when the average chunk length has
+    drifted by more than IMPACT_REFRESH_DRIFT, and the bound is widened by
+    the remaining drift, so results match an exhaustive scan.
+    """
+
+    def __init__(self, path=SPARSE_INDEX_PATH, k1=BM25_K1, b=BM25_B):
+        """Open (and create if needed) the index.
+
+        Args:
+            path (str): Path to the SQLite file
+            k1 (float): BM25 term frequency saturation
+            b (float): BM25 length normalisation
+        """
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.executescript(SCHEMA)
+        with self._conn:
+            self._impact_length()
+
+    def add_chunks(self, chunks):
+        """Index chunks, replacing any chunk already indexed under the same ID.
+
+        Args:
+            chunks (list): (chunk_id, text) tuples
+        """
+        chunks = list(chunks)
+        with self._lock, self._conn:
+            self._remove(chunk_id for chunk_id, _ in chunks)
+            chunk_counts = [(chunk_id, Counter(tokenize(text))) for chunk_id, text in chunks]
+            term_counts = Counter()
+            total_length = 0
+            for _, counts in chunk_counts:
+                total_length += sum(counts.values())
+                term_counts.update(counts.keys())
+            self._add_meta("chunks", len(chunks))
+            self._add_meta("total_length", total_length)
+
+            impact_length = self._impact_length()
+            # Chunks without any terms are recorded too, so they can be
+            # found and removed like the others
+            self._conn.executemany(
+                "INSERT INTO chunks (chunk_id, length) VALUES (?, ?)",
+                [(chunk_id, sum(counts.values())) for chunk_id, counts in chunk_counts],
+            )
+            postings = []
+            for chunk_id, counts in chunk_counts:
+                length = sum(counts.values())
+                postings.extend(
+                    (term, chunk_id, tf, length, self._impact(tf, length, impact_length))
+                    for term, tf in counts.items()
+                )
+            self._conn.executemany(
+                "INSERT INTO postings (term, chunk_id, tf, length, impact) VALUES (?, ?, ?, ?, ?)",
+                postings,
+            )
+            self._conn.executemany(
+                "INSERT INTO terms (term, df) VALUES (?, ?) "
+                "ON CONFLICT (term) DO UPDATE SET df = df + excluded.df",
+                term_counts.items(),
+            )
+
+    def remove_chunks(self, chunk_ids):
+        """Remove chunks from the index.
+
+        Args:
+            chunk_ids (iterable): IDs of the chunks to remove
+        """
+        with self._lock, self._conn:
+            self._remove(chunk_ids)
+            self._impact_length()
+
+    def search(self, query, k=10):
+        """Return the k chunks with the highest BM25 score for a query.
+
+        Args:
+            query (str): Query text
+            k (int): Number of results
+
+        Returns:
+            list: (chunk_id, score) tuples, best first
+        """
+        terms = set(tokenize(query))
+        if not terms or k <= 0:
+            return []
+
+        with self._lock:
+            chunk_count = self._get_meta("chunks")
+            if not chunk_count:
+                return []
+            average_length = self._get_meta("total_length") / chunk_count
+            impact_length = self._get_meta("impact_length") or average_length
+            # Impacts use impact_length; the BM25 factor changes by at most this ratio
+            slack = max(average_length / impact_length, impact_length / average_length)
+
+            placeholders = ", ".join("?" * len(terms))
+            weights = {
+                term: math.log(1 + (chunk_count - df + 0.5) / (df + 0.5))
+                for term, df in self._conn.execute(
+                    f"SELECT term, df FROM terms WHERE term IN ({placeholders})", list(terms)
+                )
+            }
+            cursors = {
+                term: self._conn.execute(
+                    "SELECT chunk_id, impact FROM postings WHERE term = ? ORDER BY impact DESC", (term,)
+                )
+                for term in weights
+            }
+            block = max(k, POSTINGS_BLOCK)
+            # Most any unread posting of a term can still add to a score
+            bounds = {term: math.inf for term in cursors}
+            # Chunks read from some lists but not scored yet: chunk ID ->
+            # [bound on the read part of the score, terms read]
+            pending = {}
+            scores = {}
+            top = []
+            try:
+                while True:
+                    threshold = top[0] if len(top) == k else 0.0
+                    essential = self._essential_terms(bounds, threshold)
+                    for term in essential:
+                        rows = cursors[term].fetchmany(block)
+                        for chunk_id, impact in rows:
+                            if chunk_id not in scores:
+                                found = pending.setdefault(chunk_id, [0.0, set()])
+                                found[0] += slack * weights[term] * impact
+                                found[1].add(term)
+                        if len(rows) < block:
+                            cursors.pop(term).close()
+                            del bounds[term]
+                        else:
+                            bounds[term] = slack * weights[term] * rows[-1][1]
+                    block = min(2 * block, MAX_POSTINGS_BLOCK)
+
+                    # Drop read chunks that cannot reach the top k even with
+                    # the best unread postings of the terms they lack
+                    remaining = sum(bounds.values())
+                    upper = {
+                        chunk_id: read + remaining - sum(bounds.get(term, 0.0) for term in terms_read)
+                        for chunk_id, (read, terms_read) in pending.items()
+                    }
+                    for chunk_id, bound in upper.items():
+                        if bound < threshold:
+                            del pending[chunk_id]
+                    if not pending:
+                        if not essential:
+                            break
+                        continue
+
+                    # Score the most promising chunks exactly, which raises the threshold
+                    batch = heapq.nlargest(max(k, SCORE_BATCH), pending, key=upper.get)
+                    for chunk_id in batch:
+                        del pending[chunk_id]
+                    for chunk_id, score in self._score(batch, weights, average_length):
+                        scores[chunk_id] = score
+                        if len(top) < k:
+                            heapq.heappush(top, score)
+                        elif score > top[0]:
+                            heapq.heapreplace(top, score)
+            finally:
+                for cursor in cursors.values():
+                    cursor.close()
+
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def contains(self, chunk_id):
+        """Return True if a chunk is indexed.
+
+        Args:
+            chunk_id (str): Chunk ID
+
+        Returns:
+            bool: Whether the chunk has been added (with or without terms)
+        """
+        with self._lock:
+            return self._conn.execute(
+                "SELECT 1 FROM chunks WHERE chunk_id = ?", (chunk_id,)
+            ).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._get_meta("chunks")
+
+    def _remove(self, chunk_ids):
+        # Stage the IDs in a temp table so each step is one set-based statement
+        self._conn.execute("CREATE TEMP TABLE IF NOT EXISTS removed (chunk_id TEXT PRIMARY KEY)")
+        self._conn.execute("DELETE FROM removed")
+        self._conn.executemany(
+            "INSERT OR IGNORE INTO removed (chunk_id) VALUES (?)", ((chunk_id,) for chunk_id in chunk_ids)
+        )
+        removed_chunks, removed_length = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(length), 0) FROM chunks "
+            "WHERE chunk_id IN (SELECT chunk_id FROM removed)"
+        ).fetchone()
+        if removed_chunks:
+            self._conn.executemany(
+                "UPDATE terms SET df = df - ? WHERE term = ?",
+                [(count, term) for term, count in self._conn.execute(
+                    "SELECT term, COUNT(*) FROM postings "
+                    "WHERE chunk_id IN (SELECT chunk_id FROM removed) GROUP BY term"
+                )],
+            )
+            self._conn.execute("DELETE FROM postings WHERE chunk_id IN (SELECT chunk_id FROM removed)")
+            self._conn.execute("DELETE FROM chunks WHERE chunk_id IN (SELECT chunk_id FROM removed)")
+            self._conn.execute("DELETE FROM terms WHERE df <= 0")
+            self._add_meta("chunks", -removed_chunks)
+            self._add_meta("total_length", -removed_length)
+
+    @staticmethod
+    def _essential_terms(bounds, threshold):
+        # MaxScore: the terms with the smallest bounds whose bounds sum to less
+        # than the k-th best score cannot lift an unseen chunk into the top k
+        # on their own, so only the other terms' lists need to be read further
+        total = 0.0
+        essential = sorted(bounds, key=bounds.get)
+        while essential and total + bounds[essential[0]] < threshold:
+            total += bounds[essential.pop(0)]
+        return essential
+
+    def _score(self, chunk_ids, weights, average_length):
+        # Exact BM25 scores of some chunks, summed over the query terms in SQL;
+        # chunk IDs go in groups that stay under SQLite's variable limit
+        chunk_ids = list(chunk_ids)
+        cases = " ".join("WHEN ? THEN ?" for _ in weights)
+        scores = []
+        for start in range(0, len(chunk_ids), SCORE_GROUP):
+            group = chunk_ids[start:start + SCORE_GROUP]
+            scores.extend(self._conn.execute(
+                f"SELECT chunk_id, SUM((CASE term {cases} END) * tf * ? / "
+                "(tf + ? * (1 - ? + ? * length / ?))) FROM postings "
+                f"WHERE term IN ({', '.join('?' * len(weights))}) "
+                f"AND chunk_id IN ({', '.join('?' * len(group))}) GROUP BY chunk_id",
+                [value for item in weights.items() for value in item]
+                + [self.k1 + 1, self.k1, self.b, self.b, average_length]
+                + list(weights) + group,
+            ))
+        return scores
+
+    def _impact(self, tf, length, impact_length):
+        return tf * (self.k1 + 1) / (tf + self.k1 * (1 - self.b + self.b * length / impact_length))
+
+    def _impact_length(self):
+        # Average chunk length the stored impacts were computed with; when the
+        # real average has drifted too far, every impact is recomputed in SQL
+        chunk_count = self._get_meta("chunks")
+        impact_length = self._get_meta("impact_length")
+        if not chunk_count:
+            return impact_length or 1.0
+        average_length = self._get_meta("total_length") / chunk_count
+        if impact_length and abs(average_length / impact_length - 1) <= IMPACT_REFRESH_DRIFT:
+            return impact_length
+        self._conn.execute(
+            "UPDATE postings SET impact = tf * ? / (tf + ? * (1 - ? + ? * length / ?))",
+            (self.k1 + 1, self.k1, self.b, self.b, average_length),
+        )
+        self._set_meta("impact_length", average_length)
+        return average_length
+
+    def _get_meta(self, name):
+        row = self._conn.execute("SELECT value FROM meta WHERE name = ?", (name,)).fetchone()
+        return row[0] if row else 0
+
+    def _set_meta(self, name, value):
+        self._conn.execute(
+            "INSERT INTO meta (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = excluded.value",
+            (name, value),
+        )
+
+    def _add_meta(self, name, delta):
+        self._conn.execute(
+            "INSERT INTO meta (name, value) VALUES (?, ?) "
+            "ON CONFLICT (name) DO UPDATE SET value = value + excluded.value",
+            (name, delta),
+        )
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """Fuse several ranked ID lists with reciprocal rank fusion.
+
+    Args:
+        rankings (list): Lists of IDs, each ordered best first
+        k (int): RRF constant that damps the weight of top ranks
+
+    Returns:
+        list: (id, fused score) tuples, best first
+    """
+    scores = {}
+    for ranking in rankings:
+        for rank, item_id in enumerate(ranking, start=1):
+            scores[item_id] = scores.get(item_id, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+def get_sparse_index(path=SPARSE_INDEX_PATH):
+    """Return the shared sparse index for a path, opening it on first use.
+
+    Args:
+        path (str): Path to the SQLite file
+
+    Returns:
+        SparseIndex: Index instance
+    """
+    with _indexes_lock:
+        if path not in _indexes:
+            _indexes[path] = SparseIndex(path)
+        return _indexes[path]
@@ -2,17 +2,19 @@
 Streamlit web interface for the RAG system
 """
 import streamlit as st
-import os
 import time
 from pathlib import Path
 import plotly.express as px
 import pandas as pd
 
 # Import our modules
-from database import initialize_database, store_document_to_db
-from query_engine import query_database, get_similar_documents
+from database import initialize_database, list_documents, delete_document
+from manifest import get_manifest
+from ingest_jobs import IngestJobQueue, IngestWorkerPool
+from pipeline import get_pipeline_stats
+from query_engine import stream_query, get_similar_documents, get_cache_stats, get_rerank_stats, warm_up
 from document_processor import extract_text_from_file
-from utils import validate_file_path, format_file_size, get_file_size, list_supported_files
+from utils import validate_file_path, format_file_size, get_file_size, list_supported_files, generate_upload_doc_id, compute_data_hash
 
 # Page configuration
 st.set_page_config(
@@ -57,72 +59,142 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Initialize session state
-if 'database_initialized' not in st.session_state:
-    st.session_state.database_initialized = False
-if 'index' not in st.session_state:
-    st.session_state.index = None
+# Initialize session state (sessions only hold their chat history)
 if 'chat_history' not in st.session_state:
     st.session_state.chat_history = []
-if 'uploaded_documents' not in st.session_state:
-    st.session_state.uploaded_documents = []
 
-def initialize_system():
-    """Initialize the RAG system"""
-    try:
-        with st.spinner("Initializing database..."):
-            st.session_state.index = initialize_database()
-            st.session_state.database_initialized = True
-        st.success("✅ Database initialized successfully!")
-        return True
-    except Exception as e:
-        st.error(f"❌ Error initializing database: {str(e)}")
-        return False
+@st.cache_resource(show_spinner="Loading document index...")
+def get_index():
+    """Open the index once per server process, warmed up for the first query.
+    
+    The index, its vector store client and the embedding client are shared
+    by every browser session and rerun.
+    """
+    index = initialize_database()
+    warm_up(index)
+    return index
+
+@st.cache_resource(show_spinner=False)
+def get_ingest_workers():
+    """Start the background ingestion workers once per server process.
+    
+    Jobs left in the queue by a previous run are picked up again.
+    """
+    workers = IngestWorkerPool(IngestJobQueue(), get_index())
+    workers.start()
+    return workers
 
 def upload_document(uploaded_file, doc_id=None):
-    """Handle document upload"""
+    """Queue an uploaded document for background ingestion"""
     try:
-        # Save uploaded file temporarily
-        temp_path = f"temp_{uploaded_file.name}"
-        with open(temp_path, "wb") as f:
-            f.write(uploaded_file.read())
-        
+        data = uploaded_file.getbuffer()
         # Generate doc_id if not provided
         if not doc_id:
-            doc_id = f"doc_{len(st.session_state.uploaded_documents) + 1}"
+            doc_id = generate_upload_doc_id(uploaded_file.name, data)
         
-        # Store in database
-        with st.spinner(f"Processing {uploaded_file.name}..."):
-            success = store_document_to_db(temp_path, doc_id, st.session_state.index)
+        # An ID typed by the user may belong to another document
+        existing = get_manifest().get_document(doc_id)
+        if existing is not None and existing["content_hash"] != compute_data_hash(data):
+            st.warning(f"⚠️ '{doc_id}' already holds '{existing['source']}'; "
+                       f"it will be replaced by '{uploaded_file.name}'.")
         
-        if success:
-            # Add to session state
-            st.session_state.uploaded_documents.append({
-                'name': uploaded_file.name,
-                'doc_id': doc_id,
-                'size': format_file_size(uploaded_file.size),
-                'type': uploaded_file.type
-            })
-            st.success(f"✅ Document '{uploaded_file.name}' uploaded successfully!")
-        else:
-            st.error(f"❌ Failed to upload '{uploaded_file.name}'")
-        
-        # Clean up temporary file
-        os.remove(temp_path)
+        get_ingest_workers().queue.submit(uploaded_file.name, doc_id, data)
+        st.success(f"✅ Document '{uploaded_file.name}' queued for ingestion!")
         
     except Exception as e:
         st.error(f"❌ Error uploading document: {str(e)}")
-        if os.path.exists(temp_path):
-            os.remove(temp_path)
 
-def add_to_chat(message, is_user=True):
+# Icon shown for each ingestion job status
+JOB_ICONS = {"queued": "🕒", "running": "🔄", "done": "✅", "skipped": "⏭️", "failed": "❌"}
+
+def display_ingest_jobs():
+    """Display the progress of recent ingestion jobs"""
+    queue = get_ingest_workers().queue
+    jobs = queue.list_jobs()
+    if not jobs:
+        return
+    
+    st.subheader("⏳ Ingestion Jobs")
+    for job in jobs:
+        label = f"{JOB_ICONS.get(job['status'], '')} {job['file_name']}"
+        detail = f"{job['pages']}{'/' + str(job['page_total']) if job['page_total'] else ''} pages, " \
+                 f"{job['chunks']} chunks embedded"
+        if job['status'] == 'running' and job['page_total']:
+            st.progress(min(job['pages'] / job['page_total'], 1.0), text=f"{label}: {detail}")
+        elif job['status'] == 'failed':
+            st.caption(f"{label}: {job['error']}")
+        elif job['status'] == 'queued':
+            st.caption(f"{label}: waiting")
+        elif job['status'] == 'skipped':
+            st.caption(f"{label}: unchanged")
+        else:
+            st.caption(f"{label}: {detail}")
+    
+    # Per-stage queue depth and throughput of the latest ingestion pipeline
+    pipeline_stats = get_pipeline_stats()
+    if pipeline_stats:
+        with st.expander("🏭 Ingestion Pipeline"):
+            pipeline_df = pd.DataFrame({
+                'Stage': list(pipeline_stats),
+                'Workers': [stage['workers'] for stage in pipeline_stats.values()],
+                'Queue': [f"{stage['queue_depth']}/{stage['queue_size']}" if stage['queue_size'] else "-"
+                          for stage in pipeline_stats.values()],
+                'Items/s': [f"{stage['items_per_sec']:.1f}" for stage in pipeline_stats.values()],
+                'Busy': [f"{stage['busy']:.0%}" for stage in pipeline_stats.values()],
+            })
+            st.dataframe(pipeline_df, hide_index=True)
+    
+    if any(job['status'] in ('done', 'skipped', 'failed') for job in jobs):
+        if st.button("🧹 Clear Finished Jobs"):
+            queue.clear_finished()
+            st.rerun()
+
+# Refresh only the job list every few seconds, so chat stays usable while
+# documents are ingested (st.fragment needs Streamlit 1.37 or later)
+if hasattr(st, "fragment"):
+    display_ingest_jobs = st.fragment(run_every=2)(display_ingest_jobs)
+
+def get_documents():
+    """Get the documents in the persistent registry"""
+    return list_documents(get_index())
+
+def remove_document(doc_id):
+    """Handle document deletion"""
+    if delete_document(doc_id, get_index()):
+        st.success(f"✅ Document '{doc_id}' deleted successfully!")
+    else:
+        st.error(f"❌ Failed to delete '{doc_id}'")
+
+def add_to_chat(message, is_user=True, sources=None):
     """Add message to chat history"""
     st.session_state.chat_history.append({
         'message': message,
         'is_user': is_user,
+        'sources': sources or [],
         'timestamp': time.time()
     })
 
+def stream_answer(question, k):
+    """Render the answer token by token and return it with its sources"""
+    placeholder = st.empty()
+    parts = []
+    try:
+        stream = stream_query(question, get_index(), k=k)
+        for token in stream:
+            parts.append(token)
+            placeholder.markdown("".join(parts) + "▌")
+        placeholder.markdown(stream.answer)
+        return stream.answer, stream.sources
+    except Exception as e:
+        error = f"❌ Error querying database: {str(e)}"
+        placeholder.error(error)
+        return error, []
+
+def score_label(source):
+    """Format the vector score of a source for display"""
+    score = source.get('score', 'N/A')
+    return "keyword match" if score is None else score
+
 def display_chat_history():
     """Display chat history"""
     for chat in st.session_state.chat_history:
@@ -135,6 +207,14 @@ def display_chat_history():
             {chat['message']}
         </div>
         """, unsafe_allow_html=True)
+        
+        if chat.get('sources'):
+            with st.expander(f"📚 Sources ({len(chat['sources'])})"):
+                for source in chat['sources']:
+                    page = source.get('page_number')
+                    location = f"{source.get('doc_id', 'N/A')}" + (f", page {page}" if page else "")
+                    st.write(f"**{location}** (Score: {score_label(source)})")
+                    st.caption(source.get('text', '')[:300] + "...")
 
 def main():
     """Main Streamlit application"""
@@ -142,40 +222,64 @@ def main():
     # Header
     st.markdown('<div class="main-header">🔍 RAG Document Query System</div>', unsafe_allow_html=True)
     
+    # Shared index (opened by the first session, reused by all others)
+    try:
+        get_index()
+        database_ready = True
+    except Exception as e:
+        st.error(f"❌ Error initializing database: {str(e)}")
+        database_ready = False
+    
     # Sidebar
     with st.sidebar:
         st.header("📁 Document Management")
         
-        # Initialize system button
-        if not st.session_state.database_initialized:
-            if st.button("🚀 Initialize System", type="primary"):
-                initialize_system()
-        else:
+        if database_ready:
             st.success("✅ System Ready")
         
         # File upload
-        if st.session_state.database_initialized:
+        if database_ready:
             st.subheader("📤 Upload Documents")
-            uploaded_file = st.file_uploader(
-                "Choose a file",
+            uploaded_files = st.file_uploader(
+                "Choose files",
                 type=['pdf', 'html'],
+                accept_multiple_files=True,
                 help="Upload PDF or HTML files to add to the knowledge base"
             )
             
-            if uploaded_file is not None:
+            if len(uploaded_files) == 1:
+                # Derived from the name and content, never from a count of stored documents
+                # (which repeats after a delete) or the name alone (which two files can share)
                 doc_id = st.text_input("Document ID (optional)", 
-                                     value=f"doc_{len(st.session_state.uploaded_documents) + 1}")
+                                     value=generate_upload_doc_id(uploaded_files[0].name,
+                                                                  uploaded_files[0].getbuffer()),
+                                     help="Enter the ID of a stored document to replace it")
                 if st.button("Upload Document"):
-                    upload_document(uploaded_file, doc_id)
+                    upload_document(uploaded_files[0], doc_id)
+            elif uploaded_files:
+                if st.button(f"Upload {len(uploaded_files)} Documents"):
+                    for uploaded_file in uploaded_files:
+                        upload_document(uploaded_file)
+            
+            # Background ingestion progress
+            display_ingest_jobs()
             
-            # Display uploaded documents
-            if st.session_state.uploaded_documents:
-                st.subheader("📚 Uploaded Documents")
-                for doc in st.session_state.uploaded_documents:
-                    with st.expander(f"📄 {doc['name']}"):
+            # Display stored documents
+            documents = get_documents()
+            if documents:
+                st.subheader("📚 Stored Documents")
+                for doc in documents:
+                    with st.expander(f"📄 {doc['source']}"):
                         st.write(f"**ID:** {doc['doc_id']}")
-                        st.write(f"**Size:** {doc['size']}")
-                        st.write(f"**Type:** {doc['type']}")
+                        if doc['size_bytes'] is not None:
+                            st.write(f"**Size:** {format_file_size(doc['size_bytes'])}")
+                        if doc['page_count'] is not None:
+                            st.write(f"**Pages:** {doc['page_count']}")
+                        if doc['chunk_count'] is not None:
+                            st.write(f"**Chunks:** {doc['chunk_count']}")
+                        if st.button("🗑️ Delete", key=f"delete_{doc['doc_id']}"):
+                            remove_document(doc['doc_id'])
+                            st.rerun()
         
         # Settings
         st.subheader("⚙️ Settings")
@@ -188,8 +292,7 @@ def main():
             st.rerun()
     
     # Main content area
-    if not st.session_state.database_initialized:
-        st.info("👈 Please initialize the system using the sidebar")
+    if not database_ready:
         return
     
     # Create two columns for chat and additional info
@@ -206,12 +309,11 @@ def main():
             # Add user message to chat
             add_to_chat(user_question, is_user=True)
             
-            # Get answer
-            with st.spinner("Thinking..."):
-                answer = query_database(user_question, st.session_state.index, k=similarity_k)
+            # Stream the answer as it is generated
+            answer, sources = stream_answer(user_question, similarity_k)
             
             # Add assistant response to chat
-            add_to_chat(answer, is_user=False)
+            add_to_chat(answer, is_user=False, sources=sources)
             
             # Rerun to show updated chat
             st.rerun()
@@ -225,12 +327,14 @@ def main():
         st.header("📊 Information")
         
         # Statistics
-        if st.session_state.uploaded_documents:
+        documents = get_documents()
+        if documents:
             st.subheader("📈 Statistics")
             stats_data = {
-                'Metric': ['Total Documents', 'Total Questions', 'Average Response Time'],
+                'Metric': ['Total Documents', 'Total Chunks', 'Total Questions', 'Average Response Time'],
                 'Value': [
-                    len(st.session_state.uploaded_documents),
+                    len(documents),
+                    sum(doc['chunk_count'] or 0 for doc in documents),
                     len([c for c in st.session_state.chat_history if c['is_user']]),
                     "< 1s"  # Placeholder
                 ]
@@ -238,12 +342,44 @@ def main():
             stats_df = pd.DataFrame(stats_data)
             st.dataframe(stats_df, hide_index=True)
         
+        # Cache statistics
+        cache_stats = get_cache_stats()
+        if cache_stats["semantic_cache"]:
+            st.subheader("🧠 Semantic Cache")
+            semantic = cache_stats["semantic_cache"]
+            cache_df = pd.DataFrame({
+                'Metric': ['Hit Rate', 'Threshold', 'Entries', 'Evictions'],
+                'Value': [
+                    f"{semantic['hit_rate']:.0%}",
+                    f"{semantic['threshold']:.2f}",
+                    f"{semantic['entries']}/{semantic['max_entries']}",
+                    semantic['evictions']
+                ]
+            })
+            st.dataframe(cache_df, hide_index=True)
+        
+        # Rerank statistics
+        rerank_stats = get_rerank_stats()
+        if rerank_stats and rerank_stats['calls']:
+            st.subheader("🎯 Reranking")
+            rerank_df = pd.DataFrame({
+                'Metric': ['Queries', 'Candidates / Query', 'Chunks Sent / Query', 'Tokens Saved', 'Avg Latency'],
+                'Value': [
+                    rerank_stats['calls'],
+                    f"{rerank_stats['candidates'] / rerank_stats['calls']:.0f}",
+                    f"{rerank_stats['selected'] / rerank_stats['calls']:.1f}",
+                    rerank_stats['tokens_saved'],
+                    f"{rerank_stats['avg_latency_ms']:.1f} ms"
+                ]
+            })
+            st.dataframe(rerank_df, hide_index=True)
+        
         # Document types chart
-        if st.session_state.uploaded_documents:
+        if documents:
             st.subheader("📁 Document Types")
             doc_types = {}
-            for doc in st.session_state.uploaded_documents:
-                ext = doc['name'].split('.')[-1].upper()
+            for doc in documents:
+                ext = doc['source'].split('.')[-1].upper()
                 doc_types[ext] = doc_types.get(ext, 0) + 1
             
             if doc_types:
@@ -265,11 +401,11 @@ def main():
                         break
                 
                 if last_question:
-                    similar_docs = get_similar_documents(last_question, st.session_state.index, k=3)
+                    similar_docs = get_similar_documents(last_question, get_index(), k=similarity_k)
                     if isinstance(similar_docs, list):
                         st.write("**Similar Documents:**")
                         for i, doc in enumerate(similar_docs, 1):
-                            with st.expander(f"Document {i} (Score: {doc.get('score', 'N/A')})"):
+                            with st.expander(f"Document {i} (Score: {score_label(doc)})"):
                                 st.write(doc.get('text', 'No text available')[:500] + "...")
                     else:
                         st.error(similar_docs)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Test file for the on-disk embedding cache
+Checks lookups, eviction and two caches sharing one directory, standing in
+for two processes.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+# Offline embeddings, so no API key is needed
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_cache import EmbeddingCache
+from embeddings import HashEmbeddingBackend
+
+DIMENSIONS = 16
+BACKEND = HashEmbeddingBackend(dimensions=DIMENSIONS)
+
+def open_caches(max_entries):
+    """Open two caches on the same directory, holding at most max_entries vectors"""
+    path = tempfile.mkdtemp(prefix="rag_test_cache_")
+    max_bytes = max_entries * DIMENSIONS * 4
+    return (EmbeddingCache(BACKEND.model_name, DIMENSIONS, path=path, max_bytes=max_bytes),
+            EmbeddingCache(BACKEND.model_name, DIMENSIONS, path=path, max_bytes=max_bytes))
+
+def texts(start, stop):
+    """Distinct texts with distinct hash embeddings"""
+    return [f"section {i} clause {i * 7} paragraph {i * 13}" for i in range(start, stop)]
+
+def assert_vectors(found, batch):
+    """Every hit must be the vector of its own text"""
+    expected = BACKEND.embed(batch)
+    for text, vector, wanted in zip(batch, found, expected):
+        if vector is not None:
+            assert max(abs(a - b) for a, b in zip(vector, wanted)) < 1e-6, text
+
+def test_large_batches_round_trip():
+    """Test that batches larger than one lookup query are stored and found"""
+    print("🧪 Testing large batches...")
+    cache, other = open_caches(5000)
+    batch = texts(0, 1200)
+    cache.put_many(batch, BACKEND.embed(batch))
+    # Storing the same texts again adds nothing
+    other.put_many(batch, BACKEND.embed(batch))
+    assert len(cache) == 1200
+
+    found = other.get_many(batch + ["not cached"])
+    assert found[-1] is None and all(vector is not None for vector in found[:-1])
+    assert_vectors(found, batch)
+    print("✅ Large batches round-trip between caches")
+
+def test_eviction_keeps_recently_used():
+    """Test that the least recently used entries are evicted first"""
+    print("🧪 Testing eviction...")
+    cache, _ = open_caches(100)
+    old, recent, new = texts(0, 50), texts(50, 100), texts(100, 150)
+    cache.put_many(old + recent, BACKEND.embed(old + recent))
+    cache.get_many(recent)
+    cache.put_many(new, BACKEND.embed(new))
+
+    assert len(cache) == 100
+    assert cache.get_many(old) == [None] * 50
+    found = cache.get_many(recent + new)
+    assert None not in found
+    assert_vectors(found, recent + new)
+    print("✅ Least recently used entries were evicted")
+
+def test_reads_never_see_reused_slots():
+    """Test that a reader never gets a vector written over its slot by another cache"""
+    print("🧪 Testing reads during eviction by another cache...")
+    reader, writer = open_caches(32)
+    stop = threading.Event()
+    errors = []
+    written = [0]
+
+    def write():
+        try:
+            for start in range(0, 4000, 16):
+                if stop.is_set():
+                    break
+                batch = texts(start, start + 16)
+                writer.put_many(batch, BACKEND.embed(batch))
+                written[0] = start + 16
+        except Exception as e:
+            errors.append(e)
+        finally:
+            stop.set()
+
+    thread = threading.Thread(target=write)
+    thread.start()
+    hits = 0
+    try:
+        while not stop.is_set():
+            # Recent texts, some of which the writer is about to evict
+            batch = texts(max(0, written[0] - 48), written[0] + 16)
+            found = reader.get_many(batch)
+            assert_vectors(found, batch)
+            hits += sum(vector is not None for vector in found)
+    finally:
+        stop.set()
+        thread.join()
+    assert not errors, errors
+    print(f"📊 {hits} hits checked")
+    assert hits > 0
+    print("✅ Every hit matched its text")
+
+def main():
+    """Run all embedding cache tests"""
+    print("🚀 Starting Embedding Cache Tests")
+    print("=" * 60)
+
+    test_large_batches_round_trip()
+    test_eviction_keeps_recently_used()
+    test_reads_never_see_reused_slots()
+
+    print("✅ All tests completed successfully!")
+
+if __name__ == "__main__":
+    main()
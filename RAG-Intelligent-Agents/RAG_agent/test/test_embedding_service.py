@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+"""
+Test file for the batching embedding service
+Checks when queued texts are flushed to the backend and that cancelled
+texts are never embedded.
+"""
+
+import os
+import sys
+import threading
+import time
+
+# Offline embeddings, so no API key is needed
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embeddings import EmbeddingBackend, EmbeddingService
+
+class RecordingBackend(EmbeddingBackend):
+    """Backend that records each batch and holds it until released"""
+
+    model_name = "recording"
+    dimensions = 2
+
+    def __init__(self):
+        self.batches = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def embed(self, texts):
+        self.batches.append(list(texts))
+        self.started.set()
+        self.release.wait(5)
+        return [[float(len(text)), 1.0] for text in texts]
+
+def busy_service(backend, **kwargs):
+    """Start a service with one request slot and occupy it"""
+    service = EmbeddingService(backend, concurrency=1, **kwargs)
+    first = service.submit(["first"])
+    assert backend.started.wait(5)
+    return service, first
+
+def test_full_batch_is_sent_at_once():
+    """Test that a batch is flushed as soon as it reaches the size limit"""
+    print("🧪 Testing flush at the batch size limit...")
+    backend = RecordingBackend()
+    service, first = busy_service(backend, max_batch_size=4, flush_interval=30)
+    start = time.monotonic()
+    futures = service.submit([f"text {i}" for i in range(8)])
+    backend.release.set()
+
+    vectors = [future.result(timeout=5) for future in first + futures]
+    elapsed = time.monotonic() - start
+    service.close()
+    print(f"📋 Batches {[len(batch) for batch in backend.batches]} in {elapsed:.2f}s")
+    assert [len(batch) for batch in backend.batches] == [1, 4, 4]
+    assert vectors[1] == [float(len("text 0")), 1.0]
+    # Full batches never wait for the flush interval
+    assert elapsed < 5
+    print("✅ Full batches were sent without waiting")
+
+def test_partial_batch_is_sent_at_deadline():
+    """Test that a partial batch is flushed after flush_interval while all slots are busy"""
+    print("🧪 Testing flush at the deadline...")
+    backend = RecordingBackend()
+    service, first = busy_service(backend, max_batch_size=100, flush_interval=0.2)
+    early = service.submit(["a", "b", "c"])
+    time.sleep(0.5)
+    late = service.submit(["d", "e", "f"])
+    time.sleep(0.5)
+    backend.release.set()
+
+    for future in first + early + late:
+        future.result(timeout=5)
+    service.close()
+    print(f"📋 Batches {backend.batches}")
+    # Without the deadline all six texts would have waited for one batch
+    assert backend.batches == [["first"], ["a", "b", "c"], ["d", "e", "f"]]
+    print("✅ Partial batches were sent at their deadline")
+
+def test_cancelled_text_is_not_embedded():
+    """Test that a text whose future was cancelled is dropped from its batch"""
+    print("🧪 Testing cancellation...")
+    backend = RecordingBackend()
+    service, first = busy_service(backend, max_batch_size=100, flush_interval=0.1)
+    keep, dropped, also_keep = service.submit(["keep", "dropped", "also keep"])
+    assert dropped.cancel()
+    backend.release.set()
+
+    assert keep.result(timeout=5) == [4.0, 1.0]
+    assert also_keep.result(timeout=5) == [9.0, 1.0]
+    first[0].result(timeout=5)
+    service.close()
+    print(f"📋 Batches {backend.batches}")
+    assert all("dropped" not in batch for batch in backend.batches)
+    assert service.stats == {"texts": 3, "batches": 2}
+    print("✅ Cancelled text was never sent")
+
+def main():
+    """Run all embedding service tests"""
+    print("🚀 Starting Embedding Service Tests")
+    print("=" * 60)
+
+    test_full_batch_is_sent_at_once()
+    test_partial_batch_is_sent_at_deadline()
+    test_cancelled_text_is_not_embedded()
+
+    print("✅ All tests completed successfully!")
+
+if __name__ == "__main__":
+    main()
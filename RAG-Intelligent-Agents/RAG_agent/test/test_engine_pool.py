@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Test file for the query engine pool
+Checks that retrieval needs no LLM and that a pool lives and dies with
+its index.
+"""
+
+import gc
+import os
+import sys
+import tempfile
+import weakref
+
+# Offline embeddings, so no API key is needed
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core import VectorStoreIndex, StorageContext, QueryBundle
+from llama_index.core.schema import TextNode
+
+from embeddings import EmbeddingService, HashEmbeddingBackend, configure_embeddings
+from engine_pool import get_engine_pool, get_retriever
+from flat_store import FlatVectorStore
+
+# Uncached hash embeddings: nothing is written outside the scratch directories
+configure_embeddings(EmbeddingService(HashEmbeddingBackend(dimensions=64)))
+
+def make_index():
+    """Create an index over a flat vector store holding two chunks"""
+    vector_store = FlatVectorStore(tempfile.mkdtemp(prefix="rag_test_pool_"))
+    index = VectorStoreIndex([], storage_context=StorageContext.from_defaults(vector_store=vector_store))
+    index.insert_nodes([
+        TextNode(id_="judicial", text="The judicial power is vested in the High Court."),
+        TextNode(id_="executive", text="The executive power is vested in the Queen."),
+    ])
+    return index
+
+def test_retriever_needs_no_llm():
+    """Test that pooled retrievers work without an LLM and are reused"""
+    print("🧪 Testing pooled retriever...")
+    index = make_index()
+    retriever = get_retriever(index, 1)
+    assert get_retriever(index, 1) is retriever
+
+    nodes = retriever.retrieve(QueryBundle("judicial power High Court"))
+    print(f"📋 {[node.node_id for node in nodes]}")
+    assert [node.node_id for node in nodes] == ["judicial"]
+    print("✅ Retrieval works without an LLM")
+
+def test_pool_is_collected_with_index():
+    """Test that a pool belongs to its index and is freed with it"""
+    print("🧪 Testing pool lifetime...")
+    index = make_index()
+    pool = get_engine_pool(index)
+    assert get_engine_pool(index) is pool
+    assert get_engine_pool(make_index()) is not pool
+    get_retriever(index, 2)
+
+    index_ref, pool_ref = weakref.ref(index), weakref.ref(pool)
+    del index, pool
+    gc.collect()
+    assert index_ref() is None and pool_ref() is None
+    print("✅ Pool was collected with its index")
+
+def main():
+    """Run all engine pool tests"""
+    print("🚀 Starting Engine Pool Tests")
+    print("=" * 60)
+
+    test_retriever_needs_no_llm()
+    test_pool_is_collected_with_index()
+
+    print("✅ All tests completed successfully!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Test file for the flat vector store
+Compares exact and int8-quantized search with a brute-force numpy search.
+"""
+
+import os
+import sys
+import tempfile
+
+import numpy as np
+
+# Offline embeddings, so no API key is needed
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core.schema import TextNode
+
+from flat_store import FlatVectorStore
+
+K = 10
+
+def make_data(rows=3000, dimensions=64, queries=50, seed=0):
+    """Random embeddings and queries, normalised like the store's rows"""
+    rng = np.random.default_rng(seed)
+    vectors = rng.standard_normal((rows, dimensions)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors, rng.standard_normal((queries, dimensions)).astype(np.float32)
+
+def make_store(vectors, quantization):
+    """Create a store in a scratch directory holding one node per row"""
+    store = FlatVectorStore(tempfile.mkdtemp(prefix=f"rag_test_flat_{quantization}_"),
+                            quantization=quantization, block_rows=1024)
+    store.add([
+        TextNode(id_=f"n{row}", text=f"chunk {row}", embedding=vector.tolist())
+        for row, vector in enumerate(vectors)
+    ])
+    return store
+
+def brute_force(vectors, queries, k):
+    """Exact top k rows by cosine similarity"""
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    scores = queries @ vectors.T
+    return [[f"n{row}" for row in np.argsort(-row_scores, kind="stable")[:k]] for row_scores in scores]
+
+def test_exact_top_k_matches_numpy():
+    """Test that unquantized search returns the brute-force top k"""
+    print("🧪 Testing exact flat search...")
+    vectors, queries = make_data()
+    store = make_store(vectors, "none")
+    expected = brute_force(vectors, queries, K)
+
+    results = store.query_batch(queries.tolist(), K)
+    for result, ids in zip(results, expected):
+        assert result.ids == ids
+        assert result.similarities == sorted(result.similarities, reverse=True)
+    print("✅ Exact search matches numpy")
+
+def test_int8_recall_after_rescoring():
+    """Test that int8 search with rescoring keeps recall@k at 0.99 or more"""
+    print("🧪 Testing int8 recall...")
+    vectors, queries = make_data()
+    store = make_store(vectors, "int8")
+    expected = brute_force(vectors, queries, K)
+
+    results = store.query_batch(queries.tolist(), K)
+    recall = np.mean([len(set(result.ids) & set(ids)) / K for result, ids in zip(results, expected)])
+    print(f"📊 int8 recall@{K}: {recall:.3f}")
+    assert recall >= 0.99
+    print("✅ int8 recall is high enough")
+
+def main():
+    """Run all flat vector store tests"""
+    print("🚀 Starting Flat Vector Store Tests")
+    print("=" * 60)
+
+    test_exact_top_k_matches_numpy()
+    test_int8_recall_after_rescoring()
+
+    print("✅ All tests completed successfully!")
+
+if __name__ == "__main__":
+    main()
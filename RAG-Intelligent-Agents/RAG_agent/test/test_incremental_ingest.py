@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Test file for incremental ingestion
+Re-ingests a document through index_document_chunks and checks that only
+changed chunks are embedded, inserted and deleted.
+"""
+
+import os
+import sys
+import tempfile
+
+# Offline embeddings, so no API key is needed
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core import VectorStoreIndex, StorageContext
+
+from database import index_document_chunks
+from embeddings import EmbeddingService, HashEmbeddingBackend, configure_embeddings
+from flat_store import FlatVectorStore
+from manifest import DocumentManifest
+from sparse_index import SparseIndex
+
+SECTIONS = [
+    "Section 51 gives the Parliament power to make laws with respect to trade and commerce.",
+    "Section 61 vests the executive power of the Commonwealth in the Queen.",
+    "Section 71 vests the judicial power of the Commonwealth in the High Court.",
+    "Section 92 requires trade and intercourse among the States to be absolutely free.",
+]
+
+# Uncached hash embeddings: nothing is written outside the scratch directories
+configure_embeddings(EmbeddingService(HashEmbeddingBackend(dimensions=64)))
+
+class Store:
+    """An index over a flat vector store, with its own manifest and sparse index"""
+
+    def __init__(self, name):
+        directory = tempfile.mkdtemp(prefix=f"rag_test_{name}_")
+        self.vector_store = FlatVectorStore(os.path.join(directory, "flat"))
+        storage_context = StorageContext.from_defaults(vector_store=self.vector_store)
+        self.index = VectorStoreIndex([], storage_context=storage_context)
+        self.manifest = DocumentManifest(os.path.join(directory, "manifest.sqlite3"))
+        self.sparse_index = SparseIndex(os.path.join(directory, "sparse.sqlite3"))
+
+    def ingest(self, doc_id, sections, content_hash):
+        """Ingest one chunk per section, each on its own page"""
+        chunks = [{"text": text, "page_number": page} for page, text in enumerate(sections, 1)]
+        return index_document_chunks(doc_id, chunks, self.index, f"{doc_id}.html", content_hash,
+                                     manifest=self.manifest, sparse_index=self.sparse_index)
+
+def test_unchanged_reingest_is_noop():
+    """Test that re-ingesting the same chunks adds and removes nothing"""
+    print("🧪 Testing unchanged re-ingest...")
+    store = Store("unchanged")
+
+    first = store.ingest("constitution", SECTIONS, "v1")
+    assert first == {"chunks": 4, "added": 4, "removed": 0}
+    chunk_ids = store.manifest.get_chunk_ids("constitution")
+
+    second = store.ingest("constitution", SECTIONS, "v1")
+    print(f"📋 First run {first}, second run {second}")
+    assert second == {"chunks": 4, "added": 0, "removed": 0}
+    assert store.manifest.get_chunk_ids("constitution") == chunk_ids
+    assert store.vector_store.count() == 4
+    assert len(store.sparse_index) == 4
+    print("✅ Unchanged re-ingest is a no-op")
+
+def test_edited_section_replaces_one_chunk():
+    """Test that editing one section adds one chunk and removes one chunk"""
+    print("🧪 Testing edited section...")
+    store = Store("edited")
+
+    store.ingest("edited", SECTIONS, "v1")
+    before = store.manifest.get_chunk_ids("edited")
+
+    edited = list(SECTIONS)
+    edited[2] = "Section 71 vests the judicial power in the High Court and other federal courts."
+    stats = store.ingest("edited", edited, "v2")
+    after = store.manifest.get_chunk_ids("edited")
+    print(f"📋 Edited run {stats}")
+
+    assert stats == {"chunks": 4, "added": 1, "removed": 1}
+    assert len(after - before) == 1 and len(before - after) == 1
+    assert store.vector_store.count() == 4
+    assert store.manifest.get_document("edited")["content_hash"] == "v2"
+
+    (removed,) = before - after
+    (added,) = after - before
+    assert not store.sparse_index.contains(removed)
+    assert store.sparse_index.contains(added)
+    assert store.sparse_index.search("federal courts", 1)[0][0] == added
+    print("✅ Only the edited chunk was replaced")
+
+def main():
+    """Run all incremental ingestion tests"""
+    print("🚀 Starting Incremental Ingestion Tests")
+    print("=" * 60)
+
+    test_unchanged_reingest_is_noop()
+    test_edited_section_replaces_one_chunk()
+
+    print("✅ All tests completed successfully!")
+
+if __name__ == "__main__":
+    main()
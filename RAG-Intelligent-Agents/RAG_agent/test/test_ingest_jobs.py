@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Test file for the background ingestion job queue
+Checks claiming, leases and reclaiming with two queues on one database,
+standing in for two processes.
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+# Offline embeddings, so no API key is needed
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest_jobs import IngestJobQueue
+
+LEASE = 0.5
+
+def open_queues():
+    """Open two queues on the same job database"""
+    path = os.path.join(tempfile.mkdtemp(prefix="rag_test_jobs_"), "jobs.sqlite3")
+    return IngestJobQueue(path, lease_seconds=LEASE), IngestJobQueue(path, lease_seconds=LEASE)
+
+def test_claim_order_and_payload():
+    """Test that jobs are claimed oldest first, once, with their content"""
+    print("🧪 Testing claim order...")
+    first, second = open_queues()
+    report = first.submit("report.pdf", "report", b"%PDF report")
+    notes = first.submit("notes.html", "notes", b"<p>notes</p>")
+
+    job = second.claim()
+    assert job["job_id"] == report and job["status"] == "running"
+    assert second.read_payload(report) == b"%PDF report"
+    assert first.claim()["job_id"] == notes
+    assert first.claim() is None and second.claim() is None
+
+    second.finish(report, "done")
+    statuses = {job["job_id"]: job["status"] for job in first.list_jobs()}
+    assert statuses == {report: "done", notes: "running"}
+    try:
+        first.read_payload(report)
+        assert False, "content of a finished job should be dropped"
+    except FileNotFoundError:
+        pass
+    print("✅ Jobs are claimed in order and exactly once")
+
+def test_same_document_waits():
+    """Test that a second upload of a document waits for the running one"""
+    print("🧪 Testing one job per document...")
+    first, second = open_queues()
+    old = first.submit("report.pdf", "report", b"v1")
+    new = first.submit("report.pdf", "report", b"v2")
+
+    assert first.claim()["job_id"] == old
+    assert second.claim() is None
+    first.finish(old, "done")
+    assert second.claim()["job_id"] == new
+    print("✅ Second upload waited its turn")
+
+def test_idle_claim_does_not_write():
+    """Test that polling a queue with no expired leases needs no write lock"""
+    print("🧪 Testing idle polling...")
+    first, _ = open_queues()
+    job_id = first.submit("report.pdf", "report", b"data")
+    first.claim()
+
+    # Another process holds the write lock, e.g. while submitting
+    writer = sqlite3.connect(first.path, timeout=0)
+    writer.execute("BEGIN IMMEDIATE")
+    try:
+        start = time.monotonic()
+        for _ in range(5):
+            assert first.claim() is None
+        assert time.monotonic() - start < 1.0
+    finally:
+        writer.rollback()
+        writer.close()
+    first.finish(job_id, "done")
+    print("✅ Idle polls are read-only")
+
+def test_renewed_lease_is_not_reclaimed():
+    """Test that a job whose lease is renewed stays with its worker"""
+    print("🧪 Testing lease renewal...")
+    first, second = open_queues()
+    job_id = first.submit("report.pdf", "report", b"data")
+    assert first.claim()["job_id"] == job_id
+
+    for _ in range(3):
+        time.sleep(LEASE / 2)
+        first.renew([job_id])
+        assert second.claim() is None
+    first.update_progress(job_id, 3, 12)
+    assert second.claim() is None
+    print("✅ Renewed job was not taken over")
+
+def test_expired_lease_is_reclaimed():
+    """Test that a job of a stopped worker is queued again after its lease"""
+    print("🧪 Testing reclaim after lease expiry...")
+    first, second = open_queues()
+    job_id = first.submit("report.pdf", "report", b"data")
+    assert first.claim()["job_id"] == job_id
+
+    # The first worker stops without renewing
+    assert second.claim() is None
+    time.sleep(LEASE * 1.5)
+    job = second.claim()
+    assert job is not None and job["job_id"] == job_id
+    assert second.read_payload(job_id) == b"data"
+    print("✅ Expired job was reclaimed")
+
+def main():
+    """Run all ingestion job queue tests"""
+    print("🚀 Starting Ingestion Job Queue Tests")
+    print("=" * 60)
+
+    test_claim_order_and_payload()
+    test_same_document_waits()
+    test_idle_claim_does_not_write()
+    test_renewed_lease_is_not_reclaimed()
+    test_expired_lease_is_reclaimed()
+
+    print("✅ All tests completed successfully!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+Test file for the staged ingestion pipeline
+Checks that a failing embedding stage stops every stage and leaves the
+stored document as it was.
+"""
+
+import os
+import sys
+import tempfile
+import threading
+
+# Offline embeddings, so no API key is needed
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core import VectorStoreIndex, StorageContext
+
+from embeddings import EmbeddingBackend, EmbeddingService, HashEmbeddingBackend, configure_embeddings
+from flat_store import FlatVectorStore
+from manifest import DocumentManifest
+from pipeline import IngestPipeline
+from sparse_index import SparseIndex
+
+PAGES = [
+    (1, "Section 51 gives the Parliament power to make laws with respect to trade and commerce."),
+    (2, "Section 61 vests the executive power of the Commonwealth in the Queen."),
+    (3, "Section 71 vests the judicial power of the Commonwealth in the High Court."),
+]
+
+# Uncached hash embeddings: nothing is written outside the scratch directories
+WORKING = EmbeddingService(HashEmbeddingBackend(dimensions=64))
+
+class FailingBackend(EmbeddingBackend):
+    """Backend whose every request fails, like an API outage"""
+
+    model_name = "failing"
+    dimensions = 64
+
+    def embed(self, texts):
+        raise RuntimeError("embedding API unavailable")
+
+class Store:
+    """An index over a flat vector store, with its own manifest and sparse index"""
+
+    def __init__(self):
+        directory = tempfile.mkdtemp(prefix="rag_test_pipeline_")
+        self.vector_store = FlatVectorStore(os.path.join(directory, "flat"))
+        storage_context = StorageContext.from_defaults(vector_store=self.vector_store)
+        self.index = VectorStoreIndex([], storage_context=storage_context)
+        self.manifest = DocumentManifest(os.path.join(directory, "manifest.sqlite3"))
+        self.sparse_index = SparseIndex(os.path.join(directory, "sparse.sqlite3"))
+
+    def run(self, doc_id, pages, content_hash):
+        """Ingest pages through a new pipeline"""
+        pipeline = IngestPipeline(self.index, batch_size=2, manifest=self.manifest,
+                                  sparse_index=self.sparse_index)
+        return pipeline.run(doc_id, iter(pages), f"{doc_id}.pdf", content_hash)
+
+def pipeline_threads():
+    """Names of pipeline worker threads still alive"""
+    return [thread.name for thread in threading.enumerate() if thread.name.startswith("ingest-")]
+
+def run_failing(store, doc_id, pages, content_hash):
+    """Run the pipeline with failing embeddings and return the error"""
+    configure_embeddings(EmbeddingService(FailingBackend()))
+    try:
+        store.run(doc_id, pages, content_hash)
+    except RuntimeError as e:
+        return e
+    finally:
+        configure_embeddings(WORKING)
+    assert False, "the pipeline should have failed"
+
+def test_failed_reingest_keeps_old_version():
+    """Test that a failed re-ingest raises and leaves the stored version untouched"""
+    print("🧪 Testing embedding failure during re-ingest...")
+    configure_embeddings(WORKING)
+    store = Store()
+    assert store.run("constitution", PAGES, "v1")["added"] == 3
+    chunk_ids = store.manifest.get_chunk_ids("constitution")
+
+    edited = PAGES[:2] + [(3, "Section 71 vests the judicial power in the High Court and federal courts.")]
+    error = run_failing(store, "constitution", edited, "v2")
+    print(f"📋 Raised: {error}")
+    assert "embedding API unavailable" in str(error)
+    assert pipeline_threads() == []
+
+    assert store.manifest.get_chunk_ids("constitution") == chunk_ids
+    assert store.manifest.get_document("constitution")["content_hash"] == "v1"
+    assert store.vector_store.count() == 3
+    assert len(store.sparse_index) == 3
+
+    # The next attempt applies the edit as usual
+    assert store.run("constitution", edited, "v2") == {"chunks": 3, "added": 1, "removed": 1}
+    print("✅ Failed re-ingest left the old version in place")
+
+def test_failed_first_ingest_registers_nothing():
+    """Test that a new document whose embeddings fail is not registered"""
+    print("🧪 Testing embedding failure on a new document...")
+    store = Store()
+    run_failing(store, "constitution", PAGES, "v1")
+    assert pipeline_threads() == []
+    assert store.manifest.get_document("constitution") is None
+    assert store.manifest.get_chunk_ids("constitution") == set()
+    assert store.vector_store.count() == 0
+    print("✅ Nothing was registered")
+
+def main():
+    """Run all ingestion pipeline tests"""
+    print("🚀 Starting Ingestion Pipeline Tests")
+    print("=" * 60)
+
+    test_failed_reingest_keeps_old_version()
+    test_failed_first_ingest_registers_nothing()
+
+    print("✅ All tests completed successfully!")
+
+if __name__ == "__main__":
+    main()
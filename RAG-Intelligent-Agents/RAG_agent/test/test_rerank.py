@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Test file for the post-retrieval reranker
+Checks that fewer than k chunks reach synthesis and that near-duplicates
+are dropped.
+"""
+
+import os
+import sys
+
+# Offline embeddings, so no API key is needed
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llama_index.core.schema import NodeWithScore, TextNode
+
+from rerank import Reranker
+
+JUDICIAL = "The judicial power of the Commonwealth shall be vested in the High Court of Australia."
+
+def candidates():
+    """Vector search results: the same chunk three times, then related chunks"""
+    texts = [JUDICIAL, JUDICIAL, JUDICIAL,
+             "The High Court shall have original jurisdiction in matters arising under any treaty.",
+             "The executive power of the Commonwealth is vested in the Queen.",
+             "Trade, commerce, and intercourse among the States shall be absolutely free."]
+    return [
+        NodeWithScore(node=TextNode(id_=f"c{i}", text=text), score=1.0 - i / 10)
+        for i, text in enumerate(texts)
+    ]
+
+def test_sends_top_n_nodes():
+    """Test that at most top_n nodes are kept and the tokens saved are counted"""
+    print("🧪 Testing top n selection...")
+    reranker = Reranker(top_n=2)
+    nodes, report = reranker.rerank("judicial power High Court", None, candidates(), 3)
+    print(f"📋 {report}")
+    assert len(nodes) == 2 and report["selected"] == 2
+    assert report["tokens_saved"] > 0
+
+    # A smaller k wins over top_n, and short candidate lists pass through
+    assert len(reranker.rerank("judicial power", None, candidates(), 1)[0]) == 1
+    assert len(reranker.rerank("judicial power", None, candidates()[:2], 3)[0]) == 2
+    assert reranker.stats()["calls"] == 3
+    print("✅ Only the top n nodes reach synthesis")
+
+def test_drops_near_duplicates():
+    """Test that repeated chunks do not take several of the kept places"""
+    print("🧪 Testing near-duplicate removal...")
+    nodes, _ = Reranker(top_n=2).rerank("judicial power High Court", None, candidates(), 3)
+    texts = [node.node.get_content() for node in nodes]
+    print(f"📋 {[node.node_id for node in nodes]}")
+    assert texts.count(JUDICIAL) == 1
+    assert nodes[0].node.get_content() == JUDICIAL
+    print("✅ Near-duplicates were dropped")
+
+def main():
+    """Run all reranker tests"""
+    print("🚀 Starting Reranker Tests")
+    print("=" * 60)
+
+    test_sends_top_n_nodes()
+    test_drops_near_duplicates()
+
+    print("✅ All tests completed successfully!")
+
+if __name__ == "__main__":
+    main()
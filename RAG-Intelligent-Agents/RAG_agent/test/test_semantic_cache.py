@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Test file for the semantic answer cache
+Checks that near-identical questions about different numbers or
+identifiers never share an answer.
+"""
+
+import os
+import sys
+
+# Offline embeddings, so no API key is needed
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from semantic_cache import SemanticCache, identifier_tokens
+
+EMBEDDING = [0.6, 0.8, 0.0, 0.0]
+QUESTION = "What does section 51 of the Constitution say?"
+
+def cache_with_answer():
+    """A cache holding one answer for QUESTION"""
+    cache = SemanticCache(threshold=0.95, max_entries=4)
+    cache.add(QUESTION, EMBEDDING, 3, "Legislative powers.", ["constitution.pdf"], "v1")
+    return cache
+
+def test_different_section_is_a_miss():
+    """Test that "section 52" does not reuse the answer for "section 51" """
+    print("🧪 Testing identifier mismatch...")
+    cache = cache_with_answer()
+    # Same embedding, so only the identifiers can tell them apart
+    assert cache.lookup("What does section 52 of the Constitution say?", EMBEDDING, 3, "v1") is None
+    assert cache.lookup("What does s.51 of the Constitution say?", EMBEDDING, 3, "v1") is None
+    assert cache.lookup("What does section 51 of the Constitution say about GST?",
+                        EMBEDDING, 3, "v1") is None
+
+    entry = cache.lookup("what does Section 51 of the constitution say", EMBEDDING, 3, "v1")
+    assert entry is not None and entry["answer"] == "Legislative powers."
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 3
+    assert identifier_tokens("Is GST in s.51-xxix?") == {"gst", "s.51-xxix"}
+    print("✅ Only the question about the same section hit")
+
+def test_similarity_k_and_version_must_match():
+    """Test that a hit needs a close embedding, the same k and the same index version"""
+    print("🧪 Testing hit conditions...")
+    cache = cache_with_answer()
+    close = [0.62, 0.78, 0.05, 0.0]
+    far = [0.0, 0.0, 1.0, 0.0]
+
+    assert cache.lookup(QUESTION, close, 3, "v1")["similarity"] >= 0.95
+    assert cache.lookup(QUESTION, far, 3, "v1") is None
+    assert cache.lookup(QUESTION, EMBEDDING, 5, "v1") is None
+    assert cache.lookup(QUESTION, EMBEDDING, 3, "v2") is None
+    print("✅ Hits need a close embedding, the same k and the same version")
+
+def main():
+    """Run all semantic cache tests"""
+    print("🚀 Starting Semantic Cache Tests")
+    print("=" * 60)
+
+    test_different_section_is_a_miss()
+    test_similarity_k_and_version_must_match()
+
+    print("✅ All tests completed successfully!")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Test file for the BM25 sparse index
+Checks the ranking on a small corpus and that the pruned search returns
+the same top k as scoring every chunk.
+"""
+
+import math
+import os
+import random
+import sys
+import tempfile
+from collections import Counter
+
+# Offline embeddings, so no API key is needed
+os.environ.setdefault("RAG_EMBEDDING_BACKEND", "hash")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sparse_index import SparseIndex, tokenize
+
+CORPUS = {
+    "s51": "The Parliament shall have power to make laws with respect to trade and commerce "
+           "with other countries, and among the States.",
+    "s92": "Trade, commerce, and intercourse among the States shall be absolutely free.",
+    "s71": "The judicial power of the Commonwealth shall be vested in a Federal Supreme Court, "
+           "to be called the High Court of Australia.",
+    "s61": "The executive power of the Commonwealth is vested in the Queen.",
+    "s128": "This Constitution shall not be altered except in the following manner.",
+}
+
+def open_index():
+    """Open an empty sparse index in a scratch directory"""
+    return SparseIndex(os.path.join(tempfile.mkdtemp(prefix="rag_test_sparse_"), "sparse.sqlite3"))
+
+def brute_force(chunks, query, k, k1, b):
+    """Score every chunk with BM25 directly from its text"""
+    counts = {chunk_id: Counter(tokenize(text)) for chunk_id, text in chunks}
+    average_length = sum(sum(c.values()) for c in counts.values()) / len(counts)
+    scores = {}
+    for term in set(tokenize(query)):
+        df = sum(1 for c in counts.values() if term in c)
+        if not df:
+            continue
+        idf = math.log(1 + (len(counts) - df + 0.5) / (df + 0.5))
+        for chunk_id, c in counts.items():
+            tf = c.get(term, 0)
+            if tf:
+                length = sum(c.values())
+                norm = k1 * (1 - b + b * length / average_length)
+                scores[chunk_id] = scores.get(chunk_id, 0.0) + idf * tf * (k1 + 1) / (tf + norm)
+    return sorted(scores.items(), key=lambda item: -item[1])[:k]
+
+def test_bm25_ranking():
+    """Test that BM25 ranks the chunks that match the query terms first"""
+    print("🧪 Testing BM25 ranking...")
+    index = open_index()
+    index.add_chunks(CORPUS.items())
+
+    results = index.search("judicial power High Court", 3)
+    print(f"📋 {results}")
+    assert results[0][0] == "s71"
+    # Both mention "power" once; the shorter chunk scores higher
+    assert [chunk_id for chunk_id, _ in results[1:]] == ["s61", "s51"]
+    assert index.search("trade commerce", 2)[0][0] == "s92"
+    assert {chunk_id for chunk_id, _ in index.search("trade commerce", 2)} == {"s51", "s92"}
+    assert index.search("the of and", 3) == []
+    assert index.search("spectrum auction", 3) == []
+
+    index.remove_chunks(["s71"])
+    assert all(chunk_id != "s71" for chunk_id, _ in index.search("judicial power", 5))
+    print("✅ BM25 ranking is correct")
+
+def test_chunks_without_terms_are_tracked():
+    """Test that a chunk with only stopwords can be found, replaced and removed"""
+    print("🧪 Testing chunks without terms...")
+    index = open_index()
+    index.add_chunks(CORPUS.items())
+    index.add_chunks([("empty", "and the of")])
+    assert index.contains("empty")
+    assert len(index) == len(CORPUS) + 1
+
+    # Re-adding and backfilling must not count it twice
+    index.add_chunks([("empty", "and the of")])
+    assert len(index) == len(CORPUS) + 1
+    expected = index.search("judicial power", 3)
+
+    index.remove_chunks(["empty"])
+    assert not index.contains("empty")
+    assert len(index) == len(CORPUS)
+    fresh = open_index()
+    fresh.add_chunks(CORPUS.items())
+    assert index.search("judicial power", 3) == fresh.search("judicial power", 3)
+    assert [chunk_id for chunk_id, _ in expected] == [chunk_id for chunk_id, _ in fresh.search("judicial power", 3)]
+    print("✅ Chunks without terms are counted exactly once")
+
+def test_pruned_search_matches_brute_force():
+    """Test that the impact-ordered search returns the exhaustive top k"""
+    print("🧪 Testing pruned search against brute force...")
+    rng = random.Random(0)
+    # Zipf-like vocabulary, so a few terms appear in most chunks
+    vocabulary = [f"w{i}" for i in range(300)]
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    chunks = [
+        (f"c{i}", " ".join(rng.choices(vocabulary, weights, k=rng.randint(20, 120))))
+        for i in range(2000)
+    ]
+    index = open_index()
+    for start in range(0, len(chunks), 500):
+        index.add_chunks(chunks[start:start + 500])
+
+    for _ in range(30):
+        query = " ".join(rng.sample(vocabulary[:40], rng.randint(1, 5)))
+        expected = brute_force(chunks, query, 10, index.k1, index.b)
+        found = index.search(query, 10)
+        assert [round(score, 9) for _, score in found] == [round(score, 9) for _, score in expected], query
+    print("✅ Pruned search matches brute force")
+
+def main():
+    """Run all sparse index tests"""
+    print("🚀 Starting Sparse Index Tests")
+    print("=" * 60)
+
+    test_bm25_ranking()
+    test_chunks_without_terms_are_tracked()
+    test_pruned_search_matches_brute_force()
+
+    print("✅ All tests completed successfully!")
+
+if __name__ == "__main__":
+    main()
@@ -5,10 +5,10 @@ import chromadb
 from openai import OpenAI
 
 # Correct llama-index imports
-from llama_index.core import VectorStoreIndex, Document, Settings
-from llama_index.embeddings.openai import OpenAIEmbedding
+from llama_index.core import VectorStoreIndex, Document
 from llama_index.vector_stores.chroma import ChromaVectorStore
 from llama_index.core import StorageContext
+from embeddings import configure_embeddings
 
 # Load OpenAI API key from config.py
 try:
@@ -21,11 +21,8 @@ if not os.getenv("OPENAI_API_KEY"):
     raise RuntimeError("Please set the OPENAI_API_KEY environment variable or in config.py")
 
 def extract_text_from_pdf(pdf_path):
-    text = ""
     with fitz.open(pdf_path) as pdf:
-        for page in pdf:
-            text += page.get_text("text") + "\n"
-    return text
+        return "".join(page.get_text("text") + "\n" for page in pdf)
 
 def extract_text_from_html(html_path):
     with open(html_path, "r", encoding="utf-8") as f:
@@ -33,12 +30,12 @@ def extract_text_from_html(html_path):
     return soup.get_text(separator="\n")
 
 # Initialize embeddings settings
-Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large")
+configure_embeddings()
 
 def initialize_database():
     """Initialize and return the vector database index."""
     # Initialize embeddings & Chroma vector DB
-    Settings.embed_model = OpenAIEmbedding(model="text-embedding-3-large")
+    configure_embeddings()
     
     # Initialize Chroma
     chroma_client = chromadb.PersistentClient(path="./db")
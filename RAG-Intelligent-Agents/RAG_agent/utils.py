@@ -2,6 +2,8 @@
 Utility functions for the RAG system
 """
 import os
+import json
+import hashlib
 from pathlib import Path
 
 def validate_file_path(file_path):
@@ -72,6 +74,32 @@ def list_supported_files(directory):
     
     return files
 
+def load_questions_jsonl(file_path):
+    """Load questions from a JSONL file.
+    
+    Each non-empty line is either a JSON string or an object with a
+    'question' key.
+    
+    Args:
+        file_path (str): Path to the JSONL file
+        
+    Returns:
+        list: List of question strings
+    """
+    questions = []
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record, dict):
+                if "question" not in record:
+                    raise ValueError(f"Line {line_number} of {file_path} has no 'question' key")
+                record = record["question"]
+            questions.append(str(record))
+    return questions
+
 def clean_text(text):
     """Clean and normalize text content.
     
@@ -93,21 +121,79 @@ def clean_text(text):
     
     return text.strip()
 
-def generate_doc_id(file_path):
-    """Generate a unique document ID from file path.
+def compute_file_hash(file_path, block_size=1024 * 1024):
+    """Compute the SHA-256 hash of a file's content.
     
     Args:
         file_path (str): Path to the file
+        block_size (int): Number of bytes read at a time
+        
+    Returns:
+        str: Hex digest of the file content
+    """
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def compute_data_hash(data):
+    """Compute the SHA-256 hash of content held in memory.
+    
+    The digest equals compute_file_hash() of a file with the same content.
+    
+    Args:
+        data (bytes-like): Content to hash
+        
+    Returns:
+        str: Hex digest of the content
+    """
+    return hashlib.sha256(data).hexdigest()
+
+def compute_text_hash(text):
+    """Compute the SHA-256 hash of a text string.
+    
+    Args:
+        text (str): Text to hash
+        
+    Returns:
+        str: Hex digest of the UTF-8 encoded text
+    """
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def generate_upload_doc_id(file_name, data):
+    """Generate a document ID for uploaded content.
+    
+    Uploads have no path, only a name, and two different files are often
+    both called e.g. "report.pdf". The ID therefore combines the name with
+    the content hash: a re-upload of the same file maps to the same
+    document, while a different file with the same name gets its own.
+    
+    Args:
+        file_name (str): Name of the uploaded file
+        data (bytes-like): Content of the file
         
     Returns:
         str: Generated document ID
     """
-    import hashlib
+    return f"{generate_doc_id(file_name)}-{compute_data_hash(data)[:8]}"
+
+def generate_doc_id(file_path):
+    """Generate a stable document ID from file path.
+    
+    The ID depends only on the absolute path, so re-running ingestion on
+    a file that was touched or edited updates the same document instead
+    of creating a new one. Content changes are tracked separately by the
+    ingestion manifest.
     
-    # Use file path and modification time for uniqueness
+    Args:
+        file_path (str): Path to the file
+        
+    Returns:
+        str: Generated document ID
+    """
     try:
-        mtime = os.path.getmtime(file_path)
-        content = f"{file_path}_{mtime}"
+        content = os.path.abspath(file_path)
         return hashlib.md5(content.encode()).hexdigest()[:8]
     except Exception:
         # Fallback to just the filename